@@ -1,6 +1,7 @@
 # coding=utf-8
 from __future__ import absolute_import
 
+import json
 import logging
 import math
 import os
@@ -18,6 +19,16 @@ from eodatasets import serialise, drivers
 
 GDAL_CACHE_MAX_MB = 512
 
+DEFAULT_TILE_SIZE = 256
+
+# Browse mime type -> (GDAL driver, file extension) for tile pyramids.
+_TILE_FORMATS = {
+    'image/png': ('PNG', 'png'),
+    'image/jpeg': ('JPEG', 'jpg'),
+    'image/jpg': ('JPEG', 'jpg'),
+    'image/webp': ('WEBP', 'webp'),
+}
+
 _LOG = logging.getLogger(__name__)
 
 
@@ -77,10 +88,118 @@ def _calculate_scale_offset(nodata, band):
     return dfScale, dfOffset
 
 
+def _tile_zoom_levels(width, height, tile_size):
+    """
+    Number of zoom levels needed for the full resolution image to be the most detailed level.
+
+    Level 0 fits the whole image in a single tile.
+
+    >>> _tile_zoom_levels(256, 256, 256)
+    1
+    >>> _tile_zoom_levels(257, 100, 256)
+    2
+    >>> _tile_zoom_levels(8000, 7000, 256)
+    6
+    """
+    largest = max(width, height)
+    return int(math.ceil(math.log(max(float(largest) / tile_size, 1), 2))) + 1
+
+
+def _write_tile_pyramid(dataset, tile_directory, tile_size=DEFAULT_TILE_SIZE, file_type='image/png'):
+    """
+    Write an XYZ tile pyramid ('{z}/{x}/{y}.png') of an already-stretched 8-bit RGB dataset.
+
+    The most detailed zoom level is the dataset's native resolution, and each level above
+    halves it until the image fits in a single tile. Edge tiles are padded to the full tile
+    size (transparent where the format allows it).
+
+    :type dataset: gdal.Dataset
+    :type tile_directory: pathlib.Path
+    :type tile_size: int
+    :type file_type: str
+    :return: The files written, including the index.
+    :rtype: list[pathlib.Path]
+    """
+    if file_type not in _TILE_FORMATS:
+        raise ValueError('Unsupported tile type %r. Expected one of %r' % (file_type, sorted(_TILE_FORMATS)))
+    driver_name, extension = _TILE_FORMATS[file_type]
+    tile_driver = gdal.GetDriverByName(driver_name)
+    if tile_driver is None:
+        raise ValueError('GDAL driver %r is unavailable for %r tiles' % (driver_name, file_type))
+
+    has_alpha = driver_name != 'JPEG'
+    band_count = 4 if has_alpha else 3
+
+    if tile_directory.exists():
+        shutil.rmtree(str(tile_directory))
+
+    width, height = dataset.RasterXSize, dataset.RasterYSize
+    zoom_levels = _tile_zoom_levels(width, height, tile_size)
+    memory_driver = gdal.GetDriverByName('MEM')
+
+    written = []
+    for zoom in range(zoom_levels):
+        # Source pixels per tile pixel at this level.
+        factor = 2 ** (zoom_levels - 1 - zoom)
+        source_tile_size = tile_size * factor
+
+        for tile_x in range(int(math.ceil(float(width) / source_tile_size))):
+            x_dir = tile_directory.joinpath(str(zoom), str(tile_x))
+            x_dir.mkdir(parents=True)
+
+            for tile_y in range(int(math.ceil(float(height) / source_tile_size))):
+                x_off, y_off = tile_x * source_tile_size, tile_y * source_tile_size
+                x_size = min(source_tile_size, width - x_off)
+                y_size = min(source_tile_size, height - y_off)
+                buf_x = max(1, int(math.ceil(float(x_size) / factor)))
+                buf_y = max(1, int(math.ceil(float(y_size) / factor)))
+
+                rgb = dataset.ReadAsArray(x_off, y_off, x_size, y_size, buf_xsize=buf_x, buf_ysize=buf_y)
+
+                tile = numpy.zeros((band_count, tile_size, tile_size), dtype=numpy.uint8)
+                tile[:3, :buf_y, :buf_x] = rgb
+                if has_alpha:
+                    tile[3, :buf_y, :buf_x] = 255
+
+                mem = memory_driver.Create('', tile_size, tile_size, band_count, gdalconst.GDT_Byte)
+                for band_index in range(band_count):
+                    mem.GetRasterBand(band_index + 1).WriteArray(tile[band_index])
+
+                tile_path = x_dir.joinpath('%d.%s' % (tile_y, extension))
+                tile_driver.CreateCopy(str(tile_path), mem)
+                # noinspection PyUnusedLocal
+                mem = None
+
+                # Some drivers leave side-car metadata that we don't want to package.
+                aux_file = tile_path.with_name(tile_path.name + '.aux.xml')
+                if aux_file.exists():
+                    aux_file.unlink()
+                written.append(tile_path)
+
+    index_path = tile_directory.joinpath('index.json')
+    with index_path.open('w') as f:
+        f.write(json.dumps({
+            'tiles': '{z}/{x}/{y}.' + extension,
+            'format': file_type,
+            'tile_size': tile_size,
+            'min_zoom': 0,
+            'max_zoom': zoom_levels - 1,
+            'width': width,
+            'height': height,
+            'geotransform': list(dataset.GetGeoTransform()),
+            'projection': dataset.GetProjection(),
+        }, indent=2, sort_keys=True))
+    written.append(index_path)
+
+    _LOG.info('Wrote %s tiles in %s zoom levels to %s', len(written) - 1, zoom_levels, tile_directory)
+    return written
+
+
 # This method comes from the old ULA codebase and should be cleaned up eventually.
 # pylint: disable=too-many-locals
 def _create_thumbnail(red_file, green_file, blue_file, output_path,
-                      x_constraint=None, nodata=-999, work_dir=None, overwrite=True):
+                      x_constraint=None, nodata=-999, work_dir=None, overwrite=True,
+                      tile_pyramids=(), after_file_creation=lambda file_path: None):
     """
     Create JPEG thumbnail image using individual R, G, B images.
 
@@ -94,6 +213,10 @@ def _create_thumbnail(red_file, green_file, blue_file, output_path,
     :param nodata: null/fill data value
     :param work_dir: temp/work directory to use.
     :param overwrite: overwrite existing thumbnail?
+    :param tile_pyramids: (directory, tile_size, file_type) tile pyramids to write from the same stretched image.
+    :param after_file_creation: called for each tile file written.
+
+    The output_path may be None if only tile pyramids are wanted.
 
     Thumbnail height is adjusted automatically to match the aspect ratio
     of the input images.
@@ -102,15 +225,20 @@ def _create_thumbnail(red_file, green_file, blue_file, output_path,
     nodata = int(nodata)
 
     # GDAL calls need absolute paths.
-    thumbnail_path = pathlib.Path(output_path).absolute()
+    thumbnail_path = pathlib.Path(output_path).absolute() if output_path else None
+    tile_pyramids = [(pathlib.Path(directory).absolute(), tile_size, file_type)
+                     for directory, tile_size, file_type in tile_pyramids]
 
-    if thumbnail_path.exists() and not overwrite:
+    if not thumbnail_path and not tile_pyramids:
+        raise ValueError('Nothing to create: no thumbnail path or tile pyramids given')
+
+    if thumbnail_path and thumbnail_path.exists() and not overwrite:
         _LOG.warning('File already exists. Skipping creation of %s', thumbnail_path)
         return None, None, None
 
     # thumbnail_image = os.path.abspath(thumbnail_image)
 
-    out_directory = str(thumbnail_path.parent)
+    out_directory = str(thumbnail_path.parent if thumbnail_path else tile_pyramids[0][0].parent)
     work_dir = os.path.abspath(work_dir) if work_dir else tempfile.mkdtemp(prefix='.thumb-tmp', dir=out_directory)
     try:
         # working files
@@ -181,22 +309,31 @@ def _create_thumbnail(red_file, green_file, blue_file, output_path,
             )
             _LOG.debug('Scale %r, offset %r', scale, offset)
 
+        if tile_pyramids:
+            outdataset.SetGeoTransform(vrt.GetGeoTransform())
+            outdataset.SetProjection(vrt.GetProjection())
+            outdataset.FlushCache()
+            for tile_directory, tile_size, file_type in tile_pyramids:
+                for tile_file in _write_tile_pyramid(outdataset, tile_directory, tile_size, file_type):
+                    after_file_creation(tile_file)
+
         # Must close datasets to flush to disk.
         # noinspection PyUnusedLocal
         outdataset = None
         # noinspection PyUnusedLocal
         vrt = None
 
-        # GDAL Create doesn't support JPEG so we need to make a copy of the GeoTIFF
-        run_command(
-            [
-                "gdal_translate",
-                "--config", "GDAL_CACHEMAX", str(GDAL_CACHE_MAX_MB),
-                "-of", "JPEG",
-                outtif,
-                str(thumbnail_path)
-            ],
-            work_dir)
+        if thumbnail_path:
+            # GDAL Create doesn't support JPEG so we need to make a copy of the GeoTIFF
+            run_command(
+                [
+                    "gdal_translate",
+                    "--config", "GDAL_CACHEMAX", str(GDAL_CACHE_MAX_MB),
+                    "-of", "JPEG",
+                    outtif,
+                    str(thumbnail_path)
+                ],
+                work_dir)
 
         _LOG.debug('Cleaning work files')
     finally:
@@ -215,12 +352,101 @@ def _create_thumbnail(red_file, green_file, blue_file, output_path,
     return x_constraint, outrows, outresx
 
 
-def create_typical_browse_metadata(dataset_driver, dataset, destination_directory):
+def _palette_lookup_table(rules, bits=16):
+    """
+    Precompute the RGB colour of every possible pixel value for the given bit-class rules.
+
+    >>> lut = _palette_lookup_table([(0b10, 0, (255, 0, 0)), (0, 0, (0, 255, 0))], bits=2)
+    >>> lut.tolist()
+    [[255, 0, 0], [255, 0, 0], [0, 255, 0], [0, 255, 0]]
+
+    :param rules: (mask, value, (r, g, b)) rules, first match wins. Unmatched values are black.
+    :type bits: int
+    :rtype: numpy.ndarray
+    """
+    values = numpy.arange(2 ** bits, dtype=numpy.uint32)
+    lut = numpy.zeros((values.size, 3), dtype=numpy.uint8)
+    assigned = numpy.zeros(values.size, dtype=bool)
+    for mask, value, colour in rules:
+        matches = ~assigned & ((values & mask) == value)
+        lut[matches] = colour
+        assigned |= matches
+    return lut
+
+
+def _create_palette_thumbnail(image_file, output_path, palette, x_constraint=None, overwrite=True,
+                              tile_pyramids=(), after_file_creation=lambda file_path: None):
+    """
+    Create a JPEG thumbnail of a single-band bitmask image by colouring each value with palette rules.
+
+    Unlike _create_thumbnail(), the band is read once (decimated to the output size) and
+    coloured in a single lookup: there is no stretch.
+
+    :param image_file: The bitmask image (integer, up to 16 bits)
+    :param output_path: thumbnail file to write to (or None if only tile pyramids are wanted).
+    :param palette: (mask, value, (r, g, b)) rules, as returned by the driver's browse_palette()
+    :param x_constraint: thumbnail width (if not full resolution)
+    :param overwrite: overwrite existing thumbnail?
+    :param tile_pyramids: (directory, tile_size, file_type) tile pyramids to write from the same image.
+    :param after_file_creation: called for each tile file written.
+    :return: (cols, rows, output pixel resolution), as with _create_thumbnail()
+    """
+    if output_path and pathlib.Path(output_path).exists() and not overwrite:
+        _LOG.warning('File already exists. Skipping creation of %s', output_path)
+        return None, None, None
+
+    image = gdal.Open(str(image_file))
+    band = image.GetRasterBand(1)
+    incols, inrows = image.RasterXSize, image.RasterYSize
+    transform = list(image.GetGeoTransform())
+
+    if x_constraint:
+        outcols = x_constraint
+        outrows = int(math.ceil((float(inrows) / float(incols)) * x_constraint))
+    else:
+        outcols, outrows = incols, inrows
+
+    data = band.ReadAsArray(buf_xsize=outcols, buf_ysize=outrows)
+    if data.dtype.kind not in 'iu' or data.dtype.itemsize > 2:
+        raise ValueError('Palette browse images need an 8 or 16 bit integer band, got %s' % data.dtype)
+    # Signed values index by their bit pattern.
+    index = data.view('u%d' % data.dtype.itemsize)
+    rgb = _palette_lookup_table(palette, bits=8 * data.dtype.itemsize)[index]
+    # noinspection PyUnusedLocal
+    data, index, band = None, None, None
+
+    outresx = transform[1] * incols / outcols
+    transform[1] = outresx
+    transform[5] = transform[5] * inrows / outrows
+
+    rgb_dataset = gdal.GetDriverByName('MEM').Create('', outcols, outrows, 3, gdalconst.GDT_Byte)
+    rgb_dataset.SetGeoTransform(transform)
+    rgb_dataset.SetProjection(image.GetProjection())
+    for band_index in range(3):
+        rgb_dataset.GetRasterBand(band_index + 1).WriteArray(rgb[:, :, band_index])
+    # noinspection PyUnusedLocal
+    rgb, image = None, None
+
+    for tile_directory, tile_size, file_type in tile_pyramids:
+        for tile_file in _write_tile_pyramid(rgb_dataset, pathlib.Path(tile_directory), tile_size, file_type):
+            after_file_creation(tile_file)
+
+    if output_path:
+        gdal.GetDriverByName('JPEG').CreateCopy(str(output_path), rgb_dataset)
+        aux_file = pathlib.Path(str(output_path) + '.aux.xml')
+        if aux_file.exists():
+            aux_file.unlink()
+
+    return outcols, outrows, outresx
+
+
+def create_typical_browse_metadata(dataset_driver, dataset, destination_directory, include_tiles=False):
     """
     Create browse metadata.
     :type dataset_driver: eodatasets.package.DatasetDriver
     :type dataset: ptype.DatasetMetadata
     :type destination_directory: Path
+    :param include_tiles: Also include a tiled pyramid of the full resolution browse.
     :return:
     """
     rgb_bands = dataset_driver.browse_image_bands(dataset)
@@ -251,19 +477,37 @@ def create_typical_browse_metadata(dataset_driver, dataset, destination_director
             blue_band=b
         )
     }
+    if include_tiles:
+        dataset.browse['tiles'] = ptype.BrowseMetadata(
+            path=destination_directory.joinpath('browse.tiles'),
+            file_type='image/png',
+            red_band=r,
+            green_band=g,
+            blue_band=b,
+            tile_size=DEFAULT_TILE_SIZE
+        )
     return dataset
 
 
+def _browse_bands(browse_metadata):
+    return browse_metadata.red_band, browse_metadata.green_band, browse_metadata.blue_band
+
+
 def create_dataset_browse_images(
         dataset_driver,
         dataset,
         target_directory,
-        after_file_creation=lambda file_path: None):
+        after_file_creation=lambda file_path: None,
+        include_tiles=False):
     """
+    Tile pyramids are written from the same stretched image as the full resolution browse
+    image of the same bands, when there is one.
+
     :type dataset_driver: drivers.DatasetDriver
     :type dataset: ptype.DatasetMetadata
     :type target_directory: Path
     :type after_file_creation: Path -> None
+    :param include_tiles: Include a tile pyramid if creating new browse metadata.
     :rtype: ptype.DatasetMetadata
     """
     if not dataset.image or not dataset.image.bands:
@@ -273,47 +517,80 @@ def create_dataset_browse_images(
 
     # Create browse image metadata if missing.
     if not dataset.browse:
-        create_typical_browse_metadata(dataset_driver, dataset, target_directory)
+        create_typical_browse_metadata(dataset_driver, dataset, target_directory, include_tiles=include_tiles)
+
+    palette = dataset_driver.browse_palette(dataset)
+
+    images = [b for b in dataset.browse.values() if not b.tile_size]
+    pending_tiles = [b for b in dataset.browse.values() if b.tile_size]
 
     # Create browse images based on the metadata.
-    for browse_id, browse_metadata in dataset.browse.items():
-        x_constraint = None
-        if browse_metadata.shape:
-            x_constraint = browse_metadata.shape.x
+    for browse_metadata in images + pending_tiles:
+        if browse_metadata.tile_size:
+            if browse_metadata not in pending_tiles:
+                # Already written alongside a browse image.
+                continue
+            output_path = None
+            x_constraint = None
+        else:
+            output_path = browse_metadata.path
+            x_constraint = browse_metadata.shape.x if browse_metadata.shape else None
 
         bands = dataset.image.bands
 
-        necessary_bands = (browse_metadata.red_band, browse_metadata.green_band, browse_metadata.blue_band)
+        necessary_bands = _browse_bands(browse_metadata)
         if not all([bands.get(band) for band in necessary_bands]):
             raise ValueError(
                 'Some browse bands missing. Requires {!r}, has {!r}'
                 ''.format(necessary_bands, bands.keys())
             )
 
+        # Tiles are always cut from full resolution imagery.
+        tiles = []
+        if not x_constraint:
+            tiles = [t for t in pending_tiles if _browse_bands(t) == necessary_bands]
+            pending_tiles = [t for t in pending_tiles if t not in tiles]
+
+        tile_pyramids = [(t.path, t.tile_size, t.file_type) for t in tiles]
         r_path, g_path, b_path = [bands[p].path for p in necessary_bands]
-        cols, rows, output_res = _create_thumbnail(
-            r_path,
-            g_path,
-            b_path,
-            browse_metadata.path,
-            x_constraint=x_constraint
-        )
+        if palette and len(set(necessary_bands)) == 1:
+            cols, rows, output_res = _create_palette_thumbnail(
+                r_path,
+                output_path,
+                palette,
+                x_constraint=x_constraint,
+                tile_pyramids=tile_pyramids,
+                after_file_creation=after_file_creation
+            )
+        else:
+            cols, rows, output_res = _create_thumbnail(
+                r_path,
+                g_path,
+                b_path,
+                output_path,
+                x_constraint=x_constraint,
+                tile_pyramids=tile_pyramids,
+                after_file_creation=after_file_creation
+            )
         # Update with the exact shape information.
-        browse_metadata.shape = ptype.Point(cols, rows)
-        browse_metadata.cell_size = output_res
+        for md in [browse_metadata] + tiles:
+            md.shape = ptype.Point(cols, rows)
+            md.cell_size = output_res
 
-        after_file_creation(browse_metadata.path)
+        if output_path:
+            after_file_creation(output_path)
 
     return dataset
 
 
-def regenerate_browse_image(dataset_directory):
+def regenerate_browse_image(dataset_directory, include_tiles=False):
     """
     Regenerate the browse image for a given dataset path.
 
     (TODO: This doesn't regenerate package checksums yet. It's mostly useful for development.)
 
     :param dataset_directory:
+    :param include_tiles: Also create a tile pyramid of the browse image.
     :return:
     """
     dataset_metadata = serialise.read_dataset_metadata(dataset_directory)
@@ -324,6 +601,9 @@ def regenerate_browse_image(dataset_directory):
     # Clear existing browse metadata, so we can create updated info.
     dataset_metadata.browse = None
 
-    dataset_metadata = create_dataset_browse_images(dataset_driver, dataset_metadata, dataset_directory)
+    dataset_metadata = create_dataset_browse_images(
+        dataset_driver, dataset_metadata, dataset_directory,
+        include_tiles=include_tiles
+    )
 
     serialise.write_dataset_metadata(dataset_directory, dataset_metadata)
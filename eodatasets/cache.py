@@ -0,0 +1,204 @@
+# coding=utf-8
+"""
+Persistent caches of expensive results (footprints, checksums...) between runs.
+
+Caching is opt-in: set EODATASETS_CACHE_DIR to a writable directory to enable it.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+
+_LOG = logging.getLogger(__name__)
+
+CACHE_DIR_ENV_VAR = 'EODATASETS_CACHE_DIR'
+
+DEFAULT_MAX_ENTRIES = 10000
+
+# Readable by both Python 2 and 3.
+_PICKLE_PROTOCOL = 2
+
+# The accessed value for an entry being used now.
+_NEXT_ACCESS = 'select coalesce(max(accessed), 0) + 1 from entry'
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+class LruCache(object):
+    """
+    A persistent key/value store that evicts the least-recently-used entries beyond a maximum size.
+
+    Values are any picklable object. It's safe to use from multiple threads and processes.
+
+    A cache is never essential: if the database can't be read or written (eg. it's locked or corrupt),
+    a warning is logged and lookups miss.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        :type path: str
+        :type max_entries: int
+        """
+        self.path = str(path)
+        self.max_entries = max_entries
+
+        with self._connect() as db:
+            # Recency is a counter rather than a time, so entries used in the same clock tick are still ordered.
+            db.execute('create table if not exists entry ('
+                       'key text primary key, value blob not null, accessed integer not null)')
+            db.execute('create index if not exists entry_accessed on entry (accessed)')
+
+    def _connect(self):
+        return _Connection(sqlite3.connect(self.path, timeout=60))
+
+    def get(self, key, default=None):
+        try:
+            with self._connect() as db:
+                row = db.execute('select value from entry where key = ?', (key,)).fetchone()
+                if row is None:
+                    return default
+                db.execute('update entry set accessed = (%s) where key = ?' % _NEXT_ACCESS, (key,))
+        except sqlite3.Error as e:
+            _LOG.warning('Cannot read cache %s: %s', self.path, e)
+            return default
+        return pickle.loads(bytes(row[0]))
+
+    def put(self, key, value):
+        data = sqlite3.Binary(pickle.dumps(value, _PICKLE_PROTOCOL))
+        try:
+            with self._connect() as db:
+                db.execute('insert or replace into entry (key, value, accessed) values (?, ?, (%s))' % _NEXT_ACCESS,
+                           (key, data))
+                db.execute('delete from entry where key in '
+                           '(select key from entry order by accessed desc limit -1 offset ?)', (self.max_entries,))
+        except sqlite3.Error as e:
+            _LOG.warning('Cannot write to cache %s: %s', self.path, e)
+
+    def invalidate(self, key):
+        with self._connect() as db:
+            db.execute('delete from entry where key = ?', (key,))
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute('delete from entry')
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute('select count(*) from entry').fetchone()[0]
+
+
+class _Connection(object):
+    """
+    Commit (or roll back) and close a connection on exit.
+
+    (sqlite3's own context manager doesn't close the connection)
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        finally:
+            self.connection.close()
+
+
+def get_cache(name, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Get the named persistent cache.
+
+    :type name: str
+    :return: The cache, or None if caching isn't enabled (or the cache can't be created).
+    :rtype: LruCache or None
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if not cache_dir:
+        return None
+
+    path = os.path.join(os.path.abspath(cache_dir), name + '.sqlite')
+    with _CACHES_LOCK:
+        if path not in _CACHES:
+            _CACHES[path] = _create_cache(name, path, max_entries)
+        return _CACHES[path]
+
+
+def _create_cache(name, path, max_entries):
+    """
+    :return: The cache, or None (with a warning) if it can't be created.
+    :rtype: LruCache or None
+    """
+    try:
+        cache_dir = os.path.dirname(path)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        _LOG.debug('Using %s cache %s', name, path)
+        return LruCache(path, max_entries=max_entries)
+    except (OSError, sqlite3.Error) as e:
+        _LOG.warning('Cannot use %s cache %s, continuing without it: %s', name, path, e)
+        return None
+
+
+def clear_caches(names=None):
+    """
+    Empty the persistent caches.
+
+    :param names: The caches to clear (default: all of them).
+    :type names: list[str]
+    :return: The names of the caches that were cleared (those that exist).
+    :rtype: list[str]
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return []
+
+    cache_dir = os.path.abspath(cache_dir)
+    if names is None:
+        names = sorted(file_name[:-len('.sqlite')] for file_name in os.listdir(cache_dir)
+                       if file_name.endswith('.sqlite'))
+
+    cleared = []
+    for name in names:
+        path = os.path.join(cache_dir, name + '.sqlite')
+        if os.path.exists(path):
+            _LOG.info('Clearing %s cache %s', name, path)
+            LruCache(path).clear()
+            cleared.append(name)
+    return cleared
+
+
+def file_identity(path, stat=None):
+    """
+    Identify the current version of a file, without reading it.
+
+    :type path: str or pathlib.Path
+    :param stat: The file's stat result, if already known.
+    :rtype: tuple
+    """
+    path = os.path.abspath(str(path))
+    if stat is None:
+        stat = os.stat(path)
+    return path, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime
+
+
+def make_key(*parts):
+    """
+    A cache key from the reprs of the given values.
+
+    >>> make_key('a', 1) == make_key('a', 1)
+    True
+    >>> make_key('a', 1) == make_key('a', 2)
+    False
+    """
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
@@ -23,3 +23,9 @@ else:
     integer_types = (int, long)
     unicode_to_char = unichr
     long_int = long
+
+try:
+    from os import scandir
+except ImportError:
+    # Python < 3.5: the backport.
+    from scandir import scandir
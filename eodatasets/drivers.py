@@ -5,7 +5,6 @@ import datetime
 import logging
 import re
 import string
-import xml.etree.cElementTree as etree
 from copy import deepcopy
 
 import yaml
@@ -19,13 +18,17 @@ from pathlib import Path
 
 from eodatasets import type as ptype, metadata
 from eodatasets.metadata import _GROUNDSTATION_LIST
-from eodatasets.metadata import mdf, level1, adsfolder, rccfile, \
-    passinfo, pds, npphdf5, image as md_image, gqa, valid_region
+from eodatasets.metadata import level1, extractors, image as md_image, gqa, valid_region
+from eodatasets.inventory import scan_unless_given
+from eodatasets.metadata.util import read_xml_fields
 
 _LOG = logging.getLogger(__name__)
 
 
 class DatasetDriver(object):
+    # Increment when a change to fill_metadata() would change its output, to invalidate cached results.
+    METADATA_VERSION = 1
+
     def get_id(self):
         """
         A short identifier for this type of dataset.
@@ -36,16 +39,31 @@ class DatasetDriver(object):
         """
         raise NotImplementedError()
 
-    def fill_metadata(self, dataset, path, additional_files=()):
+    def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
         """
         Populate the given dataset metadata from the path.
 
         :type additional_files: tuple[Path]
         :type dataset: ptype.DatasetMetadata
         :type path: Path
+        :param inventory: The files in path, if already scanned.
+        :type inventory: eodatasets.inventory.FileInventory
         """
         raise NotImplementedError()
 
+    def external_metadata_files(self, path, inventory=None):
+        """
+        Files outside the dataset path that fill_metadata() reads (eg. a work order in a parent folder).
+
+        Cached metadata is only reused while these are unchanged.
+
+        :type path: Path
+        :param inventory: The files in path, if already scanned.
+        :type inventory: eodatasets.inventory.FileInventory
+        :rtype: list[Path]
+        """
+        return []
+
     def get_ga_label(self, dataset):
         """
         Generate the GA Label ("dataset id") for a dataset.
@@ -122,9 +140,25 @@ class DatasetDriver(object):
 
         return browse_bands
 
-    def calculate_valid_data_region(self, path, mask_value=None):
+    def browse_palette(self, d):
+        """
+        Colour rules for browsing a single-band bitmask product, rather than stretching it.
+
+        A sequence of (mask, value, (r, g, b)) rules: a pixel takes the colour of the first
+        rule where `pixel & mask == value`. Return None for a normal stretched browse image.
+
+        :type d: ptype.DatasetMetadata
+        :rtype: list[(int, int, (int, int, int))] or None
+        """
+        return None
+
+    def calculate_valid_data_region(self, path, mask_value=None, inventory=None):
+        """
+        :type path: Path
+        :type inventory: eodatasets.inventory.FileInventory
+        """
         image_files = [filename
-                       for filename in path.rglob('*')
+                       for filename in scan_unless_given(path, inventory).files()
                        if self.include_file(filename)]
         return valid_region.safe_valid_region(image_files, mask_value)
 
@@ -384,24 +418,25 @@ class RawDriver(DatasetDriver):
             folderident='.'.join(folder_identifier)
         )
 
-    def fill_metadata(self, dataset, path, additional_files=()):
+    def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
         """
         :type additional_files: tuple[Path]
         :type dataset: ptype.DatasetMetadata
         :type path: Path
+        :param inventory: The files in path, if already scanned.
+        :type inventory: eodatasets.inventory.FileInventory
         :rtype: ptype.DatasetMetadata
         """
-        dataset = adsfolder.extract_md(dataset, path)
-        dataset = rccfile.extract_md(dataset, path)
-        dataset = mdf.extract_md(dataset, path)
-        dataset = passinfo.extract_md(dataset, path)
-        dataset = pds.extract_md(dataset, path)
-        dataset = npphdf5.extract_md(dataset, path)
+        dataset = extractors.extract_raw_metadata(dataset, path, scan_unless_given(path, inventory))
 
         # TODO: Antenna coords for groundstation? Heading?
         # TODO: Bands? (or eg. I/Q files?)
         return dataset
 
+    def external_metadata_files(self, path, inventory=None):
+        # Passinfo files may be beside the dataset folder.
+        return scan_unless_given(path, inventory).glob_parent('passinfo*')
+
     def to_band(self, dataset, path):
         # We don't record any bands for a raw dataset (yet?)
         return None
@@ -414,17 +449,22 @@ class OrthoDriver(DatasetDriver):
     def expected_source(self):
         return RawDriver()
 
-    def fill_metadata(self, dataset, path, additional_files=()):
+    def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
         """
         :type additional_files: tuple[Path]
         :type dataset: ptype.DatasetMetadata
         :type path: Path
+        :param inventory: The files in path, if already scanned.
+        :type inventory: eodatasets.inventory.FileInventory
         :rtype: ptype.DatasetMetadata
         """
-        dataset = level1.populate_level1(dataset, path, additional_files)
+        dataset = level1.populate_level1(dataset, path, additional_files, inventory=inventory)
         dataset = gqa.choose_and_populate_gqa(dataset, additional_files)
         return dataset
 
+    def external_metadata_files(self, path, inventory=None):
+        return level1.find_parent_metadata_files(path)
+
     def include_file(self, file_path):
         """
         Exclude .aux.xml paths
@@ -610,11 +650,13 @@ class NbarDriver(DatasetDriver):
         """
         return ptype.BandMetadata(path=path, number=_read_band_number(path))
 
-    def fill_metadata(self, dataset, path, additional_files=()):
+    def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
         """
         :type additional_files: tuple[Path]
         :type dataset: ptype.DatasetMetadata
         :type path: Path
+        :param inventory: The files in path, if already scanned.
+        :type inventory: eodatasets.inventory.FileInventory
         :rtype: ptype.DatasetMetadata
         """
 
@@ -630,7 +672,7 @@ class NbarDriver(DatasetDriver):
             # this code is run. Copying from Source will do for now
             dataset.grid_spatial = deepcopy(dataset.lineage.source_datasets['level1'].grid_spatial)
 
-            dataset.grid_spatial.projection.valid_data = self.calculate_valid_data_region(path)
+            dataset.grid_spatial.projection.valid_data = self.calculate_valid_data_region(path, inventory=inventory)
 
         if not dataset.lineage:
             dataset.lineage = ptype.LineageMetadata()
@@ -751,11 +793,13 @@ class EODSDriver(DatasetDriver):
 
         return ptype.BandMetadata(path=path, number=band_number)
 
-    def fill_metadata(self, dataset, path, additional_files=()):
+    def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
         """
         :type additional_files: tuple[Path]
         :type dataset: ptype.DatasetMetadata
         :type path: Path
+        :param inventory: The files in path, if already scanned.
+        :type inventory: eodatasets.inventory.FileInventory
         :rtype: ptype.DatasetMetadata
         """
 
@@ -793,7 +837,7 @@ class EODSDriver(DatasetDriver):
         dataset.image.satellite_ref_point_start = ptype.Point(int(fields["path"]), int(fields["row"]))
         dataset.image.satellite_ref_point_end = ptype.Point(int(fields["path"]), int(fields["row"]))
 
-        for image_path in path.joinpath("scene01").iterdir():
+        for image_path in scan_unless_given(path, inventory).iterdir(path.joinpath("scene01")):
             band = self.to_band(dataset, image_path)
             if band:
                 dataset.image.bands[band.number] = band
@@ -810,16 +854,21 @@ class EODSDriver(DatasetDriver):
         if not dataset.extent:
             dataset.extent = ptype.ExtentMetadata()
 
-        def els2date(els):
-            if not els:
+        aos_offset = "./ACQUISITIONINFORMATION/EVENT/AOS"
+        los_offset = "./ACQUISITIONINFORMATION/EVENT/LOS"
+        start_offset = "./EXEXTENT/TEMPORALEXTENTFROM"
+        end_offset = "./EXEXTENT/TEMPORALEXTENTTO"
+        xml_fields = read_xml_fields(path.joinpath('metadata.xml'), [aos_offset, los_offset, start_offset, end_offset])
+
+        def field2date(offset):
+            if offset not in xml_fields:
                 return None
-            return parse(els[0].text)
+            return parse(xml_fields[offset])
 
-        doc = etree.parse(str(path.joinpath('metadata.xml')))
-        aos = els2date(doc.findall("./ACQUISITIONINFORMATION/EVENT/AOS"))
-        los = els2date(doc.findall("./ACQUISITIONINFORMATION/EVENT/LOS"))
-        start_time = els2date(doc.findall("./EXEXTENT/TEMPORALEXTENTFROM"))
-        end_time = els2date(doc.findall("./EXEXTENT/TEMPORALEXTENTTO"))
+        aos = field2date(aos_offset)
+        los = field2date(los_offset)
+        start_time = field2date(start_offset)
+        end_time = field2date(end_offset)
 
         # check if the dates in the metadata file are at least as accurate as what we have
         filename_time = datetime.datetime.strptime(fields["date"], "%Y%m%d")
@@ -853,11 +902,13 @@ class PqaDriver(DatasetDriver):
             '{satnumber}_{sensor}_PQ_{galevel}_GAPQ01-{stationcode}_{path}_{rows}_{day}',
         )
 
-    def fill_metadata(self, dataset, path, additional_files=()):
+    def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
         """
         :type additional_files: tuple[Path]
         :type dataset: ptype.DatasetMetadata
         :type path: Path
+        :param inventory: The files in path, if already scanned.
+        :type inventory: eodatasets.inventory.FileInventory
         :rtype: ptype.DatasetMetadata
         """
         dataset.ga_level = 'P55'
@@ -873,7 +924,9 @@ class PqaDriver(DatasetDriver):
 
             contiguous_data_bit = 0b100000000
 
-            dataset.grid_spatial.projection.valid_data = self.calculate_valid_data_region(path, contiguous_data_bit)
+            dataset.grid_spatial.projection.valid_data = self.calculate_valid_data_region(
+                path, contiguous_data_bit, inventory=inventory
+            )
 
         dataset.format_ = ptype.FormatMetadata('GeoTIFF')
 
@@ -946,6 +999,27 @@ class PqaDriver(DatasetDriver):
     def browse_image_bands(self, d):
         return 'pqa',
 
+    def browse_palette(self, d):
+        # Bits are set when a test passes (ie. when the pixel is good).
+        contiguity_bit = 1 << 8
+        cloud_bits = (1 << 10, 1 << 11)  # ACCA, Fmask
+        cloud_shadow_bits = (1 << 12, 1 << 13)  # ACCA, Fmask
+        saturation_bits = [1 << band_bit for band_bit in range(8)]
+
+        no_data = (0, 0, 0)
+        cloud = (255, 255, 255)
+        cloud_shadow = (64, 64, 64)
+        saturated = (255, 0, 255)
+        clear = (34, 139, 34)
+
+        return (
+            [(contiguity_bit, 0, no_data)] +
+            [(bit, 0, cloud) for bit in cloud_bits] +
+            [(bit, 0, cloud_shadow) for bit in cloud_shadow_bits] +
+            [(bit, 0, saturated) for bit in saturation_bits] +
+            [(0, 0, clear)]
+        )
+
 
 PACKAGE_DRIVERS = {
     'raw': RawDriver(),
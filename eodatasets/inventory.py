@@ -0,0 +1,210 @@
+# coding=utf-8
+"""
+A listing of the files in an input dataset, read once and shared by every stage of packaging.
+"""
+from __future__ import absolute_import
+
+import fnmatch
+import logging
+
+from pathlib import Path, PurePath
+
+from eodatasets.compat import scandir
+
+_LOG = logging.getLogger(__name__)
+
+
+class FileInventory(object):
+    """
+    The files and directories beneath a path, as they were when scanned.
+
+    Queries mirror their pathlib equivalents (glob, rglob, iterdir...), but never touch the
+    filesystem: metadata operations are slow on our shared filesystems, and many
+    extractors look at the same input directory.
+
+    Inventories are immutable. The entries beside the root (in its parent directory) are also
+    listed, once, if they're queried.
+    """
+
+    def __init__(self, root, directories):
+        """
+        Use FileInventory.scan() to create one.
+
+        :type root: pathlib.Path
+        :param directories: Entries (name, is_dir) of each directory, by path relative to the root.
+        :type directories: dict[pathlib.PurePath, tuple[(str, bool)]]
+        """
+        self._root = Path(root)
+        self._directories = directories
+        # Names in the root's parent directory, when first needed.
+        self._parent_names = None
+
+    @classmethod
+    def scan(cls, path):
+        """
+        Read the inventory of a directory.
+
+        The inventory of a file (or missing path) has no entries.
+
+        :type path: pathlib.Path or str
+        :rtype: FileInventory
+        """
+        path = Path(path)
+        directories = {}
+
+        if path.is_dir():
+            pending = [PurePath()]
+            while pending:
+                relative_directory = pending.pop()
+                entries = []
+                subdirectories = []
+                for entry in scandir(str(path / relative_directory)):
+                    # Like rglob(), symlinks to directories are directories, but aren't followed.
+                    is_dir = entry.is_dir()
+                    entries.append((entry.name, is_dir))
+                    if is_dir and not entry.is_symlink():
+                        subdirectories.append(relative_directory / entry.name)
+                directories[relative_directory] = tuple(entries)
+                pending.extend(reversed(subdirectories))
+
+            _LOG.debug('Scanned %s directories in %s', len(directories), path)
+
+        return cls(path, directories)
+
+    @property
+    def root(self):
+        """
+        :rtype: pathlib.Path
+        """
+        return self._root
+
+    def with_root(self, root):
+        """
+        The same inventory under another path to the root (eg. its absolute path).
+
+        :type root: pathlib.Path
+        :rtype: FileInventory
+        """
+        return FileInventory(root, self._directories)
+
+    def _relative(self, path):
+        if path is None:
+            return PurePath()
+        return PurePath(path).relative_to(str(self._root))
+
+    def is_dir(self, path=None):
+        """
+        Was the path (default: the root) scanned as a directory?
+
+        (Linked directories aren't followed, so aren't included)
+
+        :type path: pathlib.Path
+        :rtype: bool
+        """
+        return self._relative(path) in self._directories
+
+    def iterdir(self, directory=None):
+        """
+        The entries of a directory (default: the root).
+
+        :type directory: pathlib.Path
+        :rtype: list[pathlib.Path]
+        """
+        relative_directory = self._relative(directory)
+        return [self._root / relative_directory / name
+                for name, is_dir in self._directories.get(relative_directory, ())]
+
+    def glob(self, pattern, directory=None):
+        """
+        Entries of a directory (default: the root) whose name matches the pattern.
+
+        :type pattern: str
+        :type directory: pathlib.Path
+        :rtype: list[pathlib.Path]
+        """
+        relative_directory = self._relative(directory)
+        return [self._root / relative_directory / name
+                for name, is_dir in self._directories.get(relative_directory, ())
+                if fnmatch.fnmatchcase(name, pattern)]
+
+    def glob_parent(self, pattern):
+        """
+        Entries beside the root (in its parent directory) whose name matches the pattern.
+
+        The parent directory isn't part of the scan: it's listed (not recursively) on first use.
+
+        :type pattern: str
+        :rtype: list[pathlib.Path]
+        """
+        parent = self._root.parent
+        if self._parent_names is None:
+            try:
+                self._parent_names = tuple(entry.name for entry in scandir(str(parent)))
+            except OSError:
+                self._parent_names = ()
+        return [parent / name for name in self._parent_names if fnmatch.fnmatchcase(name, pattern)]
+
+    def rglob(self, pattern):
+        """
+        All entries beneath the root whose name matches the pattern (in the same order as rglob()).
+
+        :type pattern: str
+        :rtype: list[pathlib.Path]
+        """
+        return [self._root / relative_path
+                for relative_path, is_dir in self._walk()
+                if fnmatch.fnmatchcase(relative_path.name, pattern)]
+
+    def relative_files(self):
+        """
+        Paths of all files beneath the root, relative to the root.
+
+        :rtype: list[pathlib.PurePath]
+        """
+        return [relative_path for relative_path, is_dir in self._walk() if not is_dir]
+
+    def files(self):
+        """
+        All files beneath the root.
+
+        :rtype: list[pathlib.Path]
+        """
+        return [self._root / relative_path for relative_path in self.relative_files()]
+
+    def _walk(self):
+        """
+        (relative path, is_dir) of every entry, with each directory's entries before its subdirectories'.
+        """
+        pending = [PurePath()] if self._directories else []
+        while pending:
+            relative_directory = pending.pop()
+            subdirectories = []
+            for name, is_dir in self._directories[relative_directory]:
+                relative_path = relative_directory / name
+                yield relative_path, is_dir
+                if relative_path in self._directories:
+                    subdirectories.append(relative_path)
+            pending.extend(reversed(subdirectories))
+
+    def __eq__(self, other):
+        return isinstance(other, FileInventory) and \
+            self._root == other._root and self._directories == other._directories
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'FileInventory(%r)' % (self._root,)
+
+
+def scan_unless_given(path, inventory=None):
+    """
+    The given inventory of path, or a new one.
+
+    :type path: pathlib.Path
+    :type inventory: FileInventory
+    :rtype: FileInventory
+    """
+    if inventory is None:
+        return FileInventory.scan(path)
+    return inventory
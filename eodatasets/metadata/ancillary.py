@@ -0,0 +1,100 @@
+# coding=utf-8
+"""
+Locating ancillary files (CPFs, BPFs, RLUTs...) within large shared ancillary directories.
+"""
+from __future__ import absolute_import
+
+import logging
+import os
+import threading
+
+from pathlib import Path
+
+from eodatasets.compat import scandir
+
+_LOG = logging.getLogger(__name__)
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+class DirectoryIndex(object):
+    """
+    The files beneath a directory, by name.
+
+    The directory is walked once, and only walked again when a name isn't found (or a file found
+    has since been removed), so finding a file is a dictionary lookup and a stat of its matches.
+    A missing file costs a fresh walk, but that's an error for ancillary files anyway.
+
+    Matches are returned in the same order as pathlib's rglob(), and symlinked directories are not
+    followed (also like rglob()).
+    """
+
+    def __init__(self, root):
+        """
+        :type root: str or pathlib.Path
+        """
+        self.root = os.path.abspath(str(root))
+
+        self._lock = threading.Lock()
+        #: :type: dict[str, list[str]]
+        self._paths_by_name = None
+
+    def find(self, name):
+        """
+        All files with the given name beneath the root.
+
+        :type name: str
+        :rtype: list[pathlib.Path]
+        """
+        with self._lock:
+            if self._paths_by_name is None or not self._still_exist(self._paths_by_name.get(name)):
+                self._build()
+            return [Path(p) for p in self._paths_by_name.get(name, ())]
+
+    @staticmethod
+    def _still_exist(paths):
+        return bool(paths) and all(os.path.exists(p) for p in paths)
+
+    def _build(self):
+        _LOG.debug('Indexing %s', self.root)
+        directory_count = 0
+        paths_by_name = {}
+
+        # Depth-first, with each directory's files before its subdirectories'.
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = list(scandir(directory))
+            except OSError:
+                _LOG.warning('Unreadable ancillary directory %s', directory)
+                continue
+            directory_count += 1
+
+            subdirectories = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                else:
+                    paths_by_name.setdefault(entry.name, []).append(entry.path)
+            pending.extend(reversed(subdirectories))
+
+        _LOG.debug('Indexed %s files in %s directories', sum(map(len, paths_by_name.values())), directory_count)
+        self._paths_by_name = paths_by_name
+
+
+def get_directory_index(root):
+    """
+    Get the shared index of the given directory.
+
+    Every dataset packaged in a process uses the same index, so a directory is only walked once.
+
+    :type root: str or pathlib.Path
+    :rtype: DirectoryIndex
+    """
+    root = os.path.abspath(str(root))
+    with _INDEXES_LOCK:
+        if root not in _INDEXES:
+            _INDEXES[root] = DirectoryIndex(root)
+        return _INDEXES[root]
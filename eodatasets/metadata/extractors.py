@@ -0,0 +1,78 @@
+# coding=utf-8
+"""
+The metadata extractors for raw (telemetry) datasets.
+
+Each extractor reads one kind of raw input (RCC files, MDF files, PDS files...). Raw datasets
+come from many satellites, so an extractor also has a cheap probe to say whether it could
+apply to a given input, based on the names of its files.
+
+New kinds of input can be supported by registering another extractor.
+"""
+from __future__ import absolute_import
+
+import collections
+import logging
+
+from . import adsfolder, rccfile, mdf, passinfo, pds, npphdf5
+
+_LOG = logging.getLogger(__name__)
+
+RawExtractor = collections.namedtuple('RawExtractor', ('name', 'extract', 'probe'))
+
+#: In the order they're run.
+#: :type: list[RawExtractor]
+_RAW_EXTRACTORS = []
+
+
+def register_raw_extractor(name, extract, probe=None):
+    """
+    Add an extractor for raw datasets, run after those already registered.
+
+    Registering an existing name replaces that extractor (in its original position).
+
+    :param extract: Populate metadata from the input: (dataset, path, inventory) -> dataset
+    :type extract: (DatasetMetadata, Path, FileInventory) -> DatasetMetadata
+    :param probe: Could the extractor apply to the input? (default: always run it)
+                  It should be cheap, and only look at the inventory.
+    :type probe: (FileInventory) -> bool
+    """
+    extractor = RawExtractor(name, extract, probe)
+    for i, existing in enumerate(_RAW_EXTRACTORS):
+        if existing.name == name:
+            _RAW_EXTRACTORS[i] = extractor
+            return
+    _RAW_EXTRACTORS.append(extractor)
+
+
+def raw_extractors():
+    """
+    :rtype: list[RawExtractor]
+    """
+    return list(_RAW_EXTRACTORS)
+
+
+def extract_raw_metadata(dataset, path, inventory):
+    """
+    Run each registered extractor that applies to the input.
+
+    :type dataset: eodatasets.type.DatasetMetadata
+    :type path: pathlib.Path
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: eodatasets.type.DatasetMetadata
+    """
+    for extractor in raw_extractors():
+        if extractor.probe is not None and not extractor.probe(inventory):
+            _LOG.debug('No %s metadata in %s', extractor.name, path)
+            continue
+
+        dataset = extractor.extract(dataset, path, inventory)
+    return dataset
+
+
+# Folder names are always read: they hold orbits and groundstations for many satellites.
+register_raw_extractor('adsfolder', lambda dataset, path, inventory: adsfolder.extract_md(dataset, path))
+register_raw_extractor('rccfile', rccfile.extract_md, rccfile.probe)
+register_raw_extractor('mdf', mdf.extract_md, mdf.probe)
+register_raw_extractor('passinfo', passinfo.extract_md, passinfo.probe)
+register_raw_extractor('pds', pds.extract_md, pds.probe)
+register_raw_extractor('npphdf5', npphdf5.extract_md, npphdf5.probe)
@@ -1,10 +1,25 @@
 # coding=utf-8
 from __future__ import absolute_import
 
+import collections
+import threading
+from multiprocessing.pool import ThreadPool
+
 from osgeo import gdal, osr
 
 import eodatasets.type as ptype
 
+# Band headers to read at once. Reading headers is mostly waiting on the filesystem.
+HEADER_READ_WORKERS = 8
+
+# The grid of an image: its CRS (as wkt), geotransform and (cols, rows).
+_Grid = collections.namedtuple('_Grid', ('projection', 'geotransform', 'shape'))
+
+# Spatial references and transformations to geographic coordinates, per CRS wkt.
+_SPATIAL_REFS = {}
+_GEOGRAPHIC_TRANSFORMS = {}
+_CACHE_LOCK = threading.Lock()
+
 
 def _get_extent(gt, cols, rows):
     """ Return the corner coordinates from a geotransform
@@ -74,7 +89,7 @@ ll=Coord(lat=-26.992, lon=133.962), \
 lr=Coord(lat=-26.991, lon=136.26)\
 )
     """
-    transform = osr.CoordinateTransformation(source_spatial_ref, source_spatial_ref.CloneGeogCS())
+    transform = _geographic_transform(source_spatial_ref)
 
     def _reproject_point(p):
         x, y, height = transform.TransformPoint(p.x, p.y)
@@ -83,6 +98,31 @@ lr=Coord(lat=-26.991, lon=136.26)\
     return _map_polygon(_reproject_point, coords)
 
 
+def _spatial_ref(wkt):
+    """
+    :type wkt: str
+    :rtype: osr.SpatialReference
+    """
+    with _CACHE_LOCK:
+        if wkt not in _SPATIAL_REFS:
+            _SPATIAL_REFS[wkt] = osr.SpatialReference(wkt)
+        return _SPATIAL_REFS[wkt]
+
+
+def _geographic_transform(spatial_ref):
+    """
+    Transformation from the given CRS to its geographic CRS. Created once per CRS.
+
+    :type spatial_ref: osr.SpatialReference
+    :rtype: osr.CoordinateTransformation
+    """
+    wkt = spatial_ref.ExportToWkt()
+    with _CACHE_LOCK:
+        if wkt not in _GEOGRAPHIC_TRANSFORMS:
+            _GEOGRAPHIC_TRANSFORMS[wkt] = osr.CoordinateTransformation(spatial_ref, spatial_ref.CloneGeogCS())
+        return _GEOGRAPHIC_TRANSFORMS[wkt]
+
+
 def _map_polygon(f, poly, poly_cls=ptype.CoordPolygon):
     """
     Map all values of a polygon.
@@ -94,62 +134,89 @@ def _map_polygon(f, poly, poly_cls=ptype.CoordPolygon):
     return poly_cls(ul=f(poly.ul), ur=f(poly.ur), ll=f(poly.ll), lr=f(poly.lr))
 
 
-def _get_gdal_image_coords(i):
+def _read_grid(path):
+    """
+    Read the grid of an image from its header.
+
+    :type path: pathlib.Path
+    :return: The grid, or None if the image can't be opened
+    :rtype: _Grid
+    """
+    i = gdal.Open(str(path))
+    if not i:
+        return None
+    return _Grid(i.GetProjectionRef(), tuple(i.GetGeoTransform()), (i.RasterXSize, i.RasterYSize))
+
+
+def _read_grids(paths):
     """
-    :type i: osgeo.gdal.Dataset
-    :rtype: ptype.PointPolygon
+    Read the grids of many images, in parallel.
+
+    :type paths: list[pathlib.Path]
+    :rtype: list[_Grid]
     """
-    return _get_extent(i.GetGeoTransform(), i.RasterXSize, i.RasterYSize)
+    if len(paths) < 2:
+        return [_read_grid(path) for path in paths]
+
+    pool = ThreadPool(min(HEADER_READ_WORKERS, len(paths)))
+    try:
+        return pool.map(_read_grid, paths)
+    finally:
+        pool.close()
+        pool.join()
 
 
 def populate_from_image_metadata(md):
     """
     Populate by extracting metadata from existing band files.
 
+    Only image headers are read. The dataset projection and extent come from the grid of the
+    last readable band.
+
     :type md: eodatasets.type.DatasetMetadata
     :rtype: eodatasets.type.DatasetMetadata
     """
+    bands = list(md.image.bands.values())
+    grids = _read_grids([band.path for band in bands])
 
-    for band_id, band in md.image.bands.items():
-        i = gdal.Open(str(band.path))
-        if not i:
+    dataset_grid = None
+    for band, grid in zip(bands, grids):
+        if not grid:
             # TODO: log? throw?
             continue
-        spacial_ref = osr.SpatialReference(i.GetProjectionRef())
 
-        # Extract actual image coords
-        # md.grid_spatial.projection.
-        band.shape = ptype.Point(i.RasterXSize, i.RasterYSize)
-        band.cell_size = ptype.Point(abs(i.GetGeoTransform()[1]), abs(i.GetGeoTransform()[5]))
+        cols, rows = grid.shape
+        band.shape = ptype.Point(cols, rows)
+        band.cell_size = ptype.Point(abs(grid.geotransform[1]), abs(grid.geotransform[5]))
+        dataset_grid = grid
 
-        # TODO separately: create standardised WGS84 coords. for md.extent
-        # wkt_contents = spacial_ref.ExportToPrettyWkt()
-        # TODO: if srs IsGeographic()? Otherwise srs IsProjected()?
-        if not md.grid_spatial:
-            md.grid_spatial = ptype.GridSpatialMetadata()
+    if not dataset_grid:
+        return md
 
-        if not md.grid_spatial.projection:
-            md.grid_spatial.projection = ptype.ProjectionMetadata()
+    spacial_ref = _spatial_ref(dataset_grid.projection)
 
-        md.grid_spatial.projection.geo_ref_points = _get_gdal_image_coords(i)
-        md.grid_spatial.projection.unit = spacial_ref.GetLinearUnitsName()
-        md.grid_spatial.projection.zone = spacial_ref.GetUTMZone()
+    # TODO separately: create standardised WGS84 coords. for md.extent
+    # wkt_contents = spacial_ref.ExportToPrettyWkt()
+    # TODO: if srs IsGeographic()? Otherwise srs IsProjected()?
+    if not md.grid_spatial:
+        md.grid_spatial = ptype.GridSpatialMetadata()
 
-        # ?
-        md.grid_spatial.projection.datum = 'GDA94'
-        md.grid_spatial.projection.ellipsoid = 'GRS80'
+    if not md.grid_spatial.projection:
+        md.grid_spatial.projection = ptype.ProjectionMetadata()
 
-        # TODO: DATUM/Reference system etc.
+    md.grid_spatial.projection.geo_ref_points = _get_extent(dataset_grid.geotransform, *dataset_grid.shape)
+    md.grid_spatial.projection.unit = spacial_ref.GetLinearUnitsName()
+    md.grid_spatial.projection.zone = spacial_ref.GetUTMZone()
 
-        if not md.extent:
-            md.extent = ptype.ExtentMetadata()
-        md.extent.coord = reproject_coords(md.grid_spatial.projection.geo_ref_points, spacial_ref)
+    # ?
+    md.grid_spatial.projection.datum = 'GDA94'
+    md.grid_spatial.projection.ellipsoid = 'GRS80'
 
-        # Get positional info, projection etc.
+    # TODO: DATUM/Reference system etc.
 
-        # Is projection/etc same as previous?
-        #  -- If all match, set on wider image.
-        i = None
+    if not md.extent:
+        md.extent = ptype.ExtentMetadata()
+    md.extent.coord = reproject_coords(md.grid_spatial.projection.geo_ref_points, spacial_ref)
 
     return md
 
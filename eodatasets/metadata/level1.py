@@ -5,32 +5,40 @@ import datetime
 import fnmatch
 import logging
 import re
-import xml.etree.cElementTree as etree
 
 import dateutil.parser
 from pathlib import Path
 
 import eodatasets.type as ptype
-from .util import parse_type
+from eodatasets.inventory import scan_unless_given
+from .ancillary import get_directory_index
+from .util import parse_type, read_xml_fields
 
 _LOG = logging.getLogger(__name__)
 
+# Processing files, which may be in a parent folder of the dataset.
+_WORK_ORDER_FILE = 'work_order.xml'
+_LPGS_OUT_FILE = 'lpgs_out.xml'
 
-def populate_level1(md, base_folder, additional_files):
+
+def populate_level1(md, base_folder, additional_files, inventory=None):
     """
     Find any relevant Ortho metadata files for the given dataset and populate it.
 
     :type md: eodatasets.type.DatasetMetadata
     :type base_folder: pathlib.Path
     :type additional_files: tuple[Path]
+    :param inventory: The files in base_folder, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :rtype: eodatasets.type.DatasetMetadata
     """
-    mtl_path = _get_mtl(base_folder)
-    work_order = _find_one('work_order.xml', additional_files) or _find_parent_file(base_folder, 'work_order.xml')
-    lpgs_out = _find_one('lpgs_out.xml', additional_files) or _find_parent_file(base_folder, 'lpgs_out.xml')
+    inventory = scan_unless_given(base_folder, inventory)
+    mtl_path = _get_mtl(base_folder, inventory)
+    work_order = _find_one(_WORK_ORDER_FILE, additional_files) or _find_parent_file(base_folder, _WORK_ORDER_FILE)
+    lpgs_out = _find_one(_LPGS_OUT_FILE, additional_files) or _find_parent_file(base_folder, _LPGS_OUT_FILE)
 
     # In the same folder as the MTL is an XML file with start/stop times. An "EODS_DATASET", but output by Pinkmatter?
-    pseudo_eods_metadata = list(mtl_path.parent.glob('L*.xml'))
+    pseudo_eods_metadata = inventory.glob('L*.xml', mtl_path.parent)
 
     return _populate_ortho_from_files(
         base_folder, md,
@@ -41,11 +49,6 @@ def populate_level1(md, base_folder, additional_files):
     )
 
 
-def _xml_val(doc):
-    from_dt = doc.findall("./EXEXTENT/TEMPORALEXTENTFROM")[0].text
-    return from_dt
-
-
 def _find_one(pattern, files):
     """
     :type files: tuple[pathlib.Path]
@@ -60,31 +63,35 @@ def _find_one(pattern, files):
     return None
 
 
-def _get_mtl(base_folder):
-    return _get_file(base_folder, '*_MTL.txt')
+def _get_mtl(base_folder, inventory):
+    return _choose_file(inventory.rglob('*_MTL.txt'), base_folder, '*_MTL.txt')
 
 
 def _load_mtl(filename, root='L1_METADATA_FILE', pairs=r'(\w+)\s=\s(.*)'):
     """Parse an MTL file and return dict-of-dict's containing the metadata."""
-
-    def parse(lines, tree, level=0):
-        """Parse it"""
-        while lines:
-            line = lines.pop(0)
-            match = re.findall(pairs, line)
-            if match:
-                key, value = match[0]
-                if key == 'GROUP':
-                    tree[value] = {}
-                    parse(lines, tree[value], level + 1)
-                elif key == 'END_GROUP':
-                    break
-                else:
-                    tree[key.lower()] = parse_type(value)
+    pair_pattern = re.compile(pairs)
 
     tree = {}
+    # The groups we're within: the innermost is last.
+    groups = [tree]
     with open(str(filename), 'r') as fo:
-        parse(fo.readlines(), tree)
+        for line in fo:
+            match = pair_pattern.search(line)
+            if not match:
+                continue
+
+            key, value = match.group(1, 2)
+            if key == 'GROUP':
+                group = {}
+                groups[-1][value] = group
+                groups.append(group)
+            elif key == 'END_GROUP':
+                groups.pop()
+                if not groups:
+                    # Unbalanced: nothing more can be read.
+                    break
+            else:
+                groups[-1][key.lower()] = parse_type(value)
 
     return tree[root]
 
@@ -157,8 +164,26 @@ def _read_bands(mtl_, folder_path):
 
 
 def _get_file(path, file_pattern, mandatory=True):
-    found = list(path.rglob(file_pattern))
+    return _choose_file(list(path.rglob(file_pattern)), path, file_pattern, mandatory=mandatory)
 
+
+def _get_ancillary_file(path, file_name):
+    """
+    Find the named file within an ancillary directory.
+
+    Ancillary directories are large and shared between datasets, so they're indexed once
+    rather than searched for every file.
+
+    :type path: pathlib.Path
+    :type file_name: str
+    :rtype: pathlib.Path
+    """
+    if any(c in file_name for c in '*?['):
+        return _get_file(path, file_name)
+    return _choose_file(get_directory_index(path).find(file_name), path, file_name)
+
+
+def _choose_file(found, path, file_pattern, mandatory=True):
     if not found:
         if mandatory:
             raise RuntimeError('Not found: %r in %s' % (file_pattern, path))
@@ -174,6 +199,17 @@ def _get_file(path, file_pattern, mandatory=True):
     return found[0]
 
 
+def find_parent_metadata_files(base_folder):
+    """
+    The processing files (work order, LPGS output) found for a dataset in its folder or a parent folder.
+
+    :type base_folder: pathlib.Path
+    :rtype: list[pathlib.Path]
+    """
+    found = (_find_parent_file(base_folder, name) for name in (_WORK_ORDER_FILE, _LPGS_OUT_FILE))
+    return [path for path in found if path]
+
+
 def _find_parent_file(path, pattern, max_levels=3):
     found = list(path.glob(pattern))
     if found:
@@ -210,9 +246,10 @@ def _remove_missing(dict_):
     return {k: v for k, v in dict_.items() if v is not None}
 
 
-def _get_ancillary_metadata(mtl_doc, wo_doc, mtl_name_offset=None, order_dir_offset=None, properties_offsets=None):
+def _get_ancillary_metadata(mtl_doc, wo_fields, mtl_name_offset=None, order_dir_offset=None,
+                            properties_offsets=None):
     #: :type: Path
-    specified_path = _get_node_text(order_dir_offset, wo_doc, Path) if order_dir_offset and wo_doc else None
+    specified_path = _get_node_text(order_dir_offset, wo_fields, Path) if order_dir_offset and wo_fields else None
     used_file_name = _get(mtl_doc, *mtl_name_offset) if mtl_name_offset and mtl_doc else None
 
     # Read any properties of the ancillary file form the MTL.
@@ -241,19 +278,18 @@ def _get_ancillary_metadata(mtl_doc, wo_doc, mtl_name_offset=None, order_dir_off
         if not used_file_name:
             return None
 
-        file_path = _get_file(specified_path, used_file_name)
+        file_path = _get_ancillary_file(specified_path, used_file_name)
 
     _LOG.info('Found ancillary path %s', file_path)
     return ptype.AncillaryMetadata.from_file(file_path, properties=properties)
 
 
-def _get_node_text(offset, parsed_doc, type_):
-    xml_node = parsed_doc.findall(offset)
-    if not xml_node:
+def _get_node_text(offset, xml_fields, type_):
+    if offset not in xml_fields:
         _LOG.debug('XML doesn’t contain offset %r', offset)
         return None
 
-    return type_(str(xml_node[0].text).strip())
+    return type_(str(xml_fields[offset]).strip())
 
 
 def _populate_ortho_from_files(base_folder, md, mtl_path, work_order_path,
@@ -267,23 +303,22 @@ def _populate_ortho_from_files(base_folder, md, mtl_path, work_order_path,
     mtl_doc = _load_mtl(mtl_path.absolute())
 
     _LOG.info('Reading work order %r', work_order_path)
-    work_order_doc = _load_xml(work_order_path) if work_order_path else None
+    work_order_fields = read_xml_fields(work_order_path, _WORK_ORDER_OFFSETS) if work_order_path else None
 
     md = _populate_from_mtl_dict(md, mtl_doc, base_folder)
 
-    ancil_files = _get_ancil_files(mtl_doc, work_order_doc)
+    ancil_files = _get_ancil_files(mtl_doc, work_order_fields)
     md.lineage.ancillary.update(ancil_files)
 
     if lpgs_out_path:
         _LOG.info('Reading lpgs_out: %r', lpgs_out_path)
-        lpgs_out_doc = _load_xml(lpgs_out_path)
-        pinkmatter_version = lpgs_out_doc.findall('./Version')[0].text
+        pinkmatter_version = read_xml_fields(lpgs_out_path, ['./Version'])['./Version']
 
         md.lineage.machine.note_software_version('pinkmatter', str(pinkmatter_version))
         # We could read the processing hostname, start & stop times too. Do we care? We get it elsewhere.
 
     if pseudo_eods_metadata:
-        doc = _load_xml(pseudo_eods_metadata)
+        doc = read_xml_fields(pseudo_eods_metadata, ["./EXEXTENT/TEMPORALEXTENTFROM", "./EXEXTENT/TEMPORALEXTENTTO"])
         from_dt = _get_node_text("./EXEXTENT/TEMPORALEXTENTFROM", doc, dateutil.parser.parse)
         md.extent.from_dt = md.extent.from_dt or from_dt
         to_dt = _get_node_text("./EXEXTENT/TEMPORALEXTENTTO", doc, dateutil.parser.parse)
@@ -292,51 +327,55 @@ def _populate_ortho_from_files(base_folder, md, mtl_path, work_order_path,
     return md
 
 
-def _load_xml(path):
-    return etree.parse(str(path))
-
-
-def _get_ancil_files(mtl_doc, work_order_doc):
-    ancil_files = _remove_missing({
-        'cpf': _get_ancillary_metadata(
-            mtl_doc, work_order_doc,
-            mtl_name_offset=('PRODUCT_METADATA', 'cpf_name'),
-            order_dir_offset='./L0RpProcessing/CalibrationFile'
-        ),
-        'bpf_oli': _get_ancillary_metadata(
-            mtl_doc, work_order_doc,
-            mtl_name_offset=('PRODUCT_METADATA', 'bpf_name_oli'),
-            order_dir_offset='./L1Processing/BPFOliFile'
-        ),
-        'bpf_tirs': _get_ancillary_metadata(
-            mtl_doc, work_order_doc,
-            mtl_name_offset=('PRODUCT_METADATA', 'bpf_name_tirs'),
-            order_dir_offset='./L1Processing/BPFTirsFile'
-        ),
-        'rlut': _get_ancillary_metadata(
-            mtl_doc, work_order_doc,
-            mtl_name_offset=('PRODUCT_METADATA', 'rlut_file_name'),
-            order_dir_offset='./L1Processing/RlutFile'
-        ),
-        'ephemeris': _get_ancillary_metadata(
-            mtl_doc, work_order_doc,
-            mtl_name_offset=None,
-            order_dir_offset='./L1Processing/EphemerisFile',
-            properties_offsets={
-                'type': ('PRODUCT_METADATA', 'ephemeris_type')
-            }
-        ),
-        'tirs_ssm_position': _get_ancillary_metadata(
-            mtl_doc, work_order_doc,
-            mtl_name_offset=None,
-            order_dir_offset='./L1Processing/TirsSsmPositionFile',
-            properties_offsets={
-                'model': ('IMAGE_ATTRIBUTES', 'tirs_ssm_model'),
-                'position_status': ('IMAGE_ATTRIBUTES', 'tirs_ssm_position_status')
-            }
-        )
+# Where to find each ancillary file's name (in the MTL) and search directory (in the work order).
+_ANCILLARY_FILES = {
+    'cpf': dict(
+        mtl_name_offset=('PRODUCT_METADATA', 'cpf_name'),
+        order_dir_offset='./L0RpProcessing/CalibrationFile'
+    ),
+    'bpf_oli': dict(
+        mtl_name_offset=('PRODUCT_METADATA', 'bpf_name_oli'),
+        order_dir_offset='./L1Processing/BPFOliFile'
+    ),
+    'bpf_tirs': dict(
+        mtl_name_offset=('PRODUCT_METADATA', 'bpf_name_tirs'),
+        order_dir_offset='./L1Processing/BPFTirsFile'
+    ),
+    'rlut': dict(
+        mtl_name_offset=('PRODUCT_METADATA', 'rlut_file_name'),
+        order_dir_offset='./L1Processing/RlutFile'
+    ),
+    'ephemeris': dict(
+        mtl_name_offset=None,
+        order_dir_offset='./L1Processing/EphemerisFile',
+        properties_offsets={
+            'type': ('PRODUCT_METADATA', 'ephemeris_type')
+        }
+    ),
+    'tirs_ssm_position': dict(
+        mtl_name_offset=None,
+        order_dir_offset='./L1Processing/TirsSsmPositionFile',
+        properties_offsets={
+            'model': ('IMAGE_ATTRIBUTES', 'tirs_ssm_model'),
+            'position_status': ('IMAGE_ATTRIBUTES', 'tirs_ssm_position_status')
+        }
+    ),
+}
+
+_WORK_ORDER_OFFSETS = [offsets['order_dir_offset'] for offsets in _ANCILLARY_FILES.values()]
+
+
+def _get_ancil_files(mtl_doc, work_order_fields):
+    """
+    :type mtl_doc: dict
+    :param work_order_fields: Fields read from the work order (_WORK_ORDER_OFFSETS)
+    :type work_order_fields: dict[str, str]
+    :rtype: dict[str, eodatasets.type.AncillaryMetadata]
+    """
+    return _remove_missing({
+        name: _get_ancillary_metadata(mtl_doc, work_order_fields, **offsets)
+        for name, offsets in _ANCILLARY_FILES.items()
     })
-    return ancil_files
 
 
 def _populate_extent(md, product_md):
@@ -10,6 +10,7 @@ import re
 import time
 
 import eodatasets.type as ptype
+from eodatasets.inventory import scan_unless_given
 
 
 LS8_SENSORS = {"C": "OLI_TIRS", "O": "OLI", "T": "TIRS"}
@@ -36,7 +37,7 @@ def _before_underscore(s):
     return s.split('_')[0]
 
 
-def extract_md(base_md, directory_path):
+def extract_md(base_md, directory_path, inventory=None):
     """
     Extract metadata from a directory of MDF files
 
@@ -60,10 +61,12 @@ def extract_md(base_md, directory_path):
 
     :type base_md: ptype.DatasetMetadata
     :type directory_path: Path
+    :param inventory: The files in the directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :rtype: ptype.DatasetMetadata
     """
-
-    directory_path, files = find_mdf_files(directory_path)
+    inventory = scan_unless_given(directory_path, inventory)
+    directory_path, files = find_mdf_files(directory_path, inventory=inventory)
 
     if len(files) < 1:
         _log.debug("No MDF files found")
@@ -73,7 +76,7 @@ def extract_md(base_md, directory_path):
 
     if not usgs_id:
         # Look at siblings of the mdf files.
-        for f in list(files)[0].parent.iterdir():
+        for f in inventory.iterdir(list(files)[0].parent):
             prefix = _before_underscore(f.name)
             if is_mdf_usgs_id(prefix):
                 _log.info('Found usgs id %r', usgs_id)
@@ -284,16 +287,30 @@ def is_mdf_file(filename):
     return bool(re.match(r"^\d{3}\.\d{3}.\d{16}.[A-Z]{3}$", filename))
 
 
-def find_mdf_files(directory):
+def probe(inventory):
+    """
+    Could the inventoried directory have MDF metadata?
+
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: bool
+    """
+    mdf_dir, files = find_mdf_files(inventory.root, inventory=inventory)
+    return bool(files)
+
+
+def find_mdf_files(directory, inventory=None):
     """
     Find a MDF directory and list of matching mdf files.
     :type directory: pathlib.Path
+    :param inventory: The files in the directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :rtype: (pathlib.Path, [pathlib.Path])
     """
+    inventory = scan_unless_given(directory, inventory)
     mdf_dir = None
 
     def _get_mdf_files(mdf_dir):
-        return {f for f in mdf_dir.iterdir() if is_mdf_file(f.name)}
+        return {f for f in inventory.iterdir(mdf_dir) if is_mdf_file(f.name)}
 
     # Were we given the MDF directory itself?
     if is_mdf_usgs_id(directory.name):
@@ -301,7 +318,7 @@ def find_mdf_files(directory):
         return mdf_dir, _get_mdf_files(mdf_dir)
 
     # Is there a single MDF sub-directory?
-    mdf_subdirs = [d for d in directory.iterdir() if is_mdf_usgs_id(d.name)]
+    mdf_subdirs = [d for d in inventory.iterdir(directory) if is_mdf_usgs_id(d.name)]
     if mdf_subdirs and len(mdf_subdirs) == 1:
         return mdf_subdirs[0], _get_mdf_files(mdf_subdirs[0])
 
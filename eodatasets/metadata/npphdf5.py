@@ -9,11 +9,12 @@ import logging
 import re
 
 import eodatasets.type as ptype
+from eodatasets.inventory import scan_unless_given
 
 _LOG = logging.getLogger(__name__)
 
 
-def extract_md(base_md, directory_path):
+def extract_md(base_md, directory_path, inventory=None):
     """
     Extract metadata from an NPP HDF5 filename if one exists.
 
@@ -30,10 +31,12 @@ def extract_md(base_md, directory_path):
 
     :type base_md: ptype.DatasetMetadata
     :type directory_path: pathlib.Path
+    :param inventory: The files in the directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :rtype: ptype.DatasetMetadata
     """
 
-    files = find_hdf5_files(directory_path)
+    files = find_hdf5_files(directory_path, inventory=inventory)
 
     if len(files) < 1:
         _LOG.debug("No NPP HDF5 file found")
@@ -53,15 +56,27 @@ def extract_md(base_md, directory_path):
     return base_md
 
 
-def find_hdf5_files(directory):
+def find_hdf5_files(directory, inventory=None):
     """
     Find HDF5 files in the given directory
 
     :type directory: pathlib.Path
+    :param inventory: The files in the directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :return: List of HDF5 file paths (usually only one)
     :rtype: list[pathlib.Path]
     """
-    return list(directory.glob('RNSCA-RVIRS_npp*.h5'))
+    return scan_unless_given(directory, inventory).glob('RNSCA-RVIRS_npp*.h5')
+
+
+def probe(inventory):
+    """
+    Could the inventoried directory have NPP HDF5 metadata?
+
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: bool
+    """
+    return bool(find_hdf5_files(inventory.root, inventory=inventory))
 
 
 def _extract_hdf5_filename_fields(base_md, filename):
@@ -9,21 +9,23 @@ import logging
 import dateutil.parser
 
 from eodatasets import type as ptype
+from eodatasets.inventory import scan_unless_given
 
 _log = logging.getLogger(__name__)
 
 
-def extract_md(base_md, directory):
+def extract_md(base_md, directory, inventory=None):
     """
     Extract metadata from a passinfo file if one exists.
 
     :type base_md: ptype.DatasetMetadata
     :type directory: pathlib.Path
+    :param inventory: The files in the directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :rtype: ptype.DatasetMetadata
     """
 
-    passinfos = list(directory.glob('passinfo*'))
-    passinfos.extend(directory.parent.glob('passinfo*'))
+    passinfos = find_passinfo_files(directory, inventory=inventory)
 
     if not passinfos:
         _log.debug('No passinfo file found')
@@ -45,6 +47,30 @@ def extract_md(base_md, directory):
     return _parse_passinfo_md(base_md, lines)
 
 
+def find_passinfo_files(directory, inventory=None):
+    """
+    Find passinfo files in the given directory or its parent.
+
+    :type directory: pathlib.Path
+    :param inventory: The files in the directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: list[pathlib.Path]
+    """
+    inventory = scan_unless_given(directory, inventory)
+    # The parent directory is only listed once per inventory, for both probing and extraction.
+    return inventory.glob('passinfo*', directory) + inventory.glob_parent('passinfo*')
+
+
+def probe(inventory):
+    """
+    Could the inventoried directory have passinfo metadata?
+
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: bool
+    """
+    return bool(find_passinfo_files(inventory.root, inventory=inventory))
+
+
 def station_to_gsi(station):
     if station == 'ALICE':
         gsi = 'ASA'
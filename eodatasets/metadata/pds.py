@@ -7,15 +7,27 @@ from __future__ import absolute_import
 import datetime
 import logging
 import re
-from subprocess import check_output
 
+import numpy
 from pathlib import Path
 
 import eodatasets.type as ptype
-from eodatasets.verify import find_exe
+from eodatasets.inventory import scan_unless_given
 
 _LOG = logging.getLogger(__name__)
 
+# Epoch of CCSDS day-segmented time codes.
+_CDS_EPOCH = datetime.datetime(1958, 1, 1)
+
+# Primary header (6 bytes), time code (8 bytes), then the MODIS packet type.
+_HEADER_SIZE = 15
+_PACKET_TYPE_BYTE = 14
+_MODIS_DAY_PACKET = 0
+_MODIS_NIGHT_PACKET = 1
+
+# Packets to decode at once.
+_MAX_RUN_PACKETS = 65536
+
 SATELLITE_ID_MAP = {
     "042": "TERRA",
     "154": "AQUA"
@@ -52,16 +64,18 @@ def _pds_date(file_name):
     return datetime.datetime.strptime(file_name[-14: -3], '%y%j%H%M%S')
 
 
-def extract_md(base_md, directory_path):
+def extract_md(base_md, directory_path, inventory=None):
     """
     Extract metadata from a directory of PDF files
 
 
     :type base_md: ptype.DatasetMetadata
     :type directory_path: pathlib.Path
+    :param inventory: The files in the directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :rtype: ptype.DatasetMetadata
     """
-    pds_file = find_pds_file(directory_path)
+    pds_file = find_pds_file(directory_path, inventory=inventory)
     if not pds_file:
         _LOG.debug('No PDS files found')
         return base_md
@@ -92,11 +106,18 @@ def extract_md(base_md, directory_path):
     return base_md
 
 
-def find_pds_file(path):
-    if (not path.is_dir()) and is_modis_pds_file(path):
+def find_pds_file(path, inventory=None):
+    """
+    :type path: pathlib.Path
+    :param inventory: The files in path, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: pathlib.Path
+    """
+    inventory = scan_unless_given(path, inventory)
+    if (not inventory.is_dir(path)) and is_modis_pds_file(path):
         return path
 
-    pds_files = list(filter(is_modis_pds_file, path.iterdir()))
+    pds_files = list(filter(is_modis_pds_file, inventory.iterdir(path)))
 
     if not pds_files:
         return None
@@ -107,6 +128,16 @@ def find_pds_file(path):
     return pds_files[0]
 
 
+def probe(inventory):
+    """
+    Could the inventoried path have PDS metadata?
+
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: bool
+    """
+    return find_pds_file(inventory.root, inventory=inventory) is not None
+
+
 def is_modis_pds_file(file_path):
     """
     Is this an PDS file name with a MODIS APID?
@@ -137,35 +168,81 @@ def is_modis_pds_file(file_path):
     )
 
 
-def _run_pdsinfo_exe(pds_path):
+def get_pdsinfo(pds_path):
     """
-    :param pathlib.Path pds_path: PDS filepath.
-    :return str: raw output of pdsinfo
+    Read the packet times and day/night packet counts of a MODIS PDS file.
+
+    (This replaces the "pdsinfo" tool from pds-tools.)
+
+    Packets are walked in runs of equal size -- MODIS packets have a fixed size in each
+    mode -- so each run's headers are decoded together rather than packet-by-packet.
+
+    :type pds_path: pathlib.Path
+    :return: First and last packet times, and the number of day and night packets.
+    :rtype: (datetime.datetime, datetime.datetime, int, int)
     """
-    return check_output(
-        [
-            find_exe('pdsinfo'),
-            str(pds_path.absolute())
-        ]
-    )
+    if not pds_path.stat().st_size:
+        raise ValueError('Empty PDS file %s' % (pds_path,))
 
+    data = numpy.memmap(str(pds_path), dtype=numpy.uint8, mode='r')
 
-def get_pdsinfo(pds_path):
-    out = _run_pdsinfo_exe(pds_path)
-    if not out:
-        raise Exception('No output from pdsinfo')
+    first_packet = last_packet = None
+    day_packets = night_packets = 0
 
-    vals = dict([d.strip().split(': ') for d in out.decode('utf-8').splitlines() if d.strip()])
+    offset = 0
+    while offset + _HEADER_SIZE <= data.size:
+        packet_size = int(_packet_size(data[offset:offset + _HEADER_SIZE]))
+        if packet_size < _HEADER_SIZE:
+            raise ValueError('Invalid packet at byte %s of %s' % (offset, pds_path))
+
+        # Assume the following packets are the same size, and check.
+        count = min((data.size - offset) // packet_size, _MAX_RUN_PACKETS)
+        if not count:
+            _LOG.warning('Truncated packet at byte %s of %s', offset, pds_path)
+            break
+
+        headers = data[offset:offset + count * packet_size].reshape(count, packet_size)[:, :_HEADER_SIZE]
+        different_sizes = numpy.flatnonzero(_packet_size(headers) != packet_size)
+        if different_sizes.size:
+            count = int(different_sizes[0])
+            headers = headers[:count]
+
+        if first_packet is None:
+            first_packet = _packet_time(headers[0])
+        last_packet = _packet_time(headers[-1])
+
+        packet_types = (headers[:, _PACKET_TYPE_BYTE] >> 4) & 0b111
+        day_packets += int(numpy.count_nonzero(packet_types == _MODIS_DAY_PACKET))
+        night_packets += int(numpy.count_nonzero(packet_types == _MODIS_NIGHT_PACKET))
+
+        offset += count * packet_size
+
+    if first_packet is None:
+        raise ValueError('No packets found in %s' % (pds_path,))
+
+    return first_packet, last_packet, day_packets, night_packets
 
-    start_date = datetime.datetime.strptime(
-        vals['first packet'],
-        "%Y/%m/%d %H:%M:%S.%f"
-    )
-    end_date = datetime.datetime.strptime(
-        vals['last packet'],
-        "%Y/%m/%d %H:%M:%S.%f"
-    )
-    day_packets = int(vals['day packets'].split('/')[0])
-    night_packets = int(vals['night packets'].split('/')[0])
 
-    return start_date, end_date, day_packets, night_packets
+def _packet_size(headers):
+    """
+    Total size of packets from their CCSDS primary headers (the data length field is one less than
+    the size after the 6-byte primary header).
+
+    >>> int(_packet_size(numpy.array([8, 64, 192, 0, 2, 123], dtype=numpy.uint8)))
+    642
+    """
+    return ((headers[..., 4].astype(numpy.int64) << 8) | headers[..., 5]) + 7
+
+
+def _packet_time(header):
+    """
+    Time from a packet's secondary header: a CCSDS day-segmented time code of days, milliseconds
+    and microseconds since 1958.
+
+    >>> _packet_time(numpy.array([8, 64, 192, 0, 2, 123, 0, 10, 0, 0, 0, 5, 0, 1, 0], dtype=numpy.uint8))
+    datetime.datetime(1958, 1, 11, 0, 0, 0, 5001)
+    """
+    days = (int(header[6]) << 8) | int(header[7])
+    milliseconds = (int(header[8]) << 24) | (int(header[9]) << 16) | (int(header[10]) << 8) | int(header[11])
+    microseconds = (int(header[12]) << 8) | int(header[13])
+    return _CDS_EPOCH + datetime.timedelta(days=days, milliseconds=milliseconds, microseconds=microseconds)
@@ -8,12 +8,15 @@ import datetime
 import logging
 import re
 
+import numpy
+
 from eodatasets import type as ptype
+from eodatasets.inventory import scan_unless_given
 
 _log = logging.getLogger(__name__)
 
 
-def extract_md(base_md, directory):
+def extract_md(base_md, directory, inventory=None):
     """
     Extract metadata from an RCC filename if one exists.
 
@@ -25,18 +28,15 @@ def extract_md(base_md, directory):
 
     :type base_md: ptype.DatasetMetadata
     :type directory: Path
+    :param inventory: The files in the directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :rtype: ptype.DatasetMetadata
     """
-    dirs_to_search = [directory, directory.joinpath('RCCDATA'), directory.joinpath('RCC')]
-
-    for d in dirs_to_search:
-        files = list(find_rcc_files(d))
-        if files:
-            _log.info('Found RCC files: %r', files)
-            break
-    else:
+    files = _find_dataset_rcc_files(directory, scan_unless_given(directory, inventory))
+    if not files:
         _log.debug("No I.data file found in RCC directory")
         return base_md
+    _log.info('Found RCC files: %r', files)
 
     base_md = _extract_rcc_filename_fields(base_md, files[0].name)
 
@@ -50,21 +50,49 @@ def extract_md(base_md, directory):
     return base_md
 
 
-def find_rcc_files(directory):
+def find_rcc_files(directory, inventory=None):
     """
     Find RCC files in the given directory
 
     :type directory: pathlib.Path
+    :param inventory: The files in the directory (or a parent), if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     :return: List of RCC file paths
     :rtype: list of Path
     """
-    files = directory.glob('*I.data')
+    inventory = scan_unless_given(directory, inventory)
+    files = inventory.glob('*I.data', directory)
     for f in files:
         yield f
-    files = directory.glob('*I[0-9][0-9].data')
+    files = inventory.glob('*I[0-9][0-9].data', directory)
     for f in files:
         yield f
 
+
+def _find_dataset_rcc_files(directory, inventory):
+    """
+    RCC files in the dataset directory, or its RCC subdirectory.
+
+    :type directory: pathlib.Path
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: list[pathlib.Path]
+    """
+    for d in [directory, directory.joinpath('RCCDATA'), directory.joinpath('RCC')]:
+        files = list(find_rcc_files(d, inventory=inventory))
+        if files:
+            return files
+    return []
+
+
+def probe(inventory):
+    """
+    Could the inventoried directory have RCC metadata?
+
+    :type inventory: eodatasets.inventory.FileInventory
+    :rtype: bool
+    """
+    return bool(_find_dataset_rcc_files(inventory.root, inventory))
+
 # Landsat 5 & 7 modes.
 _INSTRUMENT_MODES = {
     'T': 'SAM',
@@ -180,8 +208,32 @@ def _extract_rcc_filename_fields(base_md, filename):
     return base_md
 
 
+# Downlink bit rates (bits per second) of each channel's data file.
+# From the old onreceipt codebase.
+_BIT_RATES = {
+    'LANDSAT_7': 75000000.0,
+    'LANDSAT_5': 84900000.0,
+}
+
+# The CCSDS sync marker that starts each frame (CADU).
+_SYNC_WORD = bytearray(b'\x1a\xcf\xfc\x1d')
+# The 24-bit virtual channel frame counter, after the sync word and the two-byte VCDU identifier.
+_FRAME_COUNTER_OFFSET = 6
+_FRAME_COUNTER_MODULUS = 1 << 24
+_FRAME_HEADER_SIZE = _FRAME_COUNTER_OFFSET + 3
+# How much of each end of a data file is searched for frames (they're usually many GB).
+_FRAME_SEARCH_BYTES = 4 * 1024 * 1024
+# Evenly-spaced sync words needed before we trust them as frames rather than chance matches.
+_MIN_FRAMES = 4
+
+
 def _calculate_stop_time(start_time, satellite=None, file_path=None):
     """
+    The end of the pass: the start plus the time to downlink the frames in the file.
+
+    Frame counters give the true number of frames sent, even when some were lost during
+    reception. Files without recognisable frames fall back to an estimate from their size.
+
     :type start_time: datetime.datetime
     :type satellite: str
     :type file_path: pathlib.Path
@@ -191,12 +243,14 @@ def _calculate_stop_time(start_time, satellite=None, file_path=None):
     start = start_time
 
     if start:
-        if file_path.exists() and satellite == 'LANDSAT_7':
-            # From the old onreceipt codebase.
-            duration_seconds = round(file_path.stat().st_size * 8.0 / 75000000.0)
-        elif file_path.exists() and satellite == 'LANDSAT_5':
-            # From the old onreceipt codebase.
-            duration_seconds = round(file_path.stat().st_size * 8.0 / 84900000.0)
+        bit_rate = _BIT_RATES.get(satellite)
+        if bit_rate and file_path.exists():
+            frame_bytes = _read_frame_bytes(file_path)
+            if frame_bytes:
+                duration_seconds = frame_bytes * 8.0 / bit_rate
+            else:
+                # From the old onreceipt codebase.
+                duration_seconds = round(file_path.stat().st_size * 8.0 / bit_rate)
         else:
             # From the old jobmanager codebase:
             # duration = 10 * 60
@@ -209,3 +263,104 @@ def _calculate_stop_time(start_time, satellite=None, file_path=None):
         _log.debug("Calculated stop time %s", stop)
 
     return stop
+
+
+def _read_frame_bytes(file_path):
+    """
+    Bytes downlinked from the first frame in the file to the end of the last, according to their frame counters.
+
+    Only the start and end of the file are read.
+
+    Returns None if the file doesn't have consistent frames.
+
+    :type file_path: pathlib.Path
+    :rtype: int
+    """
+    size = file_path.stat().st_size
+    if size < _FRAME_HEADER_SIZE:
+        return None
+
+    data = numpy.memmap(str(file_path), dtype=numpy.uint8, mode='r')
+    try:
+        head_syncs = _find_sync_words(data[:_FRAME_SEARCH_BYTES])
+        frame_size = _frame_size(head_syncs)
+        if frame_size is None:
+            _log.debug('No frames found in %s', file_path)
+            return None
+
+        tail_start = max(0, size - _FRAME_SEARCH_BYTES)
+        tail_syncs = _find_sync_words(data[tail_start:]) + tail_start
+
+        # A sync word followed (or preceded) by another a frame away is a frame, not a chance match.
+        first = numpy.intersect1d(head_syncs, head_syncs - frame_size)
+        last = numpy.intersect1d(tail_syncs, tail_syncs + frame_size)
+        last = last[last + _FRAME_HEADER_SIZE <= size]
+        if not len(first) or not len(last) or last[-1] < first[0]:
+            return None
+        first, last = int(first[0]), int(last[-1])
+
+        frame_count = (_frame_counter(data, last) - _frame_counter(data, first)) % _FRAME_COUNTER_MODULUS + 1
+    finally:
+        del data
+
+    # Counters can only skip frames that weren't received. If fewer were counted than are in the file,
+    # the counters aren't of a single channel, and can't be used.
+    if frame_count < (last - first) // frame_size + 1:
+        _log.warning('Inconsistent frame counters in %s', file_path)
+        return None
+
+    return frame_count * frame_size
+
+
+def _find_sync_words(data):
+    """
+    Offsets of each sync word in the data.
+
+    >>> _find_sync_words(numpy.array([0, 0, 0x1a, 0xcf, 0xfc, 0x1d, 0x1a, 0xcf, 0x1a, 0xcf, 0xfc, 0x1d], dtype='u1'))
+    array([2, 8])
+    >>> _find_sync_words(numpy.array([0x1a, 0xcf, 0xfc], dtype='u1')).tolist()
+    []
+
+    :type data: numpy.ndarray
+    :rtype: numpy.ndarray
+    """
+    candidates = numpy.flatnonzero(data[:len(data) - len(_SYNC_WORD) + 1] == _SYNC_WORD[0]).astype(numpy.int64)
+    for i, byte in enumerate(_SYNC_WORD[1:], 1):
+        candidates = candidates[data[candidates + i] == byte]
+    return candidates
+
+
+def _frame_size(syncs):
+    """
+    The most common spacing of sync words, if there's enough to be confident they're frames.
+
+    >>> _frame_size(numpy.array([3, 1043, 2083, 3123, 4163, 4900]))
+    1040
+    >>> _frame_size(numpy.array([3, 1043])) is None
+    True
+
+    :type syncs: numpy.ndarray
+    :rtype: int
+    """
+    if len(syncs) < _MIN_FRAMES:
+        return None
+    sizes, counts = numpy.unique(numpy.diff(syncs), return_counts=True)
+    most_common = counts.argmax()
+    if counts[most_common] < _MIN_FRAMES - 1 or sizes[most_common] < _FRAME_HEADER_SIZE:
+        return None
+    return int(sizes[most_common])
+
+
+def _frame_counter(data, offset):
+    """
+    The frame counter of the frame at the given offset.
+
+    >>> _frame_counter(numpy.array([0x1a, 0xcf, 0xfc, 0x1d, 0, 0, 1, 2, 3], dtype='u1'), 0)
+    66051
+
+    :type data: numpy.ndarray
+    :type offset: int
+    :rtype: int
+    """
+    counter = data[offset + _FRAME_COUNTER_OFFSET:offset + _FRAME_HEADER_SIZE].astype(numpy.int64)
+    return int((counter[0] << 16) | (counter[1] << 8) | counter[2])
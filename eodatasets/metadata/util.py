@@ -1,12 +1,82 @@
 # -*- coding: utf-8 -*-
 
 
+import collections
 import logging
+import re
+import threading
+import xml.etree.cElementTree as etree
 
 import datetime
 
+from eodatasets import cache
+
 _LOG = logging.getLogger(__name__)
 
+# Recently read XML fields, by file identity and offsets.
+_XML_FIELDS = collections.OrderedDict()
+_XML_FIELDS_MAX_ENTRIES = 64
+_XML_FIELDS_LOCK = threading.Lock()
+
+_strptime = datetime.datetime.strptime
+
+# Which parser could apply to a value, decided in one match.
+#
+# Values that match none of these are plain strings. Unusual forms that int(), float()
+# or strptime() also accept (surrounding whitespace, digit separators, nan/inf, non-ascii
+# digits, space-padded days) are 'uncertain' and tried with every parser in turn.
+_VALUE_KIND = re.compile(r'''
+    (?P<int>[-+]?[0-9]+\Z)
+  | (?P<float>[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?\Z)
+  | (?P<datetime>[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}[Tt][0-9]{1,2}:[0-9]{1,2}:[0-9]{1,2}[Zz]\Z)
+  | (?P<date>[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}\Z)
+  | (?P<time>[0-9]{1,2}:[0-9]{1,2}:[0-9]{1,2}\.[0-9])
+  | (?P<flag>(?:Y|N|NONE)\Z)
+  | (?P<uncertain>
+        \s | .*(?:\s\Z | [^\x00-\x7f])
+      | [-+]?[0-9.eE]*[0-9]_[0-9][0-9_.eE+-]*\Z
+      | [-+]?(?:[nN][aA][nN] | [iI][nN][fF](?:[iI][nN][iI][tT][yY])?)\Z
+      | [0-9]{4}-[0-9]{1,2}-\s
+    )
+''', re.VERBOSE | re.DOTALL)
+
+_DATETIME_FIELDS = re.compile(r'''
+    ([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})
+    (?:[Tt]([0-9]{1,2}):([0-9]{1,2}):([0-9]{1,2})[Zz])?\Z
+''', re.VERBOSE)
+_TIME_FIELDS = re.compile(r'([0-9]{1,2}):([0-9]{1,2}):([0-9]{1,2})\.([0-9]{1,6})\Z')
+
+_FLAGS = {'Y': True, 'N': False, 'NONE': None}
+
+
+def _parse_datetime(s):
+    """Equivalent to strptime(s, '%Y-%m-%dT%H:%M:%SZ') for values of the 'datetime' kind"""
+    return datetime.datetime(*[int(f) for f in _DATETIME_FIELDS.match(s).groups()])
+
+
+def _parse_date(s):
+    """Equivalent to strptime(s, '%Y-%m-%d').date() for values of the 'date' kind"""
+    return datetime.date(*[int(f) for f in _DATETIME_FIELDS.match(s).groups()[:3]])
+
+
+def _parse_time(s):
+    """Equivalent to strptime(s[0:15], '%H:%M:%S.%f').time() for values of the 'time' kind"""
+    match = _TIME_FIELDS.match(s[0:15])
+    if not match:
+        raise ValueError('Not a time: %r' % s)
+    hour, minute, second, fraction = match.groups()
+    return datetime.time(int(hour), int(minute), int(second), int(fraction.ljust(6, '0')))
+
+
+_KIND_PARSERS = {
+    'int': int,
+    'float': float,
+    'datetime': _parse_datetime,
+    'date': _parse_date,
+    'time': _parse_time,
+    'flag': _FLAGS.__getitem__,
+}
+
 
 def parse_type(s):
     """Parse the string `s` and return a native python object.
@@ -38,8 +108,34 @@ def parse_type(s):
     >>> parse_type('yellow')
     'yellow'
     """
+    value = s.strip('"')
+
+    match = _VALUE_KIND.match(value)
+    if not match:
+        return str(value)
+
+    parser = _KIND_PARSERS.get(match.lastgroup)
+    if parser:
+        try:
+            return parser(value)
+        except ValueError:
+            # Looked right, but isn't (eg. a 13th month)
+            pass
+
+    return _parse_type_by_trial(value)
+
+
+def _parse_type_by_trial(s):
+    """
+    Try each parser in turn until one succeeds.
 
-    strptime = datetime.datetime.strptime
+    This is the reference behaviour for parse_type(), which only falls back to it for unusual values.
+
+    >>> _parse_type_by_trial(' 42 ')
+    42
+    >>> _parse_type_by_trial('2015-13-29')
+    '2015-13-29'
+    """
 
     def yesno(s):
         """Parse Y/N"""
@@ -58,9 +154,9 @@ def parse_type(s):
 
     parsers = [int,
                float,
-               lambda x: strptime(x, '%Y-%m-%dT%H:%M:%SZ'),
-               lambda x: strptime(x, '%Y-%m-%d').date(),
-               lambda x: strptime(x[0:15], '%H:%M:%S.%f').time(),
+               lambda x: _strptime(x, '%Y-%m-%dT%H:%M:%SZ'),
+               lambda x: _strptime(x, '%Y-%m-%d').date(),
+               lambda x: _strptime(x[0:15], '%H:%M:%S.%f').time(),
                yesno,
                none,
                str]
@@ -71,3 +167,62 @@ def parse_type(s):
         except ValueError:
             pass
     raise ValueError
+
+
+def read_xml_fields(path, offsets):
+    """
+    Read the text of the given elements from an XML document.
+
+    Offsets are paths from the root element, such as "./EXEXTENT/TEMPORALEXTENTFROM", and the
+    first matching element is read (as with findall(offset)[0]).
+
+    The document is only read until all offsets are found, and the result is reused until the
+    file changes (work orders are shared by many datasets).
+
+    :type path: str or pathlib.Path
+    :type offsets: list[str]
+    :return: The text of each offset that was found.
+    :rtype: dict[str, str]
+    """
+    key = (cache.file_identity(path), tuple(sorted(set(offsets))))
+    with _XML_FIELDS_LOCK:
+        fields = _XML_FIELDS.get(key)
+    if fields is None:
+        fields = _read_xml_fields(path, key[1])
+        with _XML_FIELDS_LOCK:
+            _XML_FIELDS[key] = fields
+            while len(_XML_FIELDS) > _XML_FIELDS_MAX_ENTRIES:
+                _XML_FIELDS.popitem(last=False)
+    return dict(fields)
+
+
+def _read_xml_fields(path, offsets):
+    """
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile(suffix='.xml') as f:
+    ...     f.write(b'<a><b><c>1</c><c>2</c></b><d/><b><e>3</e></b></a>') and None
+    ...     f.flush()
+    ...     sorted(_read_xml_fields(f.name, ['./b/c', './b/e', 'd', './c']).items())
+    [('./b/c', '1'), ('./b/e', '3'), ('d', None)]
+    """
+    # Offset by path of tag names below the root.
+    remaining = {tuple(o.split('/')[1:] if o.startswith('./') else o.split('/')): o for o in offsets}
+    fields = {}
+    tags = []
+
+    with open(str(path), 'rb') as f:
+        for event, element in etree.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                tags.append(element.tag)
+                continue
+
+            offset = remaining.pop(tuple(tags[1:]), None)
+            if offset is not None:
+                fields[offset] = element.text
+                if not remaining:
+                    break
+
+            tags.pop()
+            element.clear()
+
+    return fields
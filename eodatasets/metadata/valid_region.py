@@ -1,54 +1,416 @@
+import numpy
 import rasterio
+from affine import Affine
+from osgeo import gdal
+from rasterio.enums import Resampling
 from rasterio.errors import RasterioIOError
-import rasterio.features
-from scipy import ndimage
 import shapely.affinity
 import shapely.geometry
-import shapely.ops
 
+import collections
 import logging
+import math
+import multiprocessing
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+from eodatasets import cache
 
 _LOG = logging.getLogger(__name__)
 
+# Approximate number of pixels to read from an image at a time.
+STRIPE_PIXELS = 4 * 1024 * 1024
+
+# Number of images to read at once, if not one per CPU (eg. when several packaging jobs share a node).
+WORKERS_ENV_VAR = 'EODATASETS_FOOTPRINT_WORKERS'
+
+# Increment when a change to the algorithm would change footprints, to invalidate cached ones.
+FOOTPRINT_VERSION = 1
+
+_Grid = collections.namedtuple('_Grid', ('crs', 'transform', 'shape'))
+
+# Where an image's pixels lie on a common grid: how many image pixels fit along each side of a
+# common pixel, and the image's first row and column, in image pixels, from the common grid's origin.
+_Placement = collections.namedtuple('_Placement', ('factor', 'row_offset', 'col_offset'))
+
+
+def safe_valid_region(images, mask_value=None, workers=None, decimation=1):
+    """
+    The valid region, or None if the images can't be read.
+
+    Footprints are cached between runs when caching is enabled (see eodatasets.cache). A cache that
+    can't be used only logs a warning.
+    """
+    footprint_cache = cache.get_cache('footprint')
+    key = None
+    if footprint_cache is not None:
+        try:
+            key = cache.make_key(
+                FOOTPRINT_VERSION,
+                [cache.file_identity(fname) for fname in images],
+                mask_value,
+                decimation
+            )
+        except OSError:
+            # The images are missing.
+            return None
+
+        region = footprint_cache.get(key)
+        if region is not None:
+            return region
 
-def safe_valid_region(images, mask_value=None):
     try:
-        return valid_region(images, mask_value)
+        region = valid_region(images, mask_value, workers=workers, decimation=decimation)
     except (OSError, RasterioIOError):
         return None
 
+    if key is not None and region is not None:
+        footprint_cache.put(key, region)
+    return region
+
+
+def _stripes(ds, row_multiple=1, row_offset=0):
+    """
+    Full-width row windows covering the dataset, aligned to its block height.
+
+    :type ds: rasterio.io.DatasetReader
+    :param row_multiple: Stripes (other than the first and last) will be a multiple of this many rows.
+    :param row_offset: The image's first row is this many rows from a multiple of row_multiple, which
+        stripe boundaries are aligned to.
+    """
+    block_rows = ds.block_shapes[0][0]
+    rows = max(block_rows, (STRIPE_PIXELS // ds.width) // block_rows * block_rows)
+    rows = -(-rows // row_multiple) * row_multiple
+    row_starts = [0] + list(range(rows - row_offset % rows, ds.height, rows))
+    for row_start, row_end in zip(row_starts, row_starts[1:] + [ds.height]):
+        yield (row_start, row_end), (0, ds.width)
+
+
+def _valid_pixels(img, nodata, mask_value=None):
+    if mask_value is not None:
+        return img & mask_value == mask_value
+
+    return img != nodata
+
+
+class _ValidPixelReader(object):
+    """
+    Reads which pixels of an image's first band are valid, touching as little imagery as possible.
+
+    - Without nodata, a mask band or a mask value, every pixel is valid: nothing is read.
+    - Stripes that GDAL reports as entirely empty (sparse tiles) are skipped when their fill
+      value isn't valid.
+    - An internal mask or alpha band is read in place of the data.
+    - Reads at reduced resolution average the mask, which GDAL counts as valid wherever any of the
+      averaged pixels are.
+    """
+
+    def __init__(self, ds, mask_value=None):
+        """
+        :type ds: rasterio.io.DatasetReader
+        """
+        self.ds = ds
+        self.mask_value = mask_value
+
+        # Keep a reference to the dataset: the band is invalid without it.
+        self._gdal_ds = gdal.Open(ds.name)
+        self._gdal_band = self._gdal_ds.GetRasterBand(1) if self._gdal_ds is not None else None
+
+        if self._gdal_band is None:
+            _LOG.warning('GDAL cannot open %r. Reading its mask in full', ds.name)
+            # Rasterio's mask covers nodata as well as any mask band.
+            mask_flags = gdal.GMF_PER_DATASET
+        else:
+            mask_flags = self._gdal_band.GetMaskFlags()
+        self.use_mask_band = mask_value is None and bool(mask_flags & (gdal.GMF_PER_DATASET | gdal.GMF_ALPHA))
+        self.all_valid = mask_value is None and ds.nodata is None and not self.use_mask_band
+
+        # Unwritten (sparse) blocks read as the nodata value, or zero.
+        fill_value = numpy.array([ds.nodata if ds.nodata is not None else 0], dtype=ds.dtypes[0])
+        self.skip_empty = (
+            self._gdal_band is not None and
+            hasattr(self._gdal_band, 'GetDataCoverageStatus') and
+            not _valid_pixels(fill_value, ds.nodata, mask_value)[0]
+        )
+
+        # A mask value's bits can't be averaged. GDAL would use any overviews for reduced reads, and
+        # they may have been resampled in a way that drops valid pixels.
+        self.can_reduce = mask_value is None and not ds.overviews(1)
+
+    def _is_empty(self, window):
+        (row_start, row_end), (col_start, col_end) = window
+        flags, _ = self._gdal_band.GetDataCoverageStatus(col_start, row_start,
+                                                         col_end - col_start, row_end - row_start)
+        return flags == gdal.GDAL_DATA_COVERAGE_STATUS_EMPTY
+
+    def read(self, window, out_shape=None):
+        """
+        :param out_shape: Read at this reduced (rows, cols) resolution (only if can_reduce). Each
+            output pixel is valid if any of the pixels it covers are.
+        :return: Boolean array of valid pixels, or None if none are valid.
+        """
+        (row_start, row_end), (col_start, col_end) = window
+        if self.all_valid:
+            return numpy.ones(out_shape or (row_end - row_start, col_end - col_start), dtype=bool)
+        if not self.use_mask_band and self.skip_empty and self._is_empty(window):
+            return None
+        if out_shape is not None:
+            return self.ds.read_masks(1, window=window, out_shape=out_shape, resampling=Resampling.average) != 0
+        if self.use_mask_band:
+            return self.ds.read_masks(1, window=window) != 0
+
+        return _valid_pixels(self.ds.read(1, window=window), self.ds.nodata, self.mask_value)
+
+
+def _max_pool(valid, factor):
+    """
+    Whether any pixel is set within each (factor x factor) cell.
+
+    Partial cells at the right and bottom edges are included.
+
+    >>> _max_pool(numpy.array([[0, 0, 0], [0, 0, 1]], dtype=bool), 2).tolist()
+    [[False, True]]
+    """
+    if factor == 1:
+        return valid
+
+    rows, cols = valid.shape
+    out_rows, out_cols = -(-rows // factor), -(-cols // factor)
+    padded = numpy.zeros((out_rows * factor, out_cols * factor), dtype=bool)
+    padded[:rows, :cols] = valid
+    return padded.reshape(out_rows, factor, out_cols, factor).any(axis=(1, 3))
+
+
+class _RowExtents(object):
+    """
+    The first and last valid column of each row of a mask.
+
+    This is all that's needed for the convex hull of the valid pixels, so the full mask
+    is never held in memory.
+    """
+
+    def __init__(self, shape):
+        self.rows, self.cols = shape
+        self.first = numpy.full(self.rows, self.cols, dtype=numpy.int64)
+        self.last = numpy.full(self.rows, -1, dtype=numpy.int64)
+        self._lock = threading.Lock()
 
-def valid_region(images, mask_value=None):
-    mask = None
+    def add(self, row_offset, valid, col_offset=0):
+        """
+        Add a block of the mask (which may overlap previously added blocks).
 
+        :type row_offset: int
+        :type valid: numpy.ndarray
+        :type col_offset: int
+        """
+        any_valid = valid.any(axis=1)
+        first = numpy.where(any_valid, col_offset + valid.argmax(axis=1), self.cols)
+        last = numpy.where(any_valid, col_offset + valid.shape[1] - 1 - valid[:, ::-1].argmax(axis=1), -1)
+
+        rows = slice(row_offset, row_offset + valid.shape[0])
+        with self._lock:
+            numpy.minimum(self.first[rows], first, out=self.first[rows])
+            numpy.maximum(self.last[rows], last, out=self.last[rows])
+
+    def footprint(self):
+        """
+        Convex hull of the valid pixels (as squares), in pixel coordinates.
+
+        >>> r = _RowExtents((3, 4))
+        >>> r.add(0, numpy.array([[0, 0, 0, 0], [0, 1, 1, 0], [0, 0, 0, 0]], dtype=bool))
+        >>> r.footprint().bounds
+        (1.0, 1.0, 3.0, 2.0)
+        """
+        rows = numpy.flatnonzero(self.last >= 0)
+        first, last = self.first[rows], self.last[rows] + 1
+        corners = numpy.concatenate([
+            numpy.column_stack((first, rows)),
+            numpy.column_stack((first, rows + 1)),
+            numpy.column_stack((last, rows)),
+            numpy.column_stack((last, rows + 1)),
+        ]).astype(float)
+        return shapely.geometry.MultiPoint(corners).convex_hull
+
+
+def _read_grid(fname):
+    with rasterio.open(str(fname), 'r') as ds:
+        return _Grid(ds.crs, ds.affine, (ds.height, ds.width))
+
+
+def _whole_number(value, description):
+    rounded = int(round(value))
+    if abs(value - rounded) > 1e-6:
+        raise ValueError('Images are on incompatible grids: %s is %r' % (description, value))
+    return rounded
+
+
+def _common_grid(grids):
+    """
+    The grid covering all of the given grids at the coarsest of their resolutions.
+
+    Finer grids must nest within it: an integer number of their pixels per coarse pixel, with
+    aligned pixel edges.
+
+    :type grids: list[_Grid]
+    :return: The common (transform, shape), and the _Placement of each given grid on it.
+    :rtype: ((affine.Affine, (int, int)), list[_Placement])
+    """
+    distinct = []
+    for grid in grids:
+        if grid not in distinct:
+            distinct.append(grid)
+
+    if len(distinct) == 1:
+        grid = distinct[0]
+        return (grid.transform, grid.shape), [_Placement(1, 0, 0)] * len(grids)
+
+    for grid in distinct:
+        if grid.crs != distinct[0].crs:
+            raise ValueError('Images have differing CRSs: %r and %r' % (distinct[0].crs, grid.crs))
+        if grid.transform.b or grid.transform.d:
+            raise ValueError('Images of differing grids must be north-up. Got %r' % (grid.transform,))
+
+    coarse = max(distinct, key=lambda g: abs(g.transform.a)).transform
+
+    def first_pixel(grid):
+        """Factor, and first row and column (in the grid's pixels) from the coarse origin"""
+        t = grid.transform
+        factor = _whole_number(coarse.a / t.a, 'pixel size ratio')
+        if _whole_number(coarse.e / t.e, 'pixel size ratio') != factor:
+            raise ValueError('Images have differing pixel aspect ratios')
+        return (factor,
+                _whole_number((t.yoff - coarse.yoff) / t.e, 'row offset'),
+                _whole_number((t.xoff - coarse.xoff) / t.a, 'column offset'))
+
+    # Bounds of all grids, in coarse pixels from the coarse grid's origin.
+    first_pixels = [first_pixel(grid) for grid in grids]
+    row_min = min(row // factor for factor, row, _ in first_pixels)
+    col_min = min(col // factor for factor, _, col in first_pixels)
+    row_max = max(int(math.ceil(float(row + grid.shape[0]) / factor))
+                  for (factor, row, _), grid in zip(first_pixels, grids))
+    col_max = max(int(math.ceil(float(col + grid.shape[1]) / factor))
+                  for (factor, _, col), grid in zip(first_pixels, grids))
+
+    common_transform = Affine(coarse.a, 0.0, coarse.xoff + col_min * coarse.a,
+                              0.0, coarse.e, coarse.yoff + row_min * coarse.e)
+    common = (common_transform, (row_max - row_min, col_max - col_min))
+    placements = [_Placement(factor, row - row_min * factor, col - col_min * factor)
+                  for factor, row, col in first_pixels]
+    return common, placements
+
+
+def _valid_cells(reader, window, placement, cell):
+    """
+    Which cells (of cell x cell image pixels) of the common grid have valid pixels, within a window of an image.
+
+    Whole cells are read at reduced resolution when possible. The partial cells around them are read
+    in full.
+
+    :type reader: _ValidPixelReader
+    :type placement: _Placement
+    :return: The validity of the cells, and the (row, column) of the first cell on the common grid.
+    :rtype: (numpy.ndarray, (int, int))
+    """
+    (row_start, row_end), (col_start, col_end) = window
+    # Image pixels from the common grid's origin, and from the first cell's corner.
+    row, col = row_start + placement.row_offset, col_start + placement.col_offset
+    top, left = row % cell, col % cell
+    cells = numpy.zeros((-(-(top + row_end - row_start) // cell), -(-(left + col_end - col_start) // cell)),
+                        dtype=bool)
+
+    def add(rows, cols, reduced=False):
+        (r_start, r_end), (c_start, c_end) = rows, cols
+        if r_start >= r_end or c_start >= c_end:
+            return
+        y, x = top + r_start - row_start, left + c_start - col_start
+
+        if reduced:
+            valid = reader.read((rows, cols), out_shape=((r_end - r_start) // cell, (c_end - c_start) // cell))
+        else:
+            valid = reader.read((rows, cols))
+            if valid is not None:
+                # Pad to start on a cell boundary.
+                if y % cell or x % cell:
+                    valid = numpy.pad(valid, ((y % cell, 0), (x % cell, 0)), 'constant')
+                valid = _max_pool(valid, cell)
+
+        if valid is not None:
+            cells[y // cell:y // cell + valid.shape[0], x // cell:x // cell + valid.shape[1]] |= valid
+
+    if cell == 1 or not reader.can_reduce:
+        add(*window)
+    else:
+        inner_row_start = min(row_start + -top % cell, row_end)
+        inner_row_end = inner_row_start + (row_end - inner_row_start) // cell * cell
+        inner_col_start = min(col_start + -left % cell, col_end)
+        inner_col_end = inner_col_start + (col_end - inner_col_start) // cell * cell
+
+        add((inner_row_start, inner_row_end), (inner_col_start, inner_col_end), reduced=True)
+        add((row_start, inner_row_start), (col_start, col_end))
+        add((inner_row_end, row_end), (col_start, col_end))
+        add((inner_row_start, inner_row_end), (col_start, inner_col_start))
+        add((inner_row_start, inner_row_end), (inner_col_end, col_end))
+
+    return cells, ((row - top) // cell, (col - left) // cell)
+
+
+def _add_image(fname, placement, extents, mask_value=None, decimation=1):
+    """
+    Add the valid pixels of an image to the common grid's extents, a stripe at a time.
+
+    :type placement: _Placement
+    :type extents: _RowExtents
+    :param decimation: The extents are this many times coarser than the common grid.
+    """
+    cell = placement.factor * decimation
+    with rasterio.open(str(fname), 'r') as ds:
+        reader = _ValidPixelReader(ds, mask_value)
+        for window in _stripes(ds, row_multiple=cell, row_offset=placement.row_offset):
+            cells, (cell_row, cell_col) = _valid_cells(reader, window, placement, cell)
+            extents.add(cell_row, cells, col_offset=cell_col)
+
+
+def valid_region(images, mask_value=None, workers=None, decimation=1):
+    """
+    Images of differing resolutions are combined on the coarsest of their grids.
+
+    :param workers: Number of images to read concurrently. Defaults to $EODATASETS_FOOTPRINT_WORKERS, or
+        one per CPU. Drivers leave this to the environment, as it depends on what else is running on the node.
+    :param decimation: Calculate the region from cells of this many (coarsest) pixels square, read at
+        reduced resolution. A cell is valid if any of its pixels are, and the hull is buffered by a
+        cell, so the region still contains every valid pixel. It will be up to a few cells larger
+        than a full resolution region.
+    """
     if not images:
         _LOG.warning("No images: empty region")
         return None
 
-    for fname in images:
-        with rasterio.open(str(fname), 'r') as ds:
-            transform = ds.affine
-            img = ds.read(1)
-
-            if mask_value is not None:
-                new_mask = img & mask_value == mask_value
-            else:
-                new_mask = img != ds.nodata
+    (transform, grid_shape), placements = _common_grid([_read_grid(fname) for fname in images])
 
-            if mask is None:
-                mask = new_mask
-            else:
-                mask |= new_mask
+    # Images are read a stripe at a time, keeping only the valid extent of each row,
+    # so that only one stripe per worker is held in memory at once.
+    extents = _RowExtents((-(-grid_shape[0] // decimation), -(-grid_shape[1] // decimation)))
 
-    # apply a fill holes filter; reduces run time of the union function
-    # when there are lots of holes in the data eg NBART, PQ, and Landsat 7
-    mask = ndimage.binary_fill_holes(mask)
+    def add_image(image):
+        fname, placement = image
+        _add_image(fname, placement, extents, mask_value, decimation)
 
-    shapes = rasterio.features.shapes(mask.astype('uint8'), mask=mask)
-    shape = shapely.ops.unary_union([shapely.geometry.shape(shape) for shape, val in shapes if val == 1])
+    workers = min(workers or _default_workers(), len(images))
+    if workers > 1:
+        # Reads release the GIL, so threads are enough to read bands in parallel.
+        pool = ThreadPool(workers)
+        try:
+            pool.map(add_image, zip(images, placements))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for image in zip(images, placements):
+            add_image(image)
 
     # convex hull
-    geom = shape.convex_hull
+    geom = extents.footprint()
 
     # buffer by 1 pixel
     geom = geom.buffer(1, join_style=3, cap_style=3)
@@ -56,8 +418,12 @@ def valid_region(images, mask_value=None):
     # simplify with 1 pixel radius
     geom = geom.simplify(1)
 
+    # back to full resolution pixels
+    if decimation != 1:
+        geom = shapely.affinity.scale(geom, decimation, decimation, origin=(0, 0))
+
     # intersect with image bounding box
-    geom = geom.intersection(shapely.geometry.box(0, 0, mask.shape[1], mask.shape[0]))
+    geom = geom.intersection(shapely.geometry.box(0, 0, grid_shape[1], grid_shape[0]))
 
     # transform from pixel space into CRS space
     geom = shapely.affinity.affine_transform(geom, (transform.a, transform.b, transform.d,
@@ -68,6 +434,11 @@ def valid_region(images, mask_value=None):
     return output
 
 
+def _default_workers():
+    configured = os.environ.get(WORKERS_ENV_VAR)
+    return int(configured) if configured else multiprocessing.cpu_count()
+
+
 def _to_lists(x):
     """
     Returns lists of lists when given tuples of tuples
@@ -1,6 +1,7 @@
 # coding=utf-8
 from __future__ import absolute_import
 
+import copy
 import datetime
 import logging
 import os
@@ -14,8 +15,9 @@ from pathlib import Path
 
 import eodatasets
 import eodatasets.type as ptype
-from eodatasets import serialise, verify, metadata, documents
+from eodatasets import serialise, verify, metadata, documents, cache
 from eodatasets.browseimage import create_dataset_browse_images
+from eodatasets.inventory import FileInventory, scan_unless_given
 
 GA_CHECKSUMS_FILE_NAME = 'package.sha1'
 
@@ -23,6 +25,9 @@ _LOG = logging.getLogger(__name__)
 
 _RUNTIME_ID = uuid.uuid1()
 
+# Extracted metadata is much larger than other cached values.
+_MAX_CACHED_METADATA = 1000
+
 
 def init_locally_processed_dataset(directory, source_datasets, uuid_=None):
     """
@@ -84,12 +89,112 @@ def init_existing_dataset(directory, source_datasets, uuid_=None, source_hostnam
     return md
 
 
+def fill_dataset_metadata(dataset_driver, dataset, image_path, inventory, additional_files=()):
+    """
+    Populate the dataset from the path using the driver.
+
+    Results are cached between runs when caching is enabled (see eodatasets.cache). They're keyed by the
+    driver and its version, the given dataset, and the names, sizes and modification times of the input files
+    (including any the driver reads from outside the dataset), so re-running on unchanged inputs skips
+    extraction. A cached result is also only used while the ancillary files it records are unchanged.
+
+    The dataset is filled from the absolute image path, so that cached paths are valid from any working
+    directory.
+
+    :type dataset_driver: eodatasets.drivers.DatasetDriver
+    :type dataset: ptype.DatasetMetadata
+    :type image_path: Path
+    :param inventory: The files in image_path.
+    :type inventory: FileInventory
+    :type additional_files: tuple[Path]
+    """
+    if not image_path.is_absolute():
+        image_path = image_path.absolute()
+        inventory = inventory.with_root(image_path)
+
+    metadata_cache = cache.get_cache('metadata', max_entries=_MAX_CACHED_METADATA)
+    if metadata_cache is None:
+        dataset_driver.fill_metadata(dataset, image_path, additional_files=additional_files, inventory=inventory)
+        return
+
+    input_files = inventory.files() if inventory.is_dir() else [image_path]
+    key = cache.make_key(
+        type(dataset_driver).__name__,
+        dataset_driver.get_id(),
+        dataset_driver.METADATA_VERSION,
+        eodatasets.__version__,
+        # Flattened with sorted keys, as repr() of the dataset's dicts isn't stable between runs.
+        sorted(serialise.as_flat_key_value(_without_run_fields(dataset), relative_to='/')),
+        [cache.file_identity(path) for path in input_files],
+        [cache.file_identity(path) for path in additional_files],
+        [cache.file_identity(path) for path in dataset_driver.external_metadata_files(image_path, inventory)]
+    )
+
+    cached = metadata_cache.get(key)
+    if cached is not None and cached[1] != _ancillary_identities(cached[0]):
+        _LOG.info('Ancillary files have changed: not using cached metadata for %s', image_path)
+        cached = None
+
+    if cached is None:
+        dataset_driver.fill_metadata(dataset, image_path, additional_files=additional_files, inventory=inventory)
+        metadata_cache.put(key, (dataset, _ancillary_identities(dataset)))
+        return
+
+    filled, _ = cached
+    _LOG.info('Using cached metadata for %s', image_path)
+    # This run's own identity is kept.
+    filled.id_ = dataset.id_
+    if filled.lineage and filled.lineage.machine and dataset.lineage and dataset.lineage.machine:
+        machine = dataset.lineage.machine
+        machine.software_versions = filled.lineage.machine.software_versions
+        filled.lineage.machine = machine
+
+    for name, _ in ptype.DatasetMetadata.item_defaults():
+        setattr(dataset, name, getattr(filled, name))
+
+
+def _ancillary_identities(dataset):
+    """
+    The current identities of the ancillary files recorded in the dataset (None for missing files).
+
+    :type dataset: ptype.DatasetMetadata
+    :rtype: list[(str, tuple)]
+    """
+    if not dataset.lineage or not dataset.lineage.ancillary:
+        return []
+
+    def identity(uri):
+        try:
+            return cache.file_identity(uri)
+        except OSError:
+            return None
+
+    return sorted((name, identity(ancillary.uri)) for name, ancillary in dataset.lineage.ancillary.items()
+                  if ancillary.uri)
+
+
+def _without_run_fields(dataset):
+    """
+    A copy of the dataset without fields that differ on every run (its id, where it was run...)
+
+    :type dataset: ptype.DatasetMetadata
+    :rtype: ptype.DatasetMetadata
+    """
+    dataset = copy.copy(dataset)
+    dataset.id_ = None
+    if dataset.lineage and dataset.lineage.machine:
+        dataset.lineage = copy.copy(dataset.lineage)
+        dataset.lineage.machine = ptype.MachineMetadata(software_versions=dataset.lineage.machine.software_versions)
+    return dataset
+
+
 def package_dataset(dataset_driver,
                     dataset,
                     image_path,
                     target_path,
                     hard_link=False,
-                    additional_files=None):
+                    additional_files=None,
+                    include_tiles=False):
     """
     Package the given dataset folder.
 
@@ -106,6 +211,8 @@ def package_dataset(dataset_driver,
     :type target_path: Path
     :param additional_files: Additional files to record in the package.
     :type additional_files: tuple[Path]
+    :param include_tiles: Also write a tile pyramid of the full resolution browse image.
+    :type include_tiles: bool
 
     :raises IncompletePackage: If not enough metadata can be extracted from the dataset.
     :return: The generated GA Dataset ID (ga_label)
@@ -115,12 +222,14 @@ def package_dataset(dataset_driver,
         additional_files = []
     _check_additional_files_exist(additional_files)
 
-    dataset_driver.fill_metadata(dataset, image_path, additional_files=additional_files)
+    image_path = image_path.absolute()
+    # The input files are listed once, for all stages.
+    inventory = FileInventory.scan(image_path)
+    fill_dataset_metadata(dataset_driver, dataset, image_path, inventory, additional_files=additional_files)
 
     checksums = verify.PackageChecksum()
 
     target_path = target_path.absolute()
-    image_path = image_path.absolute()
 
     target_metadata_path = documents.find_metadata_path(target_path)
     if target_metadata_path is not None and target_metadata_path.exists():
@@ -143,7 +252,8 @@ def package_dataset(dataset_driver,
         include_path=dataset_driver.include_file,
         translate_path=partial(dataset_driver.translate_path, dataset),
         after_file_copy=save_target_checksums_and_paths,
-        hard_link=hard_link
+        hard_link=hard_link,
+        inventory=inventory
     )
 
     write_additional_files(additional_files, checksums, target_path)
@@ -158,7 +268,8 @@ def package_dataset(dataset_driver,
         dataset_driver,
         dataset,
         target_path,
-        after_file_creation=checksums.add_file
+        after_file_creation=checksums.add_file,
+        include_tiles=include_tiles
     )
 
     target_checksums_path = target_path / GA_CHECKSUMS_FILE_NAME
@@ -205,7 +316,8 @@ def prepare_target_imagery(
         translate_path=lambda p: p,
         after_file_copy=lambda source_path, final_path: None,
         compress_imagery=True,
-        hard_link=False):
+        hard_link=False,
+        inventory=None):
     """
     Copy a directory of files if not already there. Possibly compress images.
 
@@ -215,17 +327,18 @@ def prepare_target_imagery(
     :type after_file_copy: Path -> None
     :type hard_link: bool
     :type compress_imagery: bool
+    :param inventory: The files in source_directory, if already scanned.
+    :type inventory: eodatasets.inventory.FileInventory
     """
     if not destination_directory.exists():
         destination_directory.mkdir()
 
-    for source_file in source_directory.rglob('*'):
-        # Skip hidden files and directories
-        if source_file.name.startswith('.') or source_file.is_dir() or not include_path(source_file):
+    for rel_source_file in scan_unless_given(source_directory, inventory).relative_files():
+        source_file = source_directory / rel_source_file
+        # Skip hidden files
+        if source_file.name.startswith('.') or not include_path(source_file):
             continue
 
-        rel_source_file = source_file.relative_to(source_directory)
-
         rel_target_path = translate_path(rel_source_file)
 
         absolute_target_path = destination_directory / rel_target_path
@@ -349,12 +462,14 @@ def package_inplace_dataset(dataset_driver, dataset, image_path):
     :rtype: Path
     :return: Path to the created metadata file.
     """
-    dataset_driver.fill_metadata(dataset, image_path)
+    image_path = image_path.absolute()
+    inventory = FileInventory.scan(image_path)
+    fill_dataset_metadata(dataset_driver, dataset, image_path, inventory)
     typical_checksum_file = image_path.joinpath(GA_CHECKSUMS_FILE_NAME)
-    if typical_checksum_file.exists():
+    if typical_checksum_file in inventory.iterdir():
         dataset.checksum_path = typical_checksum_file
 
-    image_paths = list(image_path.iterdir()) if image_path.is_dir() else [image_path]
+    image_paths = inventory.iterdir() if inventory.is_dir() else [image_path]
 
     validate_metadata(dataset)
     dataset = expand_driver_metadata(dataset_driver, dataset, image_paths)
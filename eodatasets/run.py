@@ -19,7 +19,8 @@ _LOG = logging.getLogger(__name__)
 def package_newly_processed_data_folder(driver, input_data_paths, destination_path, parent_dataset_paths,
                                         metadata_expand_fn=None,
                                         hard_link=False,
-                                        additional_files=None):
+                                        additional_files=None,
+                                        include_tiles=False):
     """
     Package an input folder. This is assumed to have just been packaged on the current host.
 
@@ -43,6 +44,8 @@ def package_newly_processed_data_folder(driver, input_data_paths, destination_pa
 
     :param additional_files: Additional files to record in the package.
     :type additional_files: list[Path]
+    :param include_tiles: Also write a tile pyramid of the full resolution browse image.
+    :type include_tiles: bool
     """
     return _package_folder(
         driver, input_data_paths, destination_path,
@@ -50,14 +53,16 @@ def package_newly_processed_data_folder(driver, input_data_paths, destination_pa
         package.init_locally_processed_dataset,
         hard_link=hard_link,
         metadata_expand_fn=metadata_expand_fn,
-        additional_files=additional_files
+        additional_files=additional_files,
+        include_tiles=include_tiles
     )
 
 
 def package_existing_data_folder(driver, input_data_paths, destination_path, parent_dataset_paths,
                                  metadata_expand_fn=None,
                                  additional_files=None,
-                                 hard_link=False):
+                                 hard_link=False,
+                                 include_tiles=False):
     """
     Package an input folder of possibly unknown origin.
 
@@ -78,6 +83,8 @@ def package_existing_data_folder(driver, input_data_paths, destination_path, par
     :type additional_files: tuple[Path]
 
     :type hard_link: bool
+    :param include_tiles: Also write a tile pyramid of the full resolution browse image.
+    :type include_tiles: bool
     :return:
     """
     return _package_folder(
@@ -86,7 +93,8 @@ def package_existing_data_folder(driver, input_data_paths, destination_path, par
         package.init_existing_dataset,
         hard_link=hard_link,
         metadata_expand_fn=metadata_expand_fn,
-        additional_files=additional_files
+        additional_files=additional_files,
+        include_tiles=include_tiles
     )
 
 
@@ -103,7 +111,8 @@ def _package_folder(driver, input_data_paths, destination_path, source_datasets,
                     init_dataset,
                     metadata_expand_fn=None,
                     hard_link=True,
-                    additional_files=None):
+                    additional_files=None,
+                    include_tiles=False):
     """
     Package a folder into a destination directory as the dataset id. The output is written atomically.
 
@@ -119,6 +128,8 @@ def _package_folder(driver, input_data_paths, destination_path, source_datasets,
 
     :param additional_files: Additional files to record in the package.
     :type additional_files: tuple[Path]
+    :param include_tiles: Also write a tile pyramid of the full resolution browse image.
+    :type include_tiles: bool
 
     :return: list of (created packages, already existing packages)
     """
@@ -139,7 +150,8 @@ def _package_folder(driver, input_data_paths, destination_path, source_datasets,
                 image_path=dataset_folder,
                 target_path=temp_output_dir,
                 hard_link=hard_link,
-                additional_files=additional_files
+                additional_files=additional_files,
+                include_tiles=include_tiles
             )
 
             # Output package permissions should match the parent dir.
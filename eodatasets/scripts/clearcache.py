@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+
+import click
+
+from eodatasets import cache
+from eodatasets.scripts import init_logging
+
+
+@click.command()
+@click.option('--debug',
+              is_flag=True,
+              help='Enable debug logging')
+@click.argument('cache_name', nargs=-1)
+def run(debug, cache_name):
+    """
+    Clear the persistent caches (eg. footprint, checksum, metadata). Default: all of them.
+
+    Use this when something the cached results depend on has changed outside the inputs.
+    """
+    init_logging(debug)
+
+    if not os.environ.get(cache.CACHE_DIR_ENV_VAR):
+        raise click.UsageError('Caching is not enabled: %s is not set' % cache.CACHE_DIR_ENV_VAR)
+
+    for name in cache.clear_caches(list(cache_name) or None):
+        click.echo('Cleared %s cache' % name)
+
+
+if __name__ == '__main__':
+    # Click fills out the parameters, which confuses pylint.
+    # pylint: disable=no-value-for-parameter
+    run()
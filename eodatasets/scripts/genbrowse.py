@@ -9,11 +9,13 @@ from eodatasets.browseimage import regenerate_browse_image
 
 @click.command()
 @click.option('--debug', is_flag=True)
+@click.option('--tiles', is_flag=True, help='Also write a tile pyramid of the full resolution browse image.')
 @click.argument('dataset', type=click.Path(exists=True, readable=True, writable=False), nargs=-1)
-def run(debug, dataset):
+def run(debug, tiles, dataset):
     """
     Regenerate browse images for the given datasets.
     :param debug:
+    :param tiles:
     :param dataset:
     :return:
     """
@@ -22,7 +24,7 @@ def run(debug, dataset):
         logging.getLogger().setLevel(logging.DEBUG)
 
     for d in dataset:
-        regenerate_browse_image(d)
+        regenerate_browse_image(d, include_tiles=tiles)
 
 
 if __name__ == '__main__':
@@ -27,6 +27,9 @@ from eodatasets.scripts import init_logging
               type=click.Path(exists=True, readable=True, writable=False),
               multiple=True,
               help='Additional file to note in the package (eg. a useful log file).')
+@click.option('--tiles',
+              is_flag=True,
+              help='Also write a tile pyramid of the full resolution browse image.')
 @click.argument('package_type',
                 type=click.Choice(drivers.PACKAGE_DRIVERS.keys()))
 @click.argument('dataset',
@@ -35,7 +38,7 @@ from eodatasets.scripts import init_logging
 @click.argument('destination',
                 type=click.Path(exists=True, readable=True, writable=True),
                 nargs=1)
-def run(parent, debug, hard_link, newly_processed, package_type, dataset, destination, add_file):
+def run(parent, debug, hard_link, newly_processed, package_type, dataset, destination, add_file, tiles):
     """
     Package the given imagery folders.
     """
@@ -48,7 +51,8 @@ def run(parent, debug, hard_link, newly_processed, package_type, dataset, destin
             destination_path=Path(destination),
             parent_dataset_paths=[Path(p) for p in parent],
             hard_link=hard_link,
-            additional_files=tuple(Path(p) for p in add_file)
+            additional_files=tuple(Path(p) for p in add_file),
+            include_tiles=tiles
         )
     else:
         run_package.package_existing_data_folder(
@@ -57,7 +61,8 @@ def run(parent, debug, hard_link, newly_processed, package_type, dataset, destin
             destination_path=Path(destination),
             parent_dataset_paths=[Path(p) for p in parent],
             hard_link=hard_link,
-            additional_files=tuple(Path(p) for p in add_file)
+            additional_files=tuple(Path(p) for p in add_file),
+            include_tiles=tiles
         )
 
 
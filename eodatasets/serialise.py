@@ -64,10 +64,26 @@ def init_yaml_handling():
         :type data: ptype.SimpleObject
         :rtype: yaml.nodes.Node
         """
-        k_v = [(_clean_identifier(k), v) for k, v in data.items_ordered()]
+        k_v = list(data.items_serialised())
 
         return dumper.represent_mapping(u'tag:yaml.org,2002:map', k_v)
 
+    def lazy_dataset_representer(dumper, data):
+        """
+        Output a lazily-loaded dataset: its original document, unless it has been loaded.
+
+        Absolute paths in the original document need to be made relative to the output, so
+        those documents are loaded and output as Path values.
+
+        :type dumper: yaml.representer.BaseRepresenter
+        :type data: ptype.LazyDatasetMetadata
+        :rtype: yaml.nodes.Node
+        """
+        doc = data.unloaded_doc
+        if doc is None or any(Path(path).is_absolute() for path in data.unloaded_paths()):
+            return dumper.represent_data(data.load())
+        return dumper.represent_mapping(u'tag:yaml.org,2002:map', list(doc.items()))
+
     def ordereddict_representer(dumper, data):
         """
         Output an OrderedDict as a dict. The order is purely for readability of the document.
@@ -96,6 +112,7 @@ def init_yaml_handling():
         return dumper.represent_scalar(u'tag:yaml.org,2002:str', data.encode('utf-8'))
 
     yaml.add_multi_representer(ptype.SimpleObject, simpleobject_representer)
+    yaml.add_representer(ptype.LazyDatasetMetadata, lazy_dataset_representer)
     yaml.add_multi_representer(uuid.UUID, uuid_representer)
     # TODO: This proabbly shouldn't be performed globally as it changes the output behaviour for a built-in type.
     # (although the default behaviour doesn't seem very widely useful: it outputs as a list.)
@@ -253,7 +270,7 @@ def as_flat_key_value(o, relative_to=None, key_separator='.', key_prefix=''):
             v = o[k]
             for nested_k, nested_v in recur(k, v):
                 yield nested_k, nested_v
-    elif isinstance(o, (list, set)):
+    elif isinstance(o, (list, tuple, set)):
         for index, v in enumerate(o):
             for nested_k, nested_v in recur(str(index), v):
                 yield nested_k, nested_v
@@ -3,9 +3,12 @@
 # pylint: disable=too-many-arguments,too-many-instance-attributes,too-many-locals
 from __future__ import absolute_import
 
+import collections
+import copy
 import datetime
 import inspect
 import logging
+import stat
 import uuid
 
 from pathlib import Path
@@ -15,7 +18,148 @@ from eodatasets import verify
 _LOG = logging.getLogger()
 
 
-class SimpleObject(object):
+# The fields of a SimpleObject class: its constructor arguments.
+#   items: (name, serialised name, default) of each, in constructor order.
+#   names_by_key: the field name for each name or serialised name.
+_Fields = collections.namedtuple('_Fields', ('items', 'names_by_key'))
+
+
+def _read_fields(cls):
+    """
+    Read the fields of a class from its constructor.
+
+    :rtype: _Fields
+    """
+    arg_defaults = [] if cls.__init__ is object.__init__ else _constructor_args(cls.__init__)
+    items = tuple((name, _serialised_name(name), default) for name, default in arg_defaults)
+
+    names_by_key = {}
+    # Reserved python words may have an underscore appended.
+    for name, serialised_name, _ in items:
+        names_by_key[serialised_name] = name
+    for name, _, _ in items:
+        names_by_key[name] = name
+
+    return _Fields(items, names_by_key)
+
+
+def _constructor_args(constructor):
+    """
+    The (name, default) of each argument of a constructor, excluding self.
+
+    :rtype: list[(str, object)]
+    """
+    if hasattr(inspect, 'signature'):
+        parameters = list(inspect.signature(constructor).parameters.values())[1:]
+        return [(p.name, None if p.default is p.empty else p.default)
+                for p in parameters if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)]
+
+    # inspect.signature() is not available in Python 2.7, so we use the py3-deprecated getargspec().
+    # pylint: disable=deprecated-method
+    constructor_spec = inspect.getargspec(constructor)
+    constructor_args = constructor_spec.args[1:]
+
+    defaults = constructor_spec.defaults
+    # Record the default value for each property (from constructor)
+    defaultless_count = len(constructor_args) - len(defaults or [])
+    return list(zip(constructor_args, ([None] * defaultless_count) + list(defaults or [])))
+
+
+def _serialised_name(name):
+    """
+    Our class property names have an appended underscore when they clash with Python names.
+
+    >>> _serialised_name('id_')
+    'id'
+    >>> _serialised_name('id')
+    'id'
+    """
+    return name[:-1] if name.endswith('_') else name
+
+
+def _loader(cls):
+    """
+    The from_dict() implementation of a class.
+
+    It's compiled on first use rather than at class creation, as some parsers are added to
+    PROPERTY_PARSERS after their class is defined.
+    """
+    # Not inherited: subclasses can have other parsers.
+    loader = cls.__dict__.get('_load_dict')
+    if loader is None:
+        loader = _compile_loader(cls)
+        cls._load_dict = loader
+    return loader
+
+
+def _compile_loader(cls):
+    """
+    Create a function to load an instance of the class from a dict.
+
+    :rtype: (dict) -> SimpleObject
+    """
+    # The field name and parser for each possible key.
+    fields = {key: (name, cls.PROPERTY_PARSERS.get(name)) for key, name in cls._fields.names_by_key.items()}
+
+    def load_dict(dict_):
+        props = {}
+
+        for key, value in dict_.items():
+            field = fields.get(key)
+            if field is None:
+                _LOG.warning('Unknown property %r in %r', key, cls.__name__)
+                continue
+
+            name, parser = field
+            if parser is not None:
+                try:
+                    value = parser(value)
+                except Exception:
+                    _LOG.error('Error in %r: %r', name, value)
+                    raise
+
+            props[name] = value
+
+        try:
+            o = cls(**props)
+        except TypeError:
+            _LOG.error('Incorrect props for %s: %r', cls.__name__, props)
+            raise
+
+        return o
+
+    return load_dict
+
+
+class _SimpleObjectType(type):
+    """
+    Reads the fields of each SimpleObject class once, when the class is created.
+
+    (rather than inspecting the constructor every time an object is serialised)
+
+    Fields are stored in __slots__, as we hold many thousands of these objects in memory when
+    loading datasets in bulk. Other attributes can still be set: they go in a __dict__, which is
+    only allocated for objects that have them.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        if '__slots__' not in namespace:
+            constructor = namespace.get('__init__')
+            inherited_slots = set(
+                slot for base in bases for cls in base.__mro__ for slot in cls.__dict__.get('__slots__', ())
+            )
+            namespace['__slots__'] = tuple(
+                arg for arg, _ in (_constructor_args(constructor) if constructor else ())
+                if arg not in inherited_slots
+            )
+        return super(_SimpleObjectType, mcs).__new__(mcs, name, bases, namespace)
+
+    def __init__(cls, name, bases, namespace):
+        super(_SimpleObjectType, cls).__init__(name, bases, namespace)
+        cls._fields = _read_fields(cls)
+
+
+class SimpleObject(_SimpleObjectType('_SimpleObjectBase', (object,), {'__slots__': ('__dict__',)})):
     """
     An object with identical constructor arguments and properties.
 
@@ -56,7 +200,7 @@ class SimpleObject(object):
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return all(getattr(self, prop) == getattr(other, prop) for prop, _, _ in self._fields.items)
 
         return False
 
@@ -68,17 +212,7 @@ class SimpleObject(object):
         (ordered output is primarily useful for readability: such as repr() or log output.)
         :rtype: [(str, obj)]
         """
-        # inspect.signature() is not available in Python 2.7, so we use the py3-deprecated getargspec().
-        # pylint: disable=deprecated-method
-        constructor_spec = inspect.getargspec(cls.__init__)
-        constructor_args = constructor_spec.args[1:]
-
-        defaults = constructor_spec.defaults
-        # Record the default value for each property (from constructor)
-        defaultless_count = len(constructor_args) - len(defaults or [])
-        value_defaults = ([None] * defaultless_count) + list(defaults or [])
-
-        return zip(constructor_args, value_defaults)
+        return [(name, default) for name, _, default in cls._fields.items]
 
     def steal_fields_from(self, other):
         """
@@ -86,7 +220,7 @@ class SimpleObject(object):
         :type other:
         :return:
         """
-        for prop_name, default_value in self.__class__.item_defaults():
+        for prop_name, _, default_value in self._fields.items:
             if getattr(self, prop_name) == default_value:
                 setattr(self, prop_name, getattr(other, prop_name))
 
@@ -99,7 +233,7 @@ class SimpleObject(object):
         (ordered output is primarily useful for readability: such as log output.)
         :rtype: [(str, obj)]
         """
-        for prop, default_value in self.item_defaults():
+        for prop, _, default_value in self._fields.items:
             value = getattr(self, prop)
 
             # Skip None properties that default to None
@@ -108,6 +242,21 @@ class SimpleObject(object):
 
             yield prop, value
 
+    def items_serialised(self, skip_nones=True):
+        """
+        Like items_ordered(), but with the property names used in serialised documents.
+
+        (without any underscore appended to avoid Python's reserved words)
+        :rtype: [(str, obj)]
+        """
+        for prop, serialised_name, default_value in self._fields.items:
+            value = getattr(self, prop)
+
+            if skip_nones and (value is None and default_value is None):
+                continue
+
+            yield serialised_name, value
+
     @classmethod
     def from_dict(cls, dict_):
         """
@@ -120,35 +269,7 @@ class SimpleObject(object):
 
         :type dict_: dict[str, obj]
         """
-        possible_properties = dict(cls.item_defaults())
-        props = {}
-
-        for key, value in dict_.items():
-            if key not in possible_properties:
-                # Reserved python words may have an underscore appended
-                if key + '_' not in possible_properties:
-                    _LOG.warning('Unknown property %r in %r', key, cls.__name__)
-                    continue
-
-                key += '_'
-
-            if key in cls.PROPERTY_PARSERS:
-                parser = cls.PROPERTY_PARSERS[key]
-                try:
-                    value = parser(value)
-                except Exception:
-                    _LOG.error('Error in %r: %r', key, value)
-                    raise
-
-            props[key] = value
-
-        try:
-            o = cls(**props)
-        except TypeError:
-            _LOG.error('Incorrect props for %s: %r', cls.__name__, props)
-            raise
-
-        return o
+        return _loader(cls)(dict_)
 
     @classmethod
     def from_dicts(cls, list_):
@@ -459,7 +580,8 @@ class BrowseMetadata(SimpleObject):
 
     def __init__(self, path=None, file_type=None, cell_size=None,
                  shape=None,
-                 red_band=None, green_band=None, blue_band=None):
+                 red_band=None, green_band=None, blue_band=None,
+                 tile_size=None):
         #: :type: pathlib.Path
         self.path = path
 
@@ -478,6 +600,11 @@ class BrowseMetadata(SimpleObject):
         self.green_band = green_band
         self.blue_band = blue_band
 
+        # Pixel width/height of tiles, if this is a tile pyramid rather than a single image.
+        #
+        # The path is then a directory of '{z}/{x}/{y}' tiles with an 'index.json' describing them.
+        self.tile_size = tile_size
+
 
 class BandMetadata(SimpleObject):
     PROPERTY_PARSERS = {
@@ -657,17 +784,22 @@ class AncillaryMetadata(SimpleObject):
         """
         :type file_path: pathlib.Path
         """
-        if not file_path.exists():
+        try:
+            file_stat = file_path.stat()
+        except OSError:
             raise ValueError('Ancil path given does not exist: {}'.format(file_path))
-        if not file_path.is_file():
+
+        is_file = stat.S_ISREG(file_stat.st_mode)
+        if not is_file:
             _LOG.warning('Ancil path is not a file: %s', file_path)
 
         return AncillaryMetadata(
             name=file_path.name,
             uri=str(file_path),
-            modification_dt=datetime.datetime.fromtimestamp(file_path.stat().st_mtime),
-            access_dt=datetime.datetime.fromtimestamp(file_path.stat().st_atime),
-            checksum_sha1=verify.calculate_file_sha1(file_path) if file_path.is_file() else None,
+            modification_dt=datetime.datetime.fromtimestamp(file_stat.st_mtime),
+            access_dt=datetime.datetime.fromtimestamp(file_stat.st_atime),
+            # Ancillary files are shared by many datasets: only hash them when they change.
+            checksum_sha1=verify.cached_file_sha1(file_path, stat=file_stat) if is_file else None,
             properties=properties
         )
 
@@ -888,6 +1020,140 @@ class DatasetMetadata(SimpleObject):
         self.product_flags = product_flags
 
 
+class LazyDatasetMetadata(object):
+    """
+    A dataset that's only deserialised when it's used.
+
+    Derived datasets embed their whole ancestry as source datasets, which most readers never look at.
+
+    It behaves like the DatasetMetadata it wraps (including isinstance() checks). Until it's used, it
+    keeps the original document, which is written out unchanged.
+
+    Anything that reads every field will load it: such as map_values(), steal_fields_from(), or
+    comparing it to a dataset with a different document.
+    """
+    __slots__ = ('_doc', '_dataset')
+
+    def __init__(self, doc):
+        """
+        :type doc: dict
+        """
+        self._doc = doc
+        self._dataset = None
+
+    @property
+    def unloaded_doc(self):
+        """
+        The original document, if the dataset hasn't been loaded.
+
+        :rtype: dict or None
+        """
+        return self._doc
+
+    def unloaded_paths(self):
+        """
+        The path values of the original document (including those of its source datasets), if it
+        hasn't been loaded.
+
+        :rtype: list[str] or None
+        """
+        if self._doc is None:
+            return None
+        return _document_paths(DatasetMetadata, self._doc)
+
+    def load(self):
+        """
+        :rtype: DatasetMetadata
+        """
+        if self._dataset is None:
+            self._dataset = DatasetMetadata.from_dict(self._doc)
+            self._doc = None
+        return self._dataset
+
+    @property
+    def __class__(self):
+        return DatasetMetadata
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        if name in LazyDatasetMetadata.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.load(), name, value)
+
+    def __eq__(self, other):
+        # Identical documents give identical datasets, without loading either of them.
+        if self._doc is not None and isinstance(other, LazyDatasetMetadata) and self._doc == other.unloaded_doc:
+            return True
+        return self.load() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        # Hashable only if the dataset is (DatasetMetadata isn't in Python 3, as it defines __eq__).
+        return hash(self.load())
+
+    def __repr__(self):
+        return repr(self.load())
+
+    def __reduce_ex__(self, protocol):
+        # Pickled (and copied) as the real dataset.
+        return self.load().__reduce_ex__(protocol)
+
+    @classmethod
+    def from_named_dicts(cls, dict_):
+        """
+        A dict of lazy datasets (maintaining the key name).
+
+        :type dict_: dict[str, dict]
+        :rtype: dict[str, LazyDatasetMetadata]
+        """
+        return dict([(k, cls(v)) for (k, v) in dict_.items()])
+
+
+def _document_paths(cls, doc):
+    """
+    The values of path fields in an unparsed document of the given class, including its nested objects.
+
+    >>> _document_paths(DatasetMetadata, {'image': {'bands': {'1': {'path': 'product/b1.tif'}}}})
+    ['product/b1.tif']
+
+    :type cls: type
+    :type doc: dict
+    :rtype: list[str]
+    """
+    paths = []
+    for key, value in doc.items():
+        # pylint: disable=protected-access
+        parser = cls.PROPERTY_PARSERS.get(cls._fields.names_by_key.get(key))
+        if value is None or parser is None:
+            continue
+        if parser is Path:
+            paths.append(value)
+            continue
+
+        # Nested objects are parsed by a loader classmethod of their class.
+        owner = getattr(parser, '__self__', None)
+        if owner is LazyDatasetMetadata:
+            owner = DatasetMetadata
+        if not (isinstance(owner, type) and issubclass(owner, SimpleObject)):
+            continue
+        if parser.__name__ == 'from_dict':
+            nested_docs = [value]
+        elif parser.__name__ == 'from_dicts':
+            nested_docs = value
+        elif parser.__name__ == 'from_named_dicts':
+            nested_docs = value.values()
+        else:
+            continue
+        for nested_doc in nested_docs:
+            paths.extend(_document_paths(owner, nested_doc))
+    return paths
+
+
 class GeoJsonGeometry(SimpleObject):
     def __init__(self, type_=None, coordinates=None):
         super(GeoJsonGeometry, self).__init__()
@@ -970,20 +1236,69 @@ def rebase_paths(source_path, destination_path, object_):
     Rebase all paths in a given object structure (list, dict, SimpleObject) from
     one root path to another.
 
+    The given object is not modified, and a new (top-level) object is returned. But nested objects
+    are only copied (without calling their constructors) if they contain rebased paths: everything
+    else is shared with the original, so changing a nested object of the result may change the
+    original too.
+
+    Source datasets are only loaded if they have paths to rebase.
+
     :type source_path: Path
     :type destination_path: Path
+
+    >>> o = [Path('/tmp/from/a.txt'), {'b': Path('/tmp/other/b.txt')}]
+    >>> rebased = rebase_paths(Path('/tmp/from'), Path('/tmp/to'), o)
+    >>> rebased
+    [PosixPath('/tmp/to/a.txt'), {'b': PosixPath('/tmp/other/b.txt')}]
+    >>> rebased[1] is o[1]
+    True
+    >>> unchanged = rebase_paths(Path('/tmp/from'), Path('/tmp/to'), o[1])
+    >>> unchanged is o[1], unchanged == o[1]
+    (False, True)
     """
 
-    def rebase_if_path(o):
+    def is_rebased(path):
+        path = Path(path)
+        return rebase_path(source_path, destination_path, path) != path
+
+    def rebase(o):
         if isinstance(o, Path):
             return rebase_path(source_path, destination_path, o)
+        if isinstance(o, LazyDatasetMetadata):
+            unloaded_paths = o.unloaded_paths()
+            if unloaded_paths is not None and not any(is_rebased(p) for p in unloaded_paths):
+                return o
+        if isinstance(o, SimpleObject):
+            # pylint: disable=protected-access
+            changes = [(name, rebase(getattr(o, name))) for name, _, _ in o._fields.items]
+            changes = [(name, value) for name, value in changes if value is not getattr(o, name)]
+            if changes:
+                o = copy.copy(o)
+                for name, value in changes:
+                    setattr(o, name, value)
+            return o
+        if isinstance(o, dict):
+            changes = [(k, rebase(v)) for k, v in o.items()]
+            changes = [(k, v) for k, v in changes if v is not o[k]]
+            if changes:
+                o = copy.copy(o)
+                o.update(changes)
+            return o
+        if isinstance(o, (list, tuple)):
+            rebased = [rebase(v) for v in o]
+            if any(new is not old for new, old in zip(rebased, o)):
+                return rebased if isinstance(o, list) else tuple(rebased)
+            return o
         return o
 
-    return map_values(rebase_if_path, object_)
+    rebased_object = rebase(object_)
+    if rebased_object is object_ and isinstance(object_, (SimpleObject, dict, list)):
+        rebased_object = copy.copy(object_)
+    return rebased_object
 
 
-# Circular reference.
-LineageMetadata.PROPERTY_PARSERS['source_datasets'] = DatasetMetadata.from_named_dicts
+# Circular reference. Source datasets are loaded when used.
+LineageMetadata.PROPERTY_PARSERS['source_datasets'] = LazyDatasetMetadata.from_named_dicts
 
 
 def register_software_version(software_code, version, repo_url=None):
@@ -4,14 +4,21 @@ from __future__ import absolute_import
 import binascii
 import hashlib
 import logging
+import threading
 
 # PyLint doesn't recognise many distutils functions when in virtualenv. Not worth the effort.
 # pylint: disable=no-name-in-module
 from distutils import spawn
 from pathlib import Path
 
+from eodatasets import cache
+
 _LOG = logging.getLogger(__name__)
 
+# SHA1s of files read by this process, by file identity.
+_SHA1S = {}
+_SHA1S_LOCK = threading.Lock()
+
 
 def find_exe(name):
     """
@@ -35,6 +42,38 @@ def calculate_file_sha1(filename):
     return calculate_file_hash(filename, hash_fn=hashlib.sha1)
 
 
+def cached_file_sha1(filename, stat=None):
+    """
+    The SHA1 of a file, remembered while the file is unchanged.
+
+    Files (such as ancillary files) that are used by many datasets are only read once per process,
+    or once overall if the persistent checksum cache is enabled.
+
+    :type filename: str or Path
+    :param stat: The file's stat result, if already known.
+    :rtype: str
+    """
+    identity = cache.file_identity(filename, stat=stat)
+    with _SHA1S_LOCK:
+        sha1 = _SHA1S.get(identity)
+    if sha1 is not None:
+        return sha1
+
+    persistent_cache = cache.get_cache('checksum')
+    key = cache.make_key('sha1', identity)
+    if persistent_cache is not None:
+        sha1 = persistent_cache.get(key)
+
+    if sha1 is None:
+        sha1 = calculate_file_sha1(filename)
+        if persistent_cache is not None:
+            persistent_cache.put(key, sha1)
+
+    with _SHA1S_LOCK:
+        _SHA1S[identity] = sha1
+    return sha1
+
+
 def calculate_file_hash(filename, hash_fn=hashlib.sha1, block_size=4096):
     """
     Calculate the hash of the contents of a given file path.
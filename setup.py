@@ -26,13 +26,14 @@ setup(
         'pathlib',
         'pyyaml',
         'rasterio',
-        'shapely',
-        'scipy'
+        'scandir;python_version<"3.5"',
+        'shapely'
     ],
     entry_points='''
         [console_scripts]
         eod-package=eodatasets.scripts.genpackage:run
         eod-generate-metadata=eodatasets.scripts.genmetadata:run
         eod-generate-browse=eodatasets.scripts.genbrowse:run
+        eod-clear-cache=eodatasets.scripts.clearcache:run
     ''',
 )
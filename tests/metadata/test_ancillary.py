@@ -0,0 +1,76 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+from eodatasets.metadata import ancillary, level1
+from tests import write_files
+
+
+def test_index_matches_search():
+    path = write_files({
+        'L7CPF20050101_20050331.09': '',
+        '11': {
+            'LO8BPF20141104220030_20141104224617.01': '',
+            # Real-world error: ancillary folder inside ancillary folder leads to duplicates.
+            '11': {
+                'LO8BPF20141104220030_20141104224617.01': ''
+            }
+        },
+        '12': {
+            'LO8BPF20141104220030_20141104224617.01': '',
+        },
+    })
+    index = ancillary.DirectoryIndex(path)
+    for name in ('L7CPF20050101_20050331.09', 'LO8BPF20141104220030_20141104224617.01', 'missing'):
+        assert index.find(name) == list(path.rglob(name))
+
+
+def test_index_is_refreshed():
+    path = write_files({
+        '2014': {
+            'L7CPF20140101_20140331.01': ''
+        },
+    })
+    index = ancillary.get_directory_index(path)
+    assert ancillary.get_directory_index(str(path)) is index
+    assert index.find('L7CPF20140401_20140630.02') == []
+
+    # New files in existing directories, and new directories, are both seen.
+    path.joinpath('2014', 'L7CPF20140401_20140630.02').touch()
+    path.joinpath('2015').mkdir()
+    path.joinpath('2015', 'L7CPF20150101_20150331.01').touch()
+
+    assert index.find('L7CPF20140401_20140630.02') == [path.joinpath('2014', 'L7CPF20140401_20140630.02')]
+    assert index.find('L7CPF20150101_20150331.01') == [path.joinpath('2015', 'L7CPF20150101_20150331.01')]
+
+    # Removed files aren't returned.
+    path.joinpath('2014', 'L7CPF20140401_20140630.02').unlink()
+    path.joinpath('2015', 'L7CPF20140401_20140630.02').touch()
+    assert index.find('L7CPF20140401_20140630.02') == [path.joinpath('2015', 'L7CPF20140401_20140630.02')]
+
+
+def test_found_files_do_not_rescan(monkeypatch):
+    path = write_files({
+        '11': {
+            'LO8BPF20141104220030_20141104224617.01': ''
+        }
+    })
+    index = ancillary.DirectoryIndex(path)
+    expected = [path.joinpath('11', 'LO8BPF20141104220030_20141104224617.01')]
+    assert index.find('LO8BPF20141104220030_20141104224617.01') == expected
+
+    # Once indexed, a file that's found doesn't touch its directories.
+    monkeypatch.setattr(ancillary, 'scandir', None)
+    assert index.find('LO8BPF20141104220030_20141104224617.01') == expected
+
+
+def test_get_ancillary_file():
+    path = write_files({
+        '11': {
+            'LO8BPF20141104220030_20141104224617.01': ''
+        }
+    })
+    assert level1._get_ancillary_file(path, 'LO8BPF20141104220030_20141104224617.01') == \
+        level1._get_file(path, 'LO8BPF20141104220030_20141104224617.01')
+    # Patterns are still searched.
+    assert level1._get_ancillary_file(path, 'LO8BPF*.01') == \
+        path.joinpath('11', 'LO8BPF20141104220030_20141104224617.01')
@@ -0,0 +1,53 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import eodatasets.type as ptype
+from eodatasets.inventory import FileInventory
+from eodatasets.metadata import extractors, pds
+from tests import write_files
+
+
+def test_builtin_extractor_order():
+    assert [e.name for e in extractors.raw_extractors()] == [
+        'adsfolder', 'rccfile', 'mdf', 'passinfo', 'pds', 'npphdf5'
+    ]
+
+
+def test_only_matching_extractors_run(monkeypatch):
+    d = write_files({
+        'L7EB2016197002335ASA213I00.data': '',
+    })
+
+    def fail(*args):
+        raise AssertionError('Extractor should not have run')
+
+    # PDS extraction is expensive, and doesn't apply.
+    monkeypatch.setattr(pds, 'get_pdsinfo', fail)
+    assert not pds.probe(FileInventory.scan(d))
+
+    md = extractors.extract_raw_metadata(ptype.DatasetMetadata(), d, FileInventory.scan(d))
+    assert md.platform.code == 'LANDSAT_7'
+
+
+def test_register_extractor(monkeypatch):
+    monkeypatch.setattr(extractors, '_RAW_EXTRACTORS', extractors.raw_extractors())
+    d = write_files({
+        'sensor.json': '{}',
+    })
+
+    def extract(md, path, inventory):
+        md.product_type = 'new_sensor'
+        return md
+
+    extractors.register_raw_extractor('new_sensor', extract, lambda inventory: bool(inventory.glob('*.json')))
+    assert extractors.raw_extractors()[-1].name == 'new_sensor'
+
+    md = extractors.extract_raw_metadata(ptype.DatasetMetadata(), d, FileInventory.scan(d))
+    assert md.product_type == 'new_sensor'
+
+    # No match: not run.
+    d = write_files({
+        'sensor.txt': '',
+    })
+    md = extractors.extract_raw_metadata(ptype.DatasetMetadata(), d, FileInventory.scan(d))
+    assert md.product_type is None
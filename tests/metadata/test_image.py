@@ -0,0 +1,52 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+from osgeo import gdal, gdalconst
+
+import eodatasets.type as ptype
+from eodatasets.metadata import image
+from tests import write_files
+
+
+def _write_image(path, geotransform, cols, rows):
+    i = gdal.GetDriverByName('GTiff').Create(str(path), cols, rows, 1, gdalconst.GDT_Int16)
+    i.SetGeoTransform(geotransform)
+    # noinspection PyProtectedMember
+    i.SetProjection(image._GDA_94.ExportToWkt())
+    i = None
+    return path
+
+
+def test_populate_from_image_metadata():
+    d = write_files({})
+    md = ptype.DatasetMetadata(
+        image=ptype.ImageMetadata(bands={
+            '1': ptype.BandMetadata(
+                path=_write_image(d.joinpath('1.tif'), (397000.0, 25.0, 0.0, 7236000.0, 0.0, -25.0), 40, 30)
+            ),
+            '2': ptype.BandMetadata(
+                path=_write_image(d.joinpath('2.tif'), (397000.0, 25.0, 0.0, 7236000.0, 0.0, -25.0), 40, 30)
+            ),
+            '8': ptype.BandMetadata(
+                path=_write_image(d.joinpath('8.tif'), (397000.0, 12.5, 0.0, 7236000.0, 0.0, -12.5), 80, 60)
+            ),
+            'missing': ptype.BandMetadata(path=d.joinpath('missing.tif')),
+        })
+    )
+    md = image.populate_from_image_metadata(md)
+
+    bands = md.image.bands
+    assert bands['1'].shape == ptype.Point(40, 30)
+    assert bands['1'].cell_size == ptype.Point(25.0, 25.0)
+    assert bands['8'].shape == ptype.Point(80, 60)
+    assert bands['8'].cell_size == ptype.Point(12.5, 12.5)
+    assert bands['missing'].shape is None
+
+    projection = md.grid_spatial.projection
+    assert projection.zone == 53
+    assert projection.unit == 'metre'
+    # Both grids have the same extent.
+    assert projection.geo_ref_points.ul == ptype.Point(397000.0, 7236000.0)
+    assert projection.geo_ref_points.lr == ptype.Point(398000.0, 7235250.0)
+    assert round(md.extent.coord.ul.lat, 3) == -24.988
+    assert round(md.extent.coord.ul.lon, 3) == 133.979
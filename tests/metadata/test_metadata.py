@@ -409,3 +409,33 @@ def test_ortho_find_file():
     matched = level1._get_file(path, 'LO8BPF20141104220030_20141104224617.01')
     assert matched is not None
     assert matched.name == 'LO8BPF20141104220030_20141104224617.01'
+
+
+def test_load_mtl_groups():
+    path = write_files({
+        'test_MTL.txt': '\n'.join([
+            'GROUP = L1_METADATA_FILE',
+            '  GROUP = METADATA_FILE_INFO',
+            '    ORIGIN = "Image courtesy of the U.S. Geological Survey"',
+            '    FILE_DATE = 2014-11-12T15:08:35Z',
+            '  END_GROUP = METADATA_FILE_INFO',
+            '  GROUP = IMAGE_ATTRIBUTES',
+            '    CLOUD_COVER = 0.01',
+            '    WRS_PATH = 101',
+            '  END_GROUP = IMAGE_ATTRIBUTES',
+            'END_GROUP = L1_METADATA_FILE',
+            'END_GROUP = NOT_A_GROUP',
+            'IGNORED = 1',
+            'END',
+        ])
+    })
+    assert level1._load_mtl(path.joinpath('test_MTL.txt')) == {
+        'METADATA_FILE_INFO': {
+            'origin': 'Image courtesy of the U.S. Geological Survey',
+            'file_date': datetime.datetime(2014, 11, 12, 15, 8, 35),
+        },
+        'IMAGE_ATTRIBUTES': {
+            'cloud_cover': 0.01,
+            'wrs_path': 101,
+        },
+    }
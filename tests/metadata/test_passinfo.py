@@ -5,6 +5,7 @@ import datetime
 import unittest
 
 from eodatasets import type as ptype
+from eodatasets.inventory import FileInventory
 from eodatasets.metadata import passinfo as extraction
 from tests import write_files
 
@@ -136,6 +137,23 @@ class TestPassinfo(unittest.TestCase):
         self.assertEqual(md.acquisition.aos, datetime.datetime(2005, 1, 6, 23, 32, 14))
         self.assertEqual(md.acquisition.los, datetime.datetime(2005, 1, 6, 23, 39, 12))
 
+    def test_passinfo_beside_dataset(self):
+        d = write_files({
+            'passinfo': [
+                "STATION TERSS\n",
+                "SATELLITE   LANDSAT-5\n",
+                "ORBIT   110912\n",
+                "SENSOR  TM\n",
+            ],
+            'L5TB2005006233214ASA111I00.data': '',
+        })
+        inventory = FileInventory.scan(d.joinpath('L5TB2005006233214ASA111I00.data'))
+        self.assertTrue(extraction.probe(inventory))
+
+        # The parent directory was listed by the probe.
+        d.joinpath('passinfo').rename(d.joinpath('passinfo.moved'))
+        self.assertEqual(extraction.find_passinfo_files(inventory.root, inventory), [d.joinpath('passinfo')])
+
 
 if __name__ == '__main__':
     unittest.main()
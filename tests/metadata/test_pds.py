@@ -4,12 +4,15 @@ Module
 """
 from __future__ import absolute_import
 import datetime
-
-import mock
+import shutil
+import struct
+import subprocess
+import timeit
+from distutils import spawn
 
 from pathlib import Path
 
-from tests import write_files, assert_same
+from tests import write_files, assert_same, slow
 import eodatasets.metadata.pds as pds
 import eodatasets.type as ptype
 
@@ -66,44 +69,112 @@ def test_find_terra_pds_file():
     assert expected == found
 
 
-@mock.patch('eodatasets.metadata.pds._run_pdsinfo_exe')
-def test_get_pdsinfo(_run_pdsinfo_exe):
-    pdsfile = Path('/tmp/pds')
+_AQUA_PDS_FILE = Path(__file__).parent.parent.joinpath(
+    'integration', 'input', 'aqua-pds', 'data', 'AQUA.65208.S1A1C1D1R1', 'P1540064AAAAAAAAAAAAAA14219032341001.PDS'
+)
+
+
+def _packet(time, packet_type, size):
+    """
+    A MODIS CCSDS packet with the given time, type (0: day, 1: night, 2: engineering...) and total size.
+    """
+    since_epoch = time - datetime.datetime(1958, 1, 1)
+    milliseconds, microseconds = divmod(since_epoch.seconds * 1000000 + since_epoch.microseconds, 1000)
+    header = struct.pack(
+        '>HHHHIHB',
+        # Version 0, secondary header present, APID 64.
+        0x0800 | 64, 0xC000, size - 7,
+        since_epoch.days, milliseconds, microseconds,
+        packet_type << 4
+    )
+    return header + b'\0' * (size - len(header))
 
-    _run_pdsinfo_exe.return_value = b"""APID 64: count 610338 invalid 0 missing 6255
-first packet: 2014/08/07 03:16:28.750910
-last packet: 2014/08/07 03:21:28.604695
-missing seconds: 2
-day packets: 545223/64311
-night packets: 0/0
-engineering packets: 804/0
-"""
 
-    start, end, day, night = pds.get_pdsinfo(pdsfile)
+def test_get_pdsinfo():
+    start, end, day, night = pds.get_pdsinfo(_AQUA_PDS_FILE)
 
     assert start == datetime.datetime(2014, 8, 7, 3, 16, 28, 750910)
-    assert end == datetime.datetime(2014, 8, 7, 3, 21, 28, 604695)
-    assert day == 545223
+    assert end == datetime.datetime(2014, 8, 7, 3, 16, 30, 228023)
+    assert day == 3336
     assert night == 0
 
 
-@mock.patch('eodatasets.metadata.pds._run_pdsinfo_exe')
-def test_extract_md(_run_pdsinfo_exe):
-    input_dir = write_files({'P1540064AAAAAAAAAAAAAA14219032341001.PDS': ''})
+def test_get_pdsinfo_mixed_packets():
+    t = datetime.datetime(2014, 8, 7, 3, 16, 28, 750910)
+    second = datetime.timedelta(seconds=1)
+    packets = (
+        [_packet(t, 0, 642)] * 3 +
+        # Night packets are smaller.
+        [_packet(t + second, 1, 276)] * 5 +
+        [_packet(t + 2 * second, 2, 642)] +
+        [_packet(t + 3 * second, 0, 642)] * 2 +
+        [_packet(t + 4 * second, 1, 276)]
+    )
+    d = write_files({})
+    pds_file = d.joinpath('P1540064AAAAAAAAAAAAAA14219032341001.PDS')
+    with pds_file.open('wb') as f:
+        f.write(b''.join(packets))
+        # Ignored: a truncated packet.
+        f.write(_packet(t + 5 * second, 0, 642)[:100])
 
-    # def run_pdsinfo(file_):
-    #     assert file_ == input_dir
-    #
-    #     return
+    start, end, day, night = pds.get_pdsinfo(pds_file)
+    assert start == t
+    assert end == t + 4 * second
+    assert day == 5
+    assert night == 6
 
-    _run_pdsinfo_exe.return_value = b"""APID 64: count 610338 invalid 0 missing 6255
-    first packet: 2014/08/07 03:16:28.750910
-    last packet: 2014/08/07 03:21:28.604695
-    missing seconds: 2
-    day packets: 545223/64311
-    night packets: 0/0
-    engineering packets: 804/0
+
+def _get_pdsinfo_per_packet(pds_path):
+    """
+    get_pdsinfo() as the pdsinfo tool does it: reading the headers one packet at a time.
     """
+    first_packet = last_packet = None
+    day = night = 0
+    with pds_path.open('rb') as f:
+        while True:
+            header = f.read(15)
+            if len(header) < 15:
+                break
+            _, _, length, days, milliseconds, microseconds, packet_type = struct.unpack('>HHHHIHB', header)
+            f.seek(length + 7 - 15, 1)
+
+            time = datetime.datetime(1958, 1, 1) + datetime.timedelta(
+                days=days, milliseconds=milliseconds, microseconds=microseconds
+            )
+            first_packet = first_packet or time
+            last_packet = time
+            day += (packet_type >> 4) & 0b111 == 0
+            night += (packet_type >> 4) & 0b111 == 1
+    return first_packet, last_packet, day, night
+
+
+@slow
+def test_get_pdsinfo_benchmark():
+    start, end, day, night = pds.get_pdsinfo(_AQUA_PDS_FILE)
+    assert _get_pdsinfo_per_packet(_AQUA_PDS_FILE) == (start, end, day, night)
+
+    def seconds(get_info):
+        return min(timeit.repeat(lambda: get_info(_AQUA_PDS_FILE), number=10, repeat=3)) / 10
+
+    packets = day + night
+    vectorised_seconds = seconds(pds.get_pdsinfo)
+    per_packet_seconds = seconds(_get_pdsinfo_per_packet)
+    print('Reading %s PDS packets: %.0f packets/s (%.0f packets/s one at a time)' % (
+        packets, packets / vectorised_seconds, packets / per_packet_seconds
+    ))
+    assert vectorised_seconds < per_packet_seconds
+
+    # The pdsinfo tool from pds-tools, if installed, run as it was by previous versions.
+    pdsinfo_exe = spawn.find_executable('pdsinfo')
+    if pdsinfo_exe:
+        pdsinfo_seconds = seconds(lambda path: subprocess.check_output([pdsinfo_exe, str(path.absolute())]))
+        print('pdsinfo: %.0f packets/s' % (packets / pdsinfo_seconds,))
+        assert vectorised_seconds <= pdsinfo_seconds
+
+
+def test_extract_md():
+    input_dir = write_files({})
+    shutil.copy(str(_AQUA_PDS_FILE), str(input_dir))
 
     md = pds.extract_md(ptype.DatasetMetadata(), input_dir)
 
@@ -113,7 +184,7 @@ def test_extract_md(_run_pdsinfo_exe):
         format_=ptype.FormatMetadata(name='PDS'),
         acquisition=ptype.AcquisitionMetadata(
             aos=datetime.datetime(2014, 8, 7, 3, 16, 28, 750910),
-            los=datetime.datetime(2014, 8, 7, 3, 21, 28, 604695)
+            los=datetime.datetime(2014, 8, 7, 3, 16, 30, 228023)
         ),
         image=ptype.ImageMetadata(
             day_percentage_estimate=100.0
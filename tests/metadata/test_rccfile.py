@@ -2,6 +2,7 @@
 from __future__ import absolute_import
 
 import datetime
+import struct
 
 from eodatasets import type as ptype
 from eodatasets.metadata import rccfile
@@ -210,3 +211,42 @@ class TestRccExtract(TestCase):
             expected_output.id_ = None
 
             self.assert_same(expected_output, output)
+
+
+def _frame(counter, size=1040):
+    # Sync word, VCDU identifier, 24-bit frame counter, then (fill) data.
+    header = b'\x1a\xcf\xfc\x1d' + struct.pack('>HI', 0x4241, counter)[:2] + struct.pack('>I', counter)[1:]
+    return header + b'\x55' * (size - len(header))
+
+
+def test_stop_time_from_frame_counters(monkeypatch):
+    # Only search a few frames at each end, so the middle of the file is never read.
+    monkeypatch.setattr(rccfile, '_FRAME_SEARCH_BYTES', 1040 * 10)
+
+    d = write_files({'L7EB2013259012832ASN213I00.data': ''})
+    path = d.joinpath('L7EB2013259012832ASN213I00.data')
+    # A partial frame before the first, 100 lost frames in the middle, and a counter wrap.
+    first_counter = (1 << 24) - 50
+    frames = [_frame((first_counter + i) % (1 << 24)) for i in list(range(100)) + list(range(200, 300))]
+    with path.open('wb') as f:
+        f.write(b'\x00' * 30 + b''.join(frames) + _frame(0)[:5])
+
+    md = rccfile.extract_md(ptype.DatasetMetadata(), d)
+    aos = datetime.datetime(2013, 9, 16, 1, 28, 32)
+    assert md.acquisition.aos == aos
+    # 300 frames were sent, though only 200 received.
+    assert md.acquisition.los == aos + datetime.timedelta(seconds=300 * 1040 * 8 / 75000000.0)
+
+
+def test_stop_time_without_frames(monkeypatch):
+    # A second's data at a lower bit rate, to keep the file small.
+    monkeypatch.setitem(rccfile._BIT_RATES, 'LANDSAT_7', 8000.0)
+
+    d = write_files({'L7EB2013259012832ASN213I00.data': ''})
+    path = d.joinpath('L7EB2013259012832ASN213I00.data')
+    with path.open('wb') as f:
+        f.write(b'\x1a\xcf\xfc\x1d' + b'\x00' * (8000 // 8))
+
+    # No consistent frames: estimated from size.
+    md = rccfile.extract_md(ptype.DatasetMetadata(), d)
+    assert md.acquisition.los == datetime.datetime(2013, 9, 16, 1, 28, 33)
@@ -0,0 +1,105 @@
+# coding=utf-8
+from __future__ import absolute_import, print_function
+
+import datetime
+import re
+import timeit
+
+from pathlib import Path
+
+from eodatasets.metadata import util
+from tests import slow, write_files
+
+_MTL_DIRECTORY = Path(__file__).parent.joinpath('mtl')
+
+
+def _mtl_values():
+    """
+    All values in our MTL test files (a realistic mix of types).
+    """
+    pair = re.compile(r'(\w+)\s=\s(.*)')
+    values = []
+    for mtl_path in sorted(_MTL_DIRECTORY.glob('*.txt')):
+        with mtl_path.open('r') as f:
+            for line in f:
+                match = pair.search(line)
+                if match and match.group(1) not in ('GROUP', 'END_GROUP'):
+                    values.append(match.group(2))
+    return values
+
+
+# Forms that only the slow path handles, and values that look right but aren't.
+_UNUSUAL_VALUES = [
+    ' 42', '42 ', '1_000', '1_0.5', '112_079_079', 'nan', '-inf', 'Infinity',
+    '2015-13-29', '2015-02-30', '2015-02- 3', '2014-11-12t15:08:35z', '2014-11-12T24:08:35Z',
+    '01:40:54.7', '01:40:54.77Z', '01:40:54.7722350Z trailing', '1:2:3.123456789', '25:40:54.7',
+    '', '"', '""', 'Y ', 'YES', 'None', '+.5', '1.', '1e5', '-', '.', 'e5',
+]
+
+
+def _same(a, b):
+    return type(a) is type(b) and (a == b or (a != a and b != b))
+
+
+def test_parse_type_matches_trial_parsing():
+    for value in _mtl_values() + _UNUSUAL_VALUES:
+        # noinspection PyProtectedMember
+        expected = util._parse_type_by_trial(value)
+        actual = util.parse_type(value)
+        assert _same(expected, actual), 'Parsed %r as %r, expected %r' % (value, actual, expected)
+
+
+def test_parse_type_values():
+    assert util.parse_type('2014-11-12T15:08:35Z') == datetime.datetime(2014, 11, 12, 15, 8, 35)
+    assert util.parse_type('2015-02-30') == '2015-02-30'
+    assert util.parse_type('01:40:54.7') == datetime.time(1, 40, 54, 700000)
+    assert util.parse_type(' 42') == 42
+
+
+def test_read_xml_fields():
+    d = write_files({
+        'work_order.xml': '\n'.join([
+            '<WorkOrder>',
+            '  <L0RpProcessing><CalibrationFile>/ancil/cpf</CalibrationFile></L0RpProcessing>',
+            '  <L1Processing>',
+            '    <BPFOliFile>/ancil/bpf</BPFOliFile>',
+            '    <RlutFile/>',
+            '  </L1Processing>',
+            '  <L1Processing><BPFOliFile>/ancil/other</BPFOliFile></L1Processing>',
+            # Truncated: only read up to the fields we need.
+            '  <Remain',
+        ])
+    })
+    work_order = d.joinpath('work_order.xml')
+    offsets = ['./L0RpProcessing/CalibrationFile', './L1Processing/BPFOliFile', './L1Processing/RlutFile']
+    expected = {
+        './L0RpProcessing/CalibrationFile': '/ancil/cpf',
+        './L1Processing/BPFOliFile': '/ancil/bpf',
+        './L1Processing/RlutFile': None,
+    }
+    assert util.read_xml_fields(work_order, offsets) == expected
+
+    # Results are reused, but callers get their own copy.
+    util.read_xml_fields(work_order, offsets)['./L1Processing/BPFOliFile'] = 'modified'
+    assert util.read_xml_fields(work_order, offsets) == expected
+
+    # Missing fields need the whole document.
+    with work_order.open('a') as f:
+        f.write(u'ing/>\n</WorkOrder>\n')
+    assert util.read_xml_fields(work_order, offsets + ['./Version']) == expected
+
+
+@slow
+def test_parse_type_benchmark():
+    values = _mtl_values()
+
+    def parse_all(parser):
+        return min(timeit.repeat(lambda: [parser(v) for v in values], number=20, repeat=3))
+
+    # noinspection PyProtectedMember
+    trial_seconds = parse_all(util._parse_type_by_trial)
+    classified_seconds = parse_all(util.parse_type)
+    print('Parsing %s MTL values: %.1fx faster (%.3fs by trial, %.3fs classified)' % (
+        len(values), trial_seconds / classified_seconds, trial_seconds, classified_seconds
+    ))
+    assert classified_seconds < trial_seconds
@@ -0,0 +1,353 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import numpy
+import pytest
+import rasterio
+import rasterio.features
+import shapely.affinity
+import shapely.geometry
+import shapely.ops
+from affine import Affine
+
+from eodatasets import cache
+from eodatasets.metadata import valid_region
+from tests import write_files
+
+_TRANSFORM = Affine(25.0, 0.0, 400000.0, 0.0, -25.0, 7000000.0)
+_NODATA = -999
+
+
+def _scene_pixels(seed, shape=(230, 250)):
+    """
+    A rotated (Landsat-like) footprint of random data, with speckled holes.
+    """
+    rows, cols = shape
+    random = numpy.random.RandomState(seed)
+    y, x = numpy.mgrid[0:rows, 0:cols]
+    inside = ((x - 0.2 * y > 20 + seed) & (x - 0.2 * y < 190) &
+              (y + 0.1 * x > 10) & (y + 0.1 * x < 215 - seed))
+
+    pixels = random.randint(1, 5000, size=shape).astype('int16')
+    pixels[~inside] = _NODATA
+    pixels[inside & (random.rand(rows, cols) < 0.3)] = _NODATA
+    return pixels
+
+
+def _write_image(path, pixels, nodata=_NODATA, transform=_TRANSFORM, **creation_options):
+    rows, cols = pixels.shape
+    with rasterio.open(str(path), 'w', driver='GTiff',
+                       width=cols, height=rows, count=1, dtype=pixels.dtype,
+                       nodata=nodata, transform=transform, crs='EPSG:32755', **creation_options) as ds:
+        ds.write(pixels, 1)
+    return path
+
+
+def _valid_pixel_hull(valid, t=_TRANSFORM):
+    """
+    The convex hull of the valid pixels (as squares), in CRS coordinates.
+    """
+    corners = []
+    for row, row_valid in enumerate(valid):
+        cols = numpy.flatnonzero(row_valid)
+        if cols.size:
+            # The outer corners of the first and last valid pixels in the row.
+            corners.extend([(cols[0], row), (cols[0], row + 1), (cols[-1] + 1, row), (cols[-1] + 1, row + 1)])
+    hull = shapely.geometry.MultiPoint(corners).convex_hull
+    return shapely.affinity.affine_transform(hull, (t.a, t.b, t.d, t.e, t.xoff, t.yoff))
+
+
+def _whole_image_region(images):
+    """
+    The region calculated the original way: reading each image whole and polygonising the combined mask.
+    """
+    mask = None
+    for fname in images:
+        with rasterio.open(str(fname)) as ds:
+            transform = ds.affine
+            new_mask = ds.read(1) != ds.nodata
+            mask = new_mask if mask is None else mask | new_mask
+
+    shapes = rasterio.features.shapes(mask.astype('uint8'), mask=mask)
+    geom = shapely.ops.unary_union([shapely.geometry.shape(shape) for shape, val in shapes if val == 1])
+    geom = geom.convex_hull.buffer(1, join_style=3, cap_style=3).simplify(1)
+    geom = geom.intersection(shapely.geometry.box(0, 0, mask.shape[1], mask.shape[0]))
+    return shapely.affinity.affine_transform(geom, (transform.a, transform.b, transform.d,
+                                                    transform.e, transform.xoff, transform.yoff))
+
+
+def test_streamed_region_matches_whole_image_read(monkeypatch):
+    d = write_files({})
+    images = [_write_image(d.joinpath('band%s.tif' % i), _scene_pixels(seed)) for i, seed in enumerate((0, 3, 7))]
+
+    # Stripes of a few rows, with a short one at the end.
+    monkeypatch.setattr(valid_region, 'STRIPE_PIXELS', 250 * 24)
+    region = shapely.geometry.shape(valid_region.valid_region(images, workers=1))
+
+    expected = _whole_image_region(images)
+    assert region.equals(expected)
+
+
+def test_concurrent_reads_match_serial(monkeypatch):
+    d = write_files({})
+    images = [_write_image(d.joinpath('band%s.tif' % i), _scene_pixels(seed)) for i, seed in enumerate((0, 3, 7, 9))]
+    # Several stripes per image, so that workers interleave their updates.
+    monkeypatch.setattr(valid_region, 'STRIPE_PIXELS', 250 * 16)
+
+    expected = valid_region.valid_region(images, workers=1)
+    assert valid_region.valid_region(images, workers=4) == expected
+
+    monkeypatch.setenv(valid_region.WORKERS_ENV_VAR, '2')
+    assert valid_region._default_workers() == 2
+    assert valid_region.valid_region(images) == expected
+
+
+def test_region_contains_valid_pixels():
+    d = write_files({})
+    bands = [_scene_pixels(seed) for seed in (0, 3, 7)]
+    images = [_write_image(d.joinpath('band%s.tif' % i), pixels) for i, pixels in enumerate(bands)]
+
+    valid_pixels = _valid_pixel_hull(numpy.any([b != _NODATA for b in bands], axis=0))
+    region = shapely.geometry.shape(valid_region.valid_region(images))
+    assert region.contains(valid_pixels)
+    # ... buffered by no more than a couple of pixels.
+    assert region.hausdorff_distance(valid_pixels) / _TRANSFORM.a <= 2
+
+
+def test_region_with_mask_value():
+    d = write_files({})
+    contiguity_bit = 0b100000000
+
+    pixels = _scene_pixels(5)
+    quality = numpy.where(pixels == _NODATA, 0, contiguity_bit | 0b11111111).astype('int16')
+    images = [_write_image(d.joinpath('pqa.tif'), quality, nodata=None)]
+
+    valid_pixels = _valid_pixel_hull(quality & contiguity_bit == contiguity_bit)
+    region = shapely.geometry.shape(valid_region.valid_region(images, contiguity_bit))
+    assert region.contains(valid_pixels)
+
+
+def test_decimated_region_contains_valid_pixels(monkeypatch):
+    d = write_files({})
+    bands = [_scene_pixels(seed) for seed in (0, 3, 7)]
+    # Isolated valid pixels at the edge of the scene are not lost.
+    bands[0][0, 249] = bands[0][229, 0] = 1
+    images = [_write_image(d.joinpath('band%s.tif' % i), pixels) for i, pixels in enumerate(bands)]
+
+    valid_pixels = _valid_pixel_hull(numpy.any([b != _NODATA for b in bands], axis=0))
+    full_resolution = shapely.geometry.shape(valid_region.valid_region(images))
+    assert full_resolution.contains(valid_pixels)
+
+    # Several stripes, which don't all start on a cell boundary.
+    monkeypatch.setattr(valid_region, 'STRIPE_PIXELS', 250 * 48)
+    for decimation in (2, 4, 10, 16):
+        region = shapely.geometry.shape(valid_region.valid_region(images, decimation=decimation))
+
+        # Never loses a valid pixel...
+        assert region.contains(valid_pixels)
+        # ... and is within a couple of cells (diagonally, at corners) of the full resolution region.
+        difference_in_pixels = region.hausdorff_distance(full_resolution) / _TRANSFORM.a
+        assert difference_in_pixels <= 3 * decimation
+
+
+def test_decimated_region_reads_reduced_resolution(monkeypatch):
+    d = write_files({})
+    image = _write_image(d.joinpath('band.tif'), _scene_pixels(2))
+
+    full_reads = []
+    read = valid_region._ValidPixelReader.read
+
+    def record_read(self, window, out_shape=None):
+        if out_shape is None:
+            (row_start, row_end), (col_start, col_end) = window
+            full_reads.append((row_end - row_start) * (col_end - col_start))
+        return read(self, window, out_shape)
+
+    monkeypatch.setattr(valid_region._ValidPixelReader, 'read', record_read)
+    valid_region.valid_region([image], decimation=8)
+    # Only the partial cells at the right and bottom edges are read at full resolution.
+    assert sum(full_reads) == 230 * 250 - 224 * 248
+
+
+def test_decimated_region_with_mask_value():
+    d = write_files({})
+    contiguity_bit = 0b100000000
+
+    pixels = _scene_pixels(5)
+    quality = numpy.where(pixels == _NODATA, 0, contiguity_bit | 0b11111111).astype('int16')
+    images = [_write_image(d.joinpath('pqa.tif'), quality, nodata=None)]
+
+    valid_pixels = _valid_pixel_hull(quality & contiguity_bit == contiguity_bit)
+    region = shapely.geometry.shape(valid_region.valid_region(images, contiguity_bit, decimation=4))
+    assert region.contains(valid_pixels)
+
+
+def test_decimated_mixed_resolution_region():
+    d = write_files({})
+    pixels = _scene_pixels(6)
+    multispectral = _write_image(d.joinpath('ms.tif'), pixels)
+    pan_pixels = pixels.repeat(2, axis=0).repeat(2, axis=1)
+    # A pan band shifted by a (fine) pixel: its cells are partial at every edge.
+    shifted_transform = Affine(12.5, 0.0, 399987.5, 0.0, -12.5, 7000012.5)
+    shifted = _write_image(d.joinpath('shifted.tif'), pan_pixels, transform=shifted_transform)
+
+    region = shapely.geometry.shape(valid_region.valid_region([multispectral, shifted], decimation=4))
+    assert region.contains(_valid_pixel_hull(pixels != _NODATA))
+    assert region.contains(_valid_pixel_hull(pan_pixels != _NODATA, shifted_transform))
+
+
+def test_region_from_internal_mask():
+    d = write_files({})
+    pixels = _scene_pixels(1)
+    expected = valid_region.valid_region([_write_image(d.joinpath('nodata.tif'), pixels)])
+
+    # No nodata value: the mask band alone says which pixels are valid.
+    masked_image = d.joinpath('masked.tif')
+    with rasterio.open(str(masked_image), 'w', driver='GTiff',
+                       width=pixels.shape[1], height=pixels.shape[0], count=1, dtype=pixels.dtype,
+                       transform=_TRANSFORM, crs='EPSG:32755') as ds:
+        ds.write(pixels, 1)
+        ds.write_mask(pixels != _NODATA)
+
+    assert valid_region.valid_region([masked_image]) == expected
+
+
+def test_region_from_sparse_image():
+    d = write_files({})
+    pixels = _scene_pixels(4)
+    expected = valid_region.valid_region([_write_image(d.joinpath('dense.tif'), pixels)])
+
+    # Only the blocks containing data are written.
+    sparse_image = d.joinpath('sparse.tif')
+    rows, cols = pixels.shape
+    with rasterio.open(str(sparse_image), 'w', driver='GTiff',
+                       width=cols, height=rows, count=1, dtype=pixels.dtype, nodata=_NODATA,
+                       transform=_TRANSFORM, crs='EPSG:32755',
+                       tiled=True, blockxsize=16, blockysize=16, SPARSE_OK='TRUE') as ds:
+        for row in range(0, rows, 16):
+            for col in range(0, cols, 16):
+                block = pixels[row:row + 16, col:col + 16]
+                if (block != _NODATA).any():
+                    ds.write(block, 1, window=((row, row + block.shape[0]), (col, col + block.shape[1])))
+
+    assert valid_region.valid_region([sparse_image]) == expected
+
+
+def test_region_without_gdal_access(monkeypatch):
+    d = write_files({})
+    pixels = _scene_pixels(4)
+    images = [_write_image(d.joinpath('nodata.tif'), pixels)]
+    masked_image = d.joinpath('masked.tif')
+    with rasterio.open(str(masked_image), 'w', driver='GTiff',
+                       width=pixels.shape[1], height=pixels.shape[0], count=1, dtype=pixels.dtype,
+                       transform=_TRANSFORM, crs='EPSG:32755') as ds:
+        ds.write(pixels, 1)
+        ds.write_mask(pixels != _NODATA)
+    contiguity_bit = 0b100000000
+    quality = _write_image(d.joinpath('pqa.tif'), numpy.where(pixels == _NODATA, 0, contiguity_bit).astype('int16'),
+                           nodata=None)
+
+    expected = [
+        valid_region.valid_region(images),
+        valid_region.valid_region([masked_image]),
+        valid_region.valid_region([quality], contiguity_bit),
+    ]
+
+    # If GDAL can't open the file itself, rasterio's reads are used alone.
+    monkeypatch.setattr(valid_region.gdal, 'Open', lambda path: None)
+    assert [
+        valid_region.valid_region(images),
+        valid_region.valid_region([masked_image]),
+        valid_region.valid_region([quality], contiguity_bit),
+    ] == expected
+
+
+def test_mixed_resolution_region():
+    d = write_files({})
+    pixels = _scene_pixels(6)
+    multispectral = _write_image(d.joinpath('ms.tif'), pixels)
+    expected = valid_region.valid_region([multispectral])
+
+    # A panchromatic band at twice the resolution covering the same pixels.
+    pan_pixels = pixels.repeat(2, axis=0).repeat(2, axis=1)
+    pan_transform = Affine(12.5, 0.0, 400000.0, 0.0, -12.5, 7000000.0)
+    pan = _write_image(d.joinpath('pan.tif'), pan_pixels, transform=pan_transform)
+
+    assert valid_region.valid_region([multispectral, pan]) == expected
+    assert valid_region.valid_region([pan, multispectral]) == expected
+
+    # Shifting the pan band a (fine) pixel up and left extends the footprint beyond the coarse grid.
+    shifted_transform = Affine(12.5, 0.0, 399987.5, 0.0, -12.5, 7000012.5)
+    shifted = _write_image(d.joinpath('shifted.tif'), pan_pixels, transform=shifted_transform)
+    region = shapely.geometry.shape(valid_region.valid_region([multispectral, shifted]))
+    assert region.contains(_valid_pixel_hull(pixels != _NODATA))
+    assert region.contains(_valid_pixel_hull(pan_pixels != _NODATA, shifted_transform))
+
+
+def test_incompatible_grids():
+    d = write_files({})
+    pixels = _scene_pixels(6)
+    images = [
+        _write_image(d.joinpath('ms.tif'), pixels),
+        _write_image(d.joinpath('other.tif'), pixels, transform=Affine(16.0, 0.0, 400000.0, 0.0, -16.0, 7000000.0)),
+    ]
+    with pytest.raises(ValueError):
+        valid_region.valid_region(images)
+
+
+def test_cached_region(monkeypatch):
+    d = write_files({})
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(d.joinpath('cache')))
+
+    image = _write_image(d.joinpath('band.tif'), _scene_pixels(1))
+    region = valid_region.safe_valid_region([image])
+    assert region == valid_region.valid_region([image])
+    decimated_region = valid_region.safe_valid_region([image], decimation=4)
+    assert decimated_region == valid_region.valid_region([image], decimation=4)
+
+    # A cached region doesn't touch the imagery.
+    monkeypatch.setattr(valid_region, 'valid_region', None)
+    assert valid_region.safe_valid_region([image]) == region
+    assert valid_region.safe_valid_region([image], decimation=4) == decimated_region
+
+
+def test_region_without_usable_cache(monkeypatch):
+    d = write_files({'not-a-directory': 'test'})
+    image = _write_image(d.joinpath('band.tif'), _scene_pixels(1))
+    expected = valid_region.valid_region([image])
+
+    # The cache directory can't be created.
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(d.joinpath('not-a-directory', 'cache')))
+    assert valid_region.safe_valid_region([image]) == expected
+
+    # The cache file is corrupt.
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(d.joinpath('cache')))
+    footprint_cache = cache.get_cache('footprint')
+    with open(footprint_cache.path, 'wb') as f:
+        f.write(b'Not a database' * 100)
+    assert valid_region.safe_valid_region([image]) == expected
+
+
+def test_max_pool_edges():
+    valid = numpy.zeros((5, 7), dtype=bool)
+    valid[4, 6] = True
+    # Partial cells at the edges are still included.
+    assert valid_region._max_pool(valid, 2).tolist() == [
+        [False, False, False, False],
+        [False, False, False, False],
+        [False, False, False, True],
+    ]
+
+
+def test_row_extents_match_polygonised_hull():
+    valid = _scene_pixels(2) != _NODATA
+
+    # Stripes may arrive in any order, and overlap.
+    extents = valid_region._RowExtents(valid.shape)
+    extents.add(100, valid[100:])
+    extents.add(0, valid[:120])
+
+    polygons = rasterio.features.shapes(valid.view(numpy.uint8), mask=valid)
+    polygonised = shapely.ops.unary_union([shapely.geometry.shape(p) for p, val in polygons if val == 1])
+
+    assert extents.footprint().equals(polygonised.convex_hull)
@@ -2,6 +2,11 @@
 
 from __future__ import absolute_import
 
+import json
+
+import numpy
+from osgeo import gdal, gdalconst
+
 from eodatasets import browseimage, drivers, type as ptype
 from tests import write_files, assert_same
 
@@ -76,3 +81,121 @@ def test_create_mono_browse_metadata():
 
     expected.id_, dataset.id_ = None, None
     assert_same(expected, dataset)
+
+
+def test_create_tiled_browse_metadata():
+    class TestDriver(drivers.DatasetDriver):
+        def browse_image_bands(self, d):
+            return '5', '1', '3'
+
+    d = write_files({})
+    dataset = browseimage.create_typical_browse_metadata(
+        TestDriver(), ptype.DatasetMetadata(), d,
+        include_tiles=True
+    )
+
+    assert set(dataset.browse.keys()) == {'full', 'medium', 'tiles'}
+    assert_same(
+        dataset.browse['tiles'],
+        ptype.BrowseMetadata(
+            path=d.joinpath('browse.tiles'),
+            file_type='image/png',
+            red_band='5',
+            green_band='1',
+            blue_band='3',
+            tile_size=256
+        )
+    )
+
+
+def test_write_tile_pyramid():
+    d = write_files({})
+    rgb = gdal.GetDriverByName('MEM').Create('', 300, 200, 3, gdalconst.GDT_Byte)
+    rgb.SetGeoTransform((397000.0, 25.0, 0.0, 7236000.0, 0.0, -25.0))
+    for band_index in range(3):
+        rgb.GetRasterBand(band_index + 1).WriteArray(numpy.full((200, 300), 50 * (band_index + 1), dtype='uint8'))
+
+    tile_directory = d.joinpath('browse.tiles')
+    written = browseimage._write_tile_pyramid(rgb, tile_directory, tile_size=256)
+
+    # The whole image fits in one tile at zoom 0, and needs two across at full resolution.
+    expected_files = {'0/0/0.png', '1/0/0.png', '1/1/0.png', 'index.json'}
+    assert {p.relative_to(tile_directory).as_posix() for p in written} == expected_files
+    assert {p.relative_to(tile_directory).as_posix() for p in tile_directory.rglob('*') if p.is_file()} == \
+        expected_files
+
+    # The right edge tile is padded with transparency beyond the image.
+    edge_tile = gdal.Open(str(tile_directory.joinpath('1', '1', '0.png')))
+    assert (edge_tile.RasterXSize, edge_tile.RasterYSize, edge_tile.RasterCount) == (256, 256, 4)
+    assert (edge_tile.GetRasterBand(1).ReadAsArray()[:200, :44] == 50).all()
+    alpha = edge_tile.GetRasterBand(4).ReadAsArray()
+    assert (alpha[:200, :44] == 255).all()
+    assert (alpha[:, 44:] == 0).all()
+    assert (alpha[200:, :] == 0).all()
+
+    with tile_directory.joinpath('index.json').open() as f:
+        index = json.load(f)
+    assert index['tiles'] == '{z}/{x}/{y}.png'
+    assert index['format'] == 'image/png'
+    assert (index['tile_size'], index['min_zoom'], index['max_zoom']) == (256, 0, 1)
+    assert (index['width'], index['height']) == (300, 200)
+    assert index['geotransform'] == [397000.0, 25.0, 0.0, 7236000.0, 0.0, -25.0]
+
+
+def test_pqa_palette_lookup():
+    palette = drivers.PqaDriver().browse_palette(ptype.DatasetMetadata())
+    lut = browseimage._palette_lookup_table(palette)
+
+    all_clear = 0b11111111111111
+    no_data_colour = (0, 0, 0)
+    clear_colour = tuple(lut[all_clear])
+
+    assert clear_colour != no_data_colour
+    # Non-contiguous wins over everything else.
+    assert tuple(lut[0]) == no_data_colour
+    assert tuple(lut[all_clear & ~(1 << 8)]) == no_data_colour
+    # Cloud (either test) and cloud shadow.
+    assert tuple(lut[all_clear & ~(1 << 10)]) == tuple(lut[all_clear & ~(1 << 11)])
+    assert tuple(lut[all_clear & ~(1 << 12)]) == tuple(lut[all_clear & ~(1 << 13)])
+    assert tuple(lut[all_clear & ~(1 << 10)]) != tuple(lut[all_clear & ~(1 << 12)])
+    # Saturation of any band
+    assert tuple(lut[all_clear & ~(1 << 3)]) not in (clear_colour, no_data_colour)
+
+
+def test_create_palette_thumbnail():
+    d = write_files({})
+    image_path = d.joinpath('pqa.tif')
+    all_clear = 0b11111111111111
+    # No data on the left, clear on the right.
+    pixels = numpy.zeros((30, 64), dtype='uint16')
+    pixels[:, 32:] = all_clear
+    image = gdal.GetDriverByName('GTiff').Create(str(image_path), 64, 30, 1, gdalconst.GDT_UInt16)
+    image.SetGeoTransform((397000.0, 25.0, 0.0, 7236000.0, 0.0, -25.0))
+    image.GetRasterBand(1).WriteArray(pixels)
+    # noinspection PyUnusedLocal
+    image = None
+
+    palette = drivers.PqaDriver().browse_palette(ptype.DatasetMetadata())
+    clear_colour = browseimage._palette_lookup_table(palette)[all_clear]
+    thumbnail_path = d.joinpath('browse.jpg')
+
+    cols, rows, output_res = browseimage._create_palette_thumbnail(image_path, thumbnail_path, palette, x_constraint=32)
+    assert (cols, rows, output_res) == (32, 15, 50.0)
+
+    thumbnail = gdal.Open(str(thumbnail_path))
+    assert (thumbnail.RasterXSize, thumbnail.RasterYSize, thumbnail.RasterCount) == (32, 15, 3)
+    for band_index in range(3):
+        band = thumbnail.GetRasterBand(band_index + 1).ReadAsArray().astype('int16')
+        # The edge falls on a JPEG block boundary, so only allow for compression noise.
+        assert (abs(band[:, :16]) <= 8).all()
+        assert (abs(band[:, 16:] - clear_colour[band_index]) <= 8).all()
+    # noinspection PyUnusedLocal
+    thumbnail = None
+
+    # Existing thumbnails are kept unless overwriting.
+    with thumbnail_path.open('wb') as f:
+        f.write(b'existing')
+    assert browseimage._create_palette_thumbnail(image_path, thumbnail_path, palette, overwrite=False) == \
+        (None, None, None)
+    with thumbnail_path.open('rb') as f:
+        assert f.read() == b'existing'
@@ -0,0 +1,121 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+
+from click.testing import CliRunner
+
+from eodatasets import cache
+from eodatasets.scripts import clearcache
+from tests import write_files
+
+
+def test_get_and_put():
+    c = cache.LruCache(str(write_files({}).joinpath('test.sqlite')))
+
+    assert c.get('missing') is None
+    assert c.get('missing', default=42) == 42
+
+    c.put('a', {'type': 'Polygon', 'coordinates': [[[1.0, 2.0], [3.0, 4.0]]]})
+    assert c.get('a') == {'type': 'Polygon', 'coordinates': [[[1.0, 2.0], [3.0, 4.0]]]}
+
+    # Replace
+    c.put('a', 'second')
+    assert c.get('a') == 'second'
+    assert len(c) == 1
+
+    c.invalidate('a')
+    assert c.get('a') is None
+
+
+def test_persistent():
+    path = str(write_files({}).joinpath('test.sqlite'))
+    cache.LruCache(path).put('a', 1)
+    assert cache.LruCache(path).get('a') == 1
+
+
+def test_least_recently_used_are_evicted():
+    c = cache.LruCache(str(write_files({}).joinpath('test.sqlite')), max_entries=2)
+    c.put('a', 1)
+    c.put('b', 2)
+    # Use 'a', so 'b' is the oldest.
+    assert c.get('a') == 1
+
+    c.put('c', 3)
+    assert len(c) == 2
+    assert c.get('b') is None
+    assert c.get('a') == 1
+    assert c.get('c') == 3
+
+    # Recency doesn't depend on the clock: many uses in quick succession are still ordered.
+    c = cache.LruCache(str(write_files({}).joinpath('test.sqlite')), max_entries=10)
+    for i in range(10):
+        c.put(str(i), i)
+    for i in reversed(range(5)):
+        assert c.get(str(i)) == i
+    for i in range(10, 15):
+        c.put(str(i), i)
+    assert [i for i in range(15) if c.get(str(i)) is not None] == [0, 1, 2, 3, 4, 10, 11, 12, 13, 14]
+
+    c.clear()
+    assert len(c) == 0
+
+
+def test_cache_is_opt_in(monkeypatch):
+    monkeypatch.delenv(cache.CACHE_DIR_ENV_VAR, raising=False)
+    assert cache.get_cache('test') is None
+
+    d = write_files({})
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(d.joinpath('cache')))
+    c = cache.get_cache('test')
+    assert c is cache.get_cache('test')
+    assert os.path.exists(c.path)
+
+
+def test_unusable_cache_is_skipped(monkeypatch):
+    d = write_files({'not-a-directory': 'test'})
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(d.joinpath('not-a-directory', 'cache')))
+    assert cache.get_cache('test') is None
+
+
+def test_corrupt_cache_misses():
+    path = write_files({}).joinpath('test.sqlite')
+    c = cache.LruCache(str(path))
+    c.put('a', 1)
+
+    with path.open('wb') as f:
+        f.write(b'Not a database' * 100)
+
+    assert c.get('a', default=42) == 42
+    c.put('a', 2)
+    assert c.get('a') is None
+
+
+def test_clear_caches(monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(write_files({}).joinpath('cache')))
+    for name in ('footprint', 'metadata'):
+        cache.get_cache(name).put('a', 1)
+
+    assert cache.clear_caches(['metadata', 'missing']) == ['metadata']
+    assert cache.get_cache('metadata').get('a') is None
+    assert cache.get_cache('footprint').get('a') == 1
+
+    cache.get_cache('metadata').put('a', 1)
+    result = CliRunner().invoke(clearcache.run, [], catch_exceptions=False)
+    assert result.exit_code == 0
+    assert result.output == 'Cleared footprint cache\nCleared metadata cache\n'
+    assert len(cache.get_cache('footprint')) == len(cache.get_cache('metadata')) == 0
+
+    monkeypatch.delenv(cache.CACHE_DIR_ENV_VAR)
+    assert CliRunner().invoke(clearcache.run, []).exit_code != 0
+
+
+def test_file_identity_changes_with_content():
+    d = write_files({'a.txt': 'test'})
+    f = d.joinpath('a.txt')
+    identity = cache.file_identity(f)
+    assert identity == cache.file_identity(f)
+
+    with f.open('w') as out:
+        out.write(u'changed')
+    assert identity != cache.file_identity(f)
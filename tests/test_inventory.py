@@ -0,0 +1,93 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+
+from pathlib import Path
+
+from eodatasets import inventory as inventory_module
+from eodatasets.inventory import FileInventory
+from tests import write_files
+
+
+def _write_dataset():
+    d = write_files({
+        'LC81010782014285LGN00_MTL.txt': '',
+        '.hidden': '',
+        'scene01': {
+            'LC81010782014285LGN00_B1.TIF': '',
+            'LC81010782014285LGN00_B1.TIF.aux.xml': '',
+            'nested': {
+                'LC81010782014285LGN00_B2.TIF': '',
+            },
+        },
+        'empty': {},
+    })
+    # Linked directories are listed, but not followed (like rglob).
+    os.symlink(str(d.joinpath('scene01')), str(d.joinpath('linked')))
+    return d
+
+
+def test_inventory_matches_pathlib():
+    d = _write_dataset()
+    inventory = FileInventory.scan(d)
+
+    assert inventory.root == d
+    assert set(inventory.iterdir()) == set(d.iterdir())
+    assert set(inventory.iterdir(d.joinpath('scene01'))) == set(d.joinpath('scene01').iterdir())
+    assert inventory.glob('*_MTL.txt') == list(d.glob('*_MTL.txt'))
+    assert inventory.glob('*.TIF', d.joinpath('scene01')) == list(d.joinpath('scene01').glob('*.TIF'))
+    for pattern in ('*', '*.TIF', '*_MTL.txt', 'missing'):
+        assert inventory.rglob(pattern) == list(d.rglob(pattern))
+
+    assert inventory.files() == [p for p in d.rglob('*') if not p.is_dir()]
+    assert inventory.relative_files() == [p.relative_to(d) for p in inventory.files()]
+
+    assert inventory.is_dir()
+    assert inventory.is_dir(d.joinpath('empty'))
+    assert not inventory.is_dir(d.joinpath('.hidden'))
+    # Not followed.
+    assert inventory.iterdir(d.joinpath('linked')) == []
+
+
+def test_inventory_with_root(monkeypatch):
+    d = _write_dataset()
+    monkeypatch.chdir(str(d.parent))
+    relative = Path(d.name)
+
+    inventory = FileInventory.scan(relative)
+    assert inventory.files()[0].parent == relative
+
+    absolute = inventory.with_root(relative.absolute())
+    assert absolute.files() == [p.absolute() for p in inventory.files()]
+    assert FileInventory.scan(d) == absolute
+
+
+def test_inventory_of_file():
+    d = _write_dataset()
+    inventory = FileInventory.scan(d.joinpath('LC81010782014285LGN00_MTL.txt'))
+    assert not inventory.is_dir()
+    assert inventory.files() == []
+
+    assert FileInventory.scan(d.joinpath('missing')).iterdir() == []
+
+
+def test_glob_parent(monkeypatch):
+    d = _write_dataset()
+    dataset = d.joinpath('scene01')
+    inventory = FileInventory.scan(dataset)
+
+    listed = []
+    scandir = inventory_module.scandir
+
+    def record_scandir(path):
+        listed.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(inventory_module, 'scandir', record_scandir)
+
+    assert inventory.glob_parent('*_MTL.txt') == list(d.glob('*_MTL.txt'))
+    assert set(inventory.glob_parent('*')) == set(d.iterdir())
+    assert inventory.glob_parent('missing') == []
+    # Listed once.
+    assert listed == [str(d)]
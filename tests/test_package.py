@@ -1,7 +1,12 @@
 # coding=utf-8
 from __future__ import absolute_import
 
-from eodatasets import package, drivers, type as ptype
+import datetime
+
+from pathlib import Path
+
+from eodatasets import package, drivers, cache, type as ptype
+from eodatasets.inventory import FileInventory
 from tests import write_files, TestCase, assert_file_structure
 
 
@@ -186,3 +191,135 @@ class TestPackage(TestCase):
                 size_bytes=9
             )
         )
+
+
+def test_fill_metadata_is_cached(monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(write_files({}).joinpath('cache')))
+    f = write_files({
+        'first.txt': 'test',
+    })
+
+    class CountingDriver(drivers.DatasetDriver):
+        def __init__(self):
+            self.calls = 0
+
+        def get_id(self):
+            return 'counting'
+
+        def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
+            self.calls += 1
+            dataset.acquisition = ptype.AcquisitionMetadata(aos=datetime.datetime(2014, 1, 1, 1, 1, 1))
+            dataset.lineage.machine.note_software_version('counter', str(self.calls))
+            return dataset
+
+    def fill(driver, hostname):
+        d = ptype.DatasetMetadata(lineage=ptype.LineageMetadata(machine=ptype.MachineMetadata(hostname=hostname)))
+        package.fill_dataset_metadata(driver, d, f, FileInventory.scan(f))
+        return d
+
+    driver = CountingDriver()
+    first = fill(driver, 'first-host')
+    assert driver.calls == 1
+
+    # Same inputs: not extracted again. Fields of this run are kept.
+    second = fill(driver, 'second-host')
+    assert driver.calls == 1
+    assert second.acquisition.aos == datetime.datetime(2014, 1, 1, 1, 1, 1)
+    assert second.lineage.machine.software_versions == {'counter': '1'}
+    assert second.lineage.machine.hostname == 'second-host'
+    assert second.id_ != first.id_
+
+    # Changed inputs are extracted again.
+    f.joinpath('second.txt').touch()
+    fill(driver, 'second-host')
+    assert driver.calls == 2
+
+
+def test_cached_metadata_follows_external_files(monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(write_files({}).joinpath('cache')))
+    d = write_files({
+        'work_order.xml': '<WorkOrder/>',
+        'ancillary': {
+            'L7CPF20140101_20140331.01': 'first',
+        },
+        'dataset': {
+            'first.txt': 'test',
+        }
+    })
+    dataset_path = d.joinpath('dataset')
+    ancillary_path = d.joinpath('ancillary', 'L7CPF20140101_20140331.01')
+
+    class AncillaryDriver(drivers.DatasetDriver):
+        def __init__(self):
+            self.calls = 0
+
+        def get_id(self):
+            return 'ancillary'
+
+        def external_metadata_files(self, path, inventory=None):
+            return [path.parent.joinpath('work_order.xml')]
+
+        def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
+            self.calls += 1
+            dataset.lineage.ancillary = {'cpf': ptype.AncillaryMetadata(name=ancillary_path.name,
+                                                                        uri=str(ancillary_path))}
+            return dataset
+
+    def fill(driver):
+        package.fill_dataset_metadata(driver, ptype.DatasetMetadata(lineage=ptype.LineageMetadata()),
+                                      dataset_path, FileInventory.scan(dataset_path))
+
+    driver = AncillaryDriver()
+    fill(driver)
+    fill(driver)
+    assert driver.calls == 1
+
+    # A changed work order in the parent folder.
+    with d.joinpath('work_order.xml').open('w') as f:
+        f.write(u'<WorkOrder>changed</WorkOrder>')
+    fill(driver)
+    assert driver.calls == 2
+
+    # A changed ancillary file.
+    with ancillary_path.open('w') as f:
+        f.write(u'second version')
+    fill(driver)
+    assert driver.calls == 3
+    fill(driver)
+    assert driver.calls == 3
+
+
+def test_cached_metadata_from_other_working_directories(monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(write_files({}).joinpath('cache')))
+    d = write_files({
+        'dataset': {
+            'band1.tif': 'test',
+        }
+    })
+    dataset_path = d.joinpath('dataset')
+
+    class BandDriver(drivers.DatasetDriver):
+        def __init__(self):
+            self.calls = 0
+
+        def get_id(self):
+            return 'band'
+
+        def fill_metadata(self, dataset, path, additional_files=(), inventory=None):
+            self.calls += 1
+            dataset.image = ptype.ImageMetadata(bands={'1': ptype.BandMetadata(path=path.joinpath('band1.tif'))})
+            return dataset
+
+    def fill(driver, relative_path):
+        d = ptype.DatasetMetadata()
+        package.fill_dataset_metadata(driver, d, relative_path, FileInventory.scan(relative_path))
+        return d.image.bands['1'].path
+
+    driver = BandDriver()
+    monkeypatch.chdir(str(d))
+    assert fill(driver, Path('dataset')) == dataset_path.joinpath('band1.tif')
+
+    # A cached result is still correct from elsewhere.
+    monkeypatch.chdir(str(dataset_path))
+    assert fill(driver, Path('.')) == dataset_path.joinpath('band1.tif')
+    assert driver.calls == 1
@@ -5,14 +5,17 @@ Most serialisation tests are coupled with the type tests (test_type.py)
 from __future__ import absolute_import
 
 import datetime
+import functools
+import pickle
+import timeit
 import uuid
 
 from hypothesis import given
 from hypothesis.strategies import dictionaries as dictionary, characters, integers
 from pathlib import Path
 
-from eodatasets import serialise, compat, type as ptype
-from tests import TestCase, slow
+from eodatasets import serialise, compat, documents, type as ptype
+from tests import TestCase, slow, temp_dir, temp_file
 
 strings_without_trailing_underscore = characters(blacklist_characters='_')
 
@@ -136,3 +139,117 @@ class TestSerialise(TestCase):
         with self.assertRaises(ValueError) as context:
             # It returns a generator, so we have to wrap it in a list to force evaluation.
             list(serialise.as_flat_key_value({'a': 1, 'b': UnknownClass()}))
+
+
+_PQA_PARENT_METADATA = Path(__file__).parent.joinpath('integration', 'input', 'ls8-pqa', 'parent', 'ga-metadata.yaml')
+
+
+def _read_doc(path):
+    [(_, doc)] = list(documents.read_documents(path))
+    return doc
+
+
+def test_source_datasets_are_lazy():
+    doc = _read_doc(_PQA_PARENT_METADATA)
+    dataset = serialise.read_dict_metadata(doc)
+
+    source = dataset.lineage.source_datasets['level1']
+    assert isinstance(source, ptype.DatasetMetadata)
+    assert source.unloaded_doc is doc['lineage']['source_datasets']['level1']
+    # Identical documents are equal without loading.
+    assert source == serialise.read_dict_metadata(doc).lineage.source_datasets['level1']
+    assert source.unloaded_doc is doc['lineage']['source_datasets']['level1']
+
+    assert source.product_type == 'level1'
+    assert source.unloaded_doc is None
+    assert source == ptype.DatasetMetadata.from_dict(doc['lineage']['source_datasets']['level1'])
+
+    # Pickled (and cached) as a real dataset.
+    unpickled = pickle.loads(pickle.dumps(dataset, 2))
+    assert type(unpickled.lineage.source_datasets['level1']) is ptype.DatasetMetadata
+    assert unpickled == dataset
+
+
+def test_unloaded_source_datasets_are_written_unchanged():
+    doc = _read_doc(_PQA_PARENT_METADATA)
+    dataset = serialise.read_dict_metadata(doc)
+
+    output_path = Path(temp_file(suffix='.yaml'))
+    serialise.write_yaml_metadata(dataset, output_path, _PQA_PARENT_METADATA.parent)
+    written_doc = _read_doc(output_path)
+
+    assert written_doc['lineage']['source_datasets'] == doc['lineage']['source_datasets']
+    assert serialise.read_dict_metadata(written_doc) == dataset
+
+
+def test_unloaded_source_datasets_are_written_to_other_directories():
+    doc = _read_doc(_PQA_PARENT_METADATA)
+    output_directory = temp_dir()
+    # A source dataset with an absolute path: it must be made relative to where it's written.
+    level1_doc = doc['lineage']['source_datasets']['level1']
+    band_doc = level1_doc['image']['bands']['1']
+    band_doc['path'] = str(output_directory.joinpath(band_doc['path']))
+
+    def write_and_read(dataset, directory):
+        output_path = Path(temp_file(suffix='.yaml'))
+        serialise.write_yaml_metadata(dataset, output_path, directory)
+        return _read_doc(output_path)
+
+    lazy_dataset = serialise.read_dict_metadata(doc)
+    written_doc = write_and_read(lazy_dataset, output_directory)
+
+    eager_dataset = serialise.read_dict_metadata(doc)
+    level1 = eager_dataset.lineage.source_datasets['level1'].load()
+    level1.lineage.source_datasets['satellite_telemetry_data'].load()
+    assert written_doc == write_and_read(eager_dataset, output_directory)
+
+    written_level1_doc = written_doc['lineage']['source_datasets']['level1']
+    assert written_level1_doc['image']['bands']['1']['path'] == 'product/LC80900812014207LGN00_B1.TIF'
+
+    # And again, from the written document.
+    assert write_and_read(serialise.read_dict_metadata(written_doc), temp_dir()) == written_doc
+
+
+def _from_dict_as_before(cls, dict_):
+    """
+    from_dict() as it was before being compiled per class: fields are inspected for every object.
+    """
+    # noinspection PyProtectedMember
+    possible_properties = dict((name, default) for name, _, default in ptype._read_fields(cls).items)
+    props = {}
+
+    for key, value in dict_.items():
+        if key not in possible_properties:
+            if key + '_' not in possible_properties:
+                continue
+            key += '_'
+
+        if key in cls.PROPERTY_PARSERS:
+            value = cls.PROPERTY_PARSERS[key](value)
+
+        props[key] = value
+
+    return cls(**props)
+
+
+@slow
+def test_deserialise_benchmark(monkeypatch):
+    # Every dataset from the integration tests, with their ancestry.
+    metadata_paths = sorted(Path(__file__).parent.joinpath('integration', 'input').glob('*/parent/ga-metadata.yaml'))
+    docs = [doc for path in metadata_paths for _, doc in documents.read_documents(path)]
+    assert docs
+
+    def deserialise_seconds():
+        return min(timeit.repeat(lambda: [serialise.read_dict_metadata(doc) for doc in docs], number=50, repeat=3))
+
+    compiled_datasets = [serialise.read_dict_metadata(doc) for doc in docs]
+    compiled_seconds = deserialise_seconds()
+
+    monkeypatch.setattr(ptype, '_loader', lambda cls: functools.partial(_from_dict_as_before, cls))
+    assert [serialise.read_dict_metadata(doc) for doc in docs] == compiled_datasets
+    before_seconds = deserialise_seconds()
+
+    print('Deserialising %s documents: %.1fx faster (%.3fs before, %.3fs compiled)' % (
+        len(docs), before_seconds / compiled_seconds, before_seconds, compiled_seconds
+    ))
+    assert before_seconds / compiled_seconds > 5
@@ -5,12 +5,16 @@ import unittest
 import uuid
 import os
 import datetime
+import gc
+import timeit
 
 import dateutil.parser
+import pytest
+import yaml
 
 from pathlib import Path
 from eodatasets import type as ptype, serialise
-from tests import temp_file, assert_same, TestCase
+from tests import temp_file, assert_same, slow, TestCase
 
 
 def _serialise_to_file(file_name, dataset):
@@ -572,6 +576,21 @@ class SimpleObjectTests(TestCase):
         self.assert_values_equal(TestAllDefaults(2, None).items_ordered(), [('a', 2), ('b', None)])
         self.assertEqual(repr(TestAllDefaults(a=1, b=None)), "TestAllDefaults(a=1, b=None)")
 
+    def test_other_attributes(self):
+        class TestObj(ptype.SimpleObject):
+            def __init__(self, a, b=None):
+                self.a = a
+                self.b = b
+
+        o = TestObj(1)
+        # Fields are held in slots...
+        self.assertEqual(vars(o), {})
+        # ... but other attributes can still be set.
+        o.note = 'extra'
+        self.assertEqual(o.note, 'extra')
+        self.assertEqual(vars(o), {'note': 'extra'})
+        self.assertEqual(o, TestObj(1))
+
     def test_from_dict(self):
         class TestObj(ptype.SimpleObject):
             def __init__(self, a, b, c=42):
@@ -618,6 +637,27 @@ class SimpleObjectTests(TestCase):
             House(Door(a=42, handle=DoorHandle(a=111)), b=2)
         )
 
+    def test_from_dict_subclass_parsers(self):
+        # Subclasses have their own parsers for the same fields.
+        self.assertEqual(
+            ptype.CoordPolygon.from_dict({'ul': {'lat': 1, 'lon': 2}, 'ur': {'lat': 1, 'lon': 3},
+                                          'll': {'lat': 2, 'lon': 2}, 'lr': {'lat': 2, 'lon': 3}}).ul,
+            ptype.Coord(1, 2)
+        )
+        self.assertEqual(
+            ptype.PointPolygon.from_dict({'ul': {'x': 1, 'y': 2}, 'ur': {'x': 1, 'y': 3},
+                                          'll': {'x': 2, 'y': 2}, 'lr': {'x': 2, 'y': 3}}).ul,
+            ptype.Point(1, 2)
+        )
+
+    def test_from_dict_unknown_property(self):
+        class TestObj(ptype.SimpleObject):
+            def __init__(self, id_, b=None):
+                self.id_ = id_
+                self.b = b
+
+        self.assertEqual(TestObj.from_dict({'id': 1, 'unknown': 2}), TestObj(id_=1))
+
     def test_steal_properties_from(self):
         class TestObj(ptype.SimpleObject):
             def __init__(self, a, b=None, c=3):
@@ -920,6 +960,146 @@ class TestRewritePaths(TestCase):
         assert nbar is not new_nbar
         self.assert_same(nbar, new_nbar)
 
+    def test_only_changes_are_copied(self):
+        nbar = _build_ls8_nbar()
+        level1 = nbar.lineage.source_datasets['level1']
+        band_path = nbar.image.bands['1'].path
+        level1_band_path = level1.image.bands['coastal_aerosol'].path
+
+        new_nbar = ptype.rebase_paths(band_path.parent.absolute(), Path('/tmp/packaged'), nbar)
+
+        assert new_nbar.image.bands['1'].path == Path('/tmp/packaged').joinpath(band_path.name)
+        # The original is untouched.
+        assert nbar.image.bands['1'].path == band_path
+        # Unchanged parts are shared.
+        assert new_nbar.extent is nbar.extent
+        assert new_nbar.lineage.machine is nbar.lineage.machine
+        # Source datasets are rebased too.
+        assert new_nbar.lineage.source_datasets['level1'].image.bands['coastal_aerosol'].path == \
+            Path('/tmp/packaged').joinpath(level1_band_path.name)
+        assert level1.image.bands['coastal_aerosol'].path == level1_band_path
+
+    def test_unloaded_source_datasets(self):
+        nbar = _build_ls8_nbar()
+        # noinspection PyProtectedMember
+        doc = yaml.safe_load(yaml.dump(nbar, Dumper=serialise._create_relative_dumper('/')))
+        loaded = ptype.DatasetMetadata.from_dict(doc)
+        level1 = loaded.lineage.source_datasets['level1']
+
+        # Source datasets without paths to rebase aren't loaded.
+        rebased = ptype.rebase_paths(Path('/not-exist'), Path('/not-exist2'), loaded)
+        assert rebased.lineage.source_datasets['level1'] is level1
+        assert level1.unloaded_doc is not None
+
+        # ... but are rebased when they have them.
+        band_path = Path(level1.unloaded_doc['image']['bands']['coastal_aerosol']['path'])
+        rebased = ptype.rebase_paths(band_path.parent.absolute(), Path('/tmp/packaged'), loaded)
+        assert rebased.lineage.source_datasets['level1'].image.bands['coastal_aerosol'].path == \
+            Path('/tmp/packaged').joinpath(band_path.name)
+        assert level1.image.bands['coastal_aerosol'].path == band_path
+
+
+class _ReadOnEveryUse(object):
+    """
+    Class fields as they were before being read at class creation: inspected on every use.
+    """
+
+    def __get__(self, instance, owner):
+        # noinspection PyProtectedMember
+        return ptype._read_fields(owner)
+
+
+def _all_subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        for c in _all_subclasses(subclass):
+            yield c
+
+
+@slow
+def test_serialise_benchmark(monkeypatch):
+    nbar = _build_ls8_nbar()
+    # noinspection PyProtectedMember
+    dumper = serialise._create_relative_dumper('/')
+
+    def serialise_seconds():
+        # Only representation (not text output) uses the fields.
+        # (Deserialisation is benchmarked in test_serialise.py)
+        return min(timeit.repeat(lambda: dumper(None).represent_data(nbar), number=20, repeat=3))
+
+    read_once = serialise_seconds()
+    for cls in _all_subclasses(ptype.SimpleObject):
+        monkeypatch.setattr(cls, '_fields', _ReadOnEveryUse())
+    read_every_use = serialise_seconds()
+
+    print('Serialise: %.1fx faster (%.3fs inspecting every use, %.3fs read once)' % (
+        read_every_use / read_once, read_every_use, read_once
+    ))
+    assert read_once < read_every_use
+
+
+def _dict_backed(o, classes):
+    """
+    The same values, with each SimpleObject replaced by a plain (dict-backed) object, as they were before slots.
+    """
+    if isinstance(o, ptype.SimpleObject):
+        if type(o) not in classes:
+            classes[type(o)] = type(type(o).__name__, (object,), {})
+        plain = classes[type(o)]()
+        for name, value in o.items_ordered(skip_nones=False):
+            setattr(plain, name, _dict_backed(value, classes))
+        return plain
+    if isinstance(o, dict):
+        return {k: _dict_backed(v, classes) for k, v in o.items()}
+    if isinstance(o, list):
+        return [_dict_backed(v, classes) for v in o]
+    return o
+
+
+def _load_sources(dataset):
+    """
+    Replace lazily-loaded source datasets with loaded ones, throughout the ancestry.
+    """
+    sources = dataset.lineage.source_datasets if dataset.lineage else None
+    for name, source in (sources or {}).items():
+        if isinstance(source, ptype.LazyDatasetMetadata):
+            source = source.load()
+        sources[name] = _load_sources(source)
+    return dataset
+
+
+@slow
+def test_memory_benchmark():
+    tracemalloc = pytest.importorskip('tracemalloc')
+    # noinspection PyProtectedMember
+    doc = yaml.safe_load(yaml.dump(_build_ls8_nbar(), Dumper=serialise._create_relative_dumper('/')))
+    count = 500
+
+    def bytes_per_dataset(load):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            datasets = [load() for _ in range(count)]
+            size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert len(datasets) == count
+        return size / float(count)
+
+    # Source datasets are loaded on both sides, so that only slots are compared (not lazy loading).
+    loaded = _load_sources(ptype.DatasetMetadata.from_dict(doc))
+    assert loaded.lineage.source_datasets
+    assert all(type(source) is ptype.DatasetMetadata for source in loaded.lineage.source_datasets.values())
+
+    slotted = bytes_per_dataset(lambda: _load_sources(ptype.DatasetMetadata.from_dict(doc)))
+    classes = {}
+    dict_backed = bytes_per_dataset(lambda: _dict_backed(_load_sources(ptype.DatasetMetadata.from_dict(doc)), classes))
+
+    print('Loaded datasets: %.0f%% smaller (%d bytes each with dicts, %d with slots)' % (
+        100 * (1 - slotted / dict_backed), dict_backed, slotted
+    ))
+    assert slotted < dict_backed
+
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
@@ -4,7 +4,7 @@ from __future__ import absolute_import
 import hashlib
 import unittest
 
-from eodatasets import verify
+from eodatasets import cache, verify
 from tests import write_files
 
 
@@ -84,3 +84,35 @@ a94a8fe5ccb19ba61c4c0873d391e987982fbbd3\ttest1.txt
         }
         verification_results = set(c2.iteratively_verify())
         assert expected_verification == verification_results
+
+
+def test_cached_checksum(monkeypatch):
+    d = write_files({
+        'test1.txt': 'test'
+    })
+    test_file = d.joinpath('test1.txt')
+    assert verify.cached_file_sha1(test_file) == 'a94a8fe5ccb19ba61c4c0873d391e987982fbbd3'
+
+    # Remembered while the file is unchanged...
+    with monkeypatch.context() as m:
+        m.setattr(verify, 'calculate_file_sha1', None)
+        assert verify.cached_file_sha1(test_file) == 'a94a8fe5ccb19ba61c4c0873d391e987982fbbd3'
+
+    # ... and recalculated when it changes.
+    with test_file.open('w') as f:
+        f.write(u'test2')
+    assert verify.cached_file_sha1(test_file) == '109f4b3c50d7b0df729d299bc6f8e9ef9066971f'
+
+
+def test_persistent_checksum(monkeypatch):
+    d = write_files({
+        'test1.txt': 'test'
+    })
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(d.joinpath('cache')))
+    test_file = d.joinpath('test1.txt')
+    assert verify.cached_file_sha1(test_file) == 'a94a8fe5ccb19ba61c4c0873d391e987982fbbd3'
+
+    # A new process only has the persistent cache.
+    monkeypatch.setattr(verify, '_SHA1S', {})
+    monkeypatch.setattr(verify, 'calculate_file_sha1', None)
+    assert verify.cached_file_sha1(test_file) == 'a94a8fe5ccb19ba61c4c0873d391e987982fbbd3'